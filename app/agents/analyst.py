@@ -1,52 +1,147 @@
-from app.agents.state import AgentState
+import asyncio
+from app.agents.state import AgentState, get_active_step, pooled_context
+from app.agents.llm import get_llm
+from app.concurrency import io_slot
 from app.rag.retrieval import retrieve_context
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import SystemMessage, HumanMessage
+from app.rag.packing import pack_context, citation_header
+from app.rag.sections import summary_request, precomputed_summaries
+from app.telemetry import record
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
 
-def get_llm():
-    return ChatOpenAI(temperature=0, model="gpt-4o-mini")
+def _build_messages(query: str, results):
+    # Deduplicated, token-budgeted context with short [n] source headers
+    context, metrics = pack_context(results)
+
+    prompt = f"""Task: {query}
+    
+    Context from PDF:
+    {context}
+    
+    Provide the answer to the task based *strictly* on the context. Cite the bracketed sources you use."""
+    
+    return [SystemMessage(content="You are a PDF Analyst. Be precise."), HumanMessage(content=prompt)], metrics
+
+def _summary_results(query: str, collections):
+    """
+    Precomputed section summaries as retrieval-style results, if the step asks for a summary
+    and every section it covers is already summarized; otherwise None.
+    """
+    keys = summary_request(query)
+    if keys is None:
+        return None
+    sections = precomputed_summaries(keys, collections)
+    if sections is None:
+        return None
+    return [
+        {"id": f"{source}#{entry['key']}", "content": entry["summary"], "metadata": {"source": source, "page": entry["pages"][0], "page_end": entry["pages"][1], "section": entry["name"]}}
+        for source, entry in sections
+    ]
+
+def _summary_answer(results):
+    # One section's summary already is the answer; no LLM call needed
+    if len(results) == 1:
+        return AIMessage(content=f"{citation_header(1, results[0]['metadata'])}\n{results[0]['content']}")
+    return None
+
+def _pooled_context(state: AgentState, step, query: str):
+    """
+    Context already fetched in this run: the step's prefetched chunks, else enough relevant
+    chunks from the run's document pool; None if the step has to retrieve its own.
+    """
+    results = (state.get("prefetched_context") or {}).get(str(step["id"]))
+    if results is not None:
+        return results
+    pooled = pooled_context(state, query)
+    if pooled is not None:
+        record("pool_hits")
+        return pooled
+    return None
+
+def _complete_step(step, response, metrics, retrieved=None):
+    # Update Plan Step
+    step["status"] = "completed"
+    step["result"] = response.content
+    step["metrics"] = {**(step.get("metrics") or {}), **metrics}
+    
+    # Update State
+    # Note: In LangGraph, we return the DIFF.
+    # The research_plan reducer merges steps by id, so we only return our own step.
+    # This keeps parallel steps from overwriting each other's results.
+    update = {"research_plan": [step]}
+    if retrieved:
+        # Chunks this step fetched itself join the run's pool for later steps
+        update["documents"] = retrieved
+    return update
 
 def analyst_node(state: AgentState):
     """
     PDF Analyst: Executes RAG tasks.
     """
-    plan = state["research_plan"]
-    current_idx = state["current_step_index"]
-    step = plan[current_idx]
+    step = get_active_step(state)
     
     if step["assigned_agent"] != "PDF_Analyst":
         return {} # Should not happen if routing is correct
         
     query = step["description"]
     
+    # Summary-style steps are answered from the section summaries written at ingest time
+    summaries = _summary_results(query, state.get("collections"))
+    if summaries is not None:
+        response = _summary_answer(summaries)
+        metrics = {}
+        if response is None:
+            messages, metrics = _build_messages(query, summaries)
+            with io_slot():
+                response = get_llm().invoke(messages)
+        return _complete_step(step, response, {**metrics, "section_summaries_used": len(summaries)})
+    
     # 1. Retrieve
     # Extract keywords or use full query? Using full query for now.
-    results = retrieve_context(query)
-    context_str = "\n".join([f"[Page {r['metadata']['page']}] {r['content'][:200]}..." for r in results])
-    full_context_str = "\n".join([f"Content: {r['content']}\nMetadata: {r['metadata']}" for r in results])
+    # Context is normally prefetched for the whole plan by the Lead Researcher,
+    # or already in the run's document pool.
+    results = _pooled_context(state, step, query)
+    retrieved = None
+    if results is None:
+        results = retrieved = retrieve_context(query, collections=state.get("collections"))
 
     # 2. Analyze
+    messages, metrics = _build_messages(query, results)
     llm = get_llm()
-    prompt = f"""Task: {query}
-    
-    Context from PDF:
-    {full_context_str}
+    with io_slot():
+        response = llm.invoke(messages)
     
-    Provide the answer to the task based *strictly* on the context."""
-    
-    response = llm.invoke([SystemMessage(content="You are a PDF Analyst. Be precise."), HumanMessage(content=prompt)])
+    return _complete_step(step, response, metrics, retrieved)
+
+async def aanalyst_node(state: AgentState):
+    """
+    PDF Analyst (async): same as analyst_node, without blocking the event loop.
+    """
+    step = get_active_step(state)
     
-    # Update Plan Step
-    step["status"] = "completed"
-    step["result"] = response.content
+    if step["assigned_agent"] != "PDF_Analyst":
+        return {}
+        
+    query = step["description"]
     
-    # Update State
-    # Note: In LangGraph, we return the DIFF.
-    # However for a list of dicts (plan), we might need to replace the whole list or be careful.
-    # Here we are modifying the object reference obtained from state. 
-    # To be safe in functional style, we should reconstruct.
+    summaries = await asyncio.to_thread(_summary_results, query, state.get("collections"))
+    if summaries is not None:
+        response = _summary_answer(summaries)
+        metrics = {}
+        if response is None:
+            messages, metrics = _build_messages(query, summaries)
+            async with io_slot():
+                response = await get_llm().ainvoke(messages)
+        return _complete_step(step, response, {**metrics, "section_summaries_used": len(summaries)})
     
-    new_plan = [s for s in plan]
-    new_plan[current_idx] = step
+    results = _pooled_context(state, step, query)
+    retrieved = None
+    if results is None:
+        # Retrieval is local CPU work (embedding + Chroma), so it runs off the loop
+        results = retrieved = await asyncio.to_thread(retrieve_context, query, collections=state.get("collections"))
+
+    messages, metrics = _build_messages(query, results)
+    llm = get_llm()
+    async with io_slot():
+        response = await llm.ainvoke(messages)
     
-    return {"research_plan": new_plan, "current_step_index": current_idx + 1}
+    return _complete_step(step, response, metrics, retrieved)
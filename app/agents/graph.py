@@ -1,13 +1,41 @@
+import os
+import sqlite3
+import threading
 from langgraph.graph import StateGraph, END
-from app.agents.state import AgentState
-from app.agents.researcher import researcher_node
-from app.agents.analyst import analyst_node
-from app.agents.scout import scout_node
-from app.agents.visualizer import visualizer_node
+from langgraph.types import Send
+from app.agents.state import AgentState, ready_steps
+from app.agents.researcher import researcher_node, aresearcher_node, SYNTHESIS_TAG
+from app.agents.analyst import analyst_node, aanalyst_node
+from app.agents.scout import scout_node, ascout_node
+from app.agents.visualizer import visualizer_node, avisualizer_node
+from app.agents.reuse import with_step_reuse
+from app.cache import CACHE_DIRECTORY
+from app.telemetry import instrument_node
+
+AGENT_NODES = ["PDF_Analyst", "Citation_Scout", "Visual_Specialist"]
+
+# Graph state is checkpointed after every node, so an interrupted run resumes where it stopped
+CHECKPOINT_PATH = os.path.join(CACHE_DIRECTORY, "checkpoints.sqlite")
+
+_checkpointer = None
+_checkpointer_lock = threading.Lock()
+
+def get_checkpointer():
+    """Process-wide SQLite checkpointer for the sync graph."""
+    global _checkpointer
+    with _checkpointer_lock:
+        if _checkpointer is None:
+            from langgraph.checkpoint.sqlite import SqliteSaver
+
+            os.makedirs(os.path.dirname(CHECKPOINT_PATH), exist_ok=True)
+            _checkpointer = SqliteSaver(sqlite3.connect(CHECKPOINT_PATH, check_same_thread=False))
+        return _checkpointer
 
 def route_manager(state: AgentState):
     """
-    Determines the next step based on the research plan status.
+    Determines the next step(s) based on the research plan status.
+    Every step whose dependencies are met is fanned out at once (one Send per step),
+    so independent steps run concurrently and the plan advances in waves.
     """
     plan = state.get("research_plan")
     
@@ -15,60 +43,98 @@ def route_manager(state: AgentState):
     if not plan or state.get("final_answer"):
         return END
 
-    # Find next pending step
-    for step in plan:
-        if step["status"] == "pending":
-            return step["assigned_agent"]
+    ready = ready_steps(plan)
+    if ready:
+        return [Send(step["assigned_agent"], {**state, "active_step_id": step["id"]}) for step in ready]
             
     # If all completed, go back to researcher for synthesis
     return "Lead_Researcher"
 
-def build_graph():
+def join_steps(state: AgentState):
+    """
+    Join point after each wave of parallel steps. The plan reducer has already merged
+    the step results; this only records progress before routing again.
+    """
+    plan = state.get("research_plan") or []
+    return {"current_step_index": len([s for s in plan if s["status"] == "completed"])}
+
+def build_graph(use_async: bool = False, checkpointer=None, reuse_steps: bool = True):
+    """
+    Compile the research graph.
+    With a checkpointer (see get_checkpointer) runs need a thread_id in their config, and a run
+    that was interrupted can be continued with resume_research.
+    reuse_steps=False always runs the agents (e.g. for benchmarks that repeat one query).
+    With use_async=True the agent nodes are coroutines using ainvoke and async HTTP clients;
+    run the graph with ainvoke/astream so many sessions can share one event loop.
+    In-flight LLM and tool calls are capped process-wide (see app.concurrency).
+    """
     workflow = StateGraph(AgentState)
     
-    # Add Nodes
-    workflow.add_node("Lead_Researcher", researcher_node)
-    workflow.add_node("PDF_Analyst", analyst_node)
-    workflow.add_node("Citation_Scout", scout_node)
-    workflow.add_node("Visual_Specialist", visualizer_node)
+    # Add Nodes (each one is timed and metered, see app.telemetry; agent steps whose result is
+    # already known are reused, see app.agents.reuse)
+    nodes = {
+        "Lead_Researcher": aresearcher_node if use_async else researcher_node,
+        "PDF_Analyst": aanalyst_node if use_async else analyst_node,
+        "Citation_Scout": ascout_node if use_async else scout_node,
+        "Visual_Specialist": avisualizer_node if use_async else visualizer_node,
+        "Join_Steps": join_steps,
+    }
+    for name, node in nodes.items():
+        if reuse_steps and name in AGENT_NODES:
+            node = with_step_reuse(node)
+        workflow.add_node(name, instrument_node(name, node))
     
     # Set Entry
     workflow.set_entry_point("Lead_Researcher")
     
-    # Edges from Agents -> Router calculation
-    # We want to check the plan after each agent or after researcher creates plan.
-    
-    # Researcher -> Router
+    # Researcher -> Router: fan out ready steps, synthesize, or finish
     workflow.add_conditional_edges(
         "Lead_Researcher",
         route_manager,
-        {
-            "PDF_Analyst": "PDF_Analyst",
-            "Citation_Scout": "Citation_Scout",
-            "Visual_Specialist": "Visual_Specialist",
-            "Lead_Researcher": "Lead_Researcher", # Loop back for synthesis
-            END: END
-        }
+        AGENT_NODES + ["Lead_Researcher", END]
     )
     
-    # Agents -> Router check (which is effectively just checking plan again)
-    # We can reuse the conditional edge logic, but typically we point to a router node or use conditional edges on all.
+    # Agents -> Join: all steps of a wave finish before the plan is routed again
+    for agent in AGENT_NODES:
+        workflow.add_edge(agent, "Join_Steps")
     
-    # Simply point agents back to "Lead_Researcher" creates a loop through manager.
-    # But optimal P&E often bypasses manager for execution.
-    # Let's add a conditional edge capability to agents to forward to next agent directly or back to manager.
-    
-    for agent in ["PDF_Analyst", "Citation_Scout", "Visual_Specialist"]:
-        workflow.add_conditional_edges(
-            agent,
-            route_manager,
-             {
-                "PDF_Analyst": "PDF_Analyst",
-                "Citation_Scout": "Citation_Scout",
-                "Visual_Specialist": "Visual_Specialist",
-                "Lead_Researcher": "Lead_Researcher",
-                END: END
-            }
-        )
+    workflow.add_conditional_edges(
+        "Join_Steps",
+        route_manager,
+        AGENT_NODES + ["Lead_Researcher", END]
+    )
         
-    return workflow.compile()
+    return workflow.compile(checkpointer=checkpointer)
+
+def run_config(thread_id: str) -> dict:
+    return {"configurable": {"thread_id": thread_id}}
+
+def has_pending_run(graph, thread_id: str) -> bool:
+    """True if the checkpointed run for thread_id stopped before reaching the end."""
+    return bool(thread_id) and bool(graph.get_state(run_config(thread_id)).next)
+
+def discard_run(graph, thread_id: str):
+    """Drop a run's checkpoints (finished runs don't need them, their result is in the chat)."""
+    graph.checkpointer.delete_thread(thread_id)
+
+def stream_research(graph, initial_state: AgentState, config: dict = None):
+    """
+    Run the graph once, yielding UI events as it goes:
+    ("state", state) after every step with the full accumulated state,
+    ("token", text) for each token of the Lead Researcher's synthesis,
+    and finally ("final", state).
+    """
+    final_state = None
+    for mode, chunk in graph.stream(initial_state, config=config, stream_mode=["values", "messages"]):
+        if mode == "values":
+            final_state = chunk
+            yield "state", chunk
+        else:
+            message, metadata = chunk
+            if SYNTHESIS_TAG in (metadata.get("tags") or []) and message.content:
+                yield "token", message.content
+    yield "final", final_state
+
+def resume_research(graph, thread_id: str):
+    """Continue an interrupted checkpointed run from its last completed node; same events as stream_research."""
+    yield from stream_research(graph, None, run_config(thread_id))
@@ -0,0 +1,161 @@
+import os
+import asyncio
+import hashlib
+import threading
+import weakref
+from typing import Any, Dict
+
+import httpx
+from langchain_core.caches import BaseCache
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, Generation
+
+from app.cache import SQLiteCache
+from app.telemetry import TELEMETRY_HANDLER, CACHE_HIT_MARKER
+
+# Users should set OPENAI_API_BASE for local models (e.g. DeepSeek/Qwen) or use standard OpenAI
+DEFAULT_MODEL = "gpt-4o-mini"
+
+LLM_CACHE_TTL_SECONDS = 7 * 24 * 3600
+LLM_CACHE_MAX_ENTRIES = 20_000
+LLM_TIMEOUT = 120.0
+HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=16)
+
+_llm_cache = None
+_http_client = None
+_llm_override = None
+# Sync clients are shared by the whole process; async ones are bound to the event loop they run on
+_llms: Dict[tuple, "ChatOpenAI"] = {}
+_loop_llms: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[tuple, ChatOpenAI]]" = weakref.WeakKeyDictionary()
+# One async HTTP client per event loop, shared by that loop's models: loop -> (client, generator that closes it)
+_loop_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, tuple]" = weakref.WeakKeyDictionary()
+_llms_lock = threading.Lock()
+
+class SQLiteLLMCache(BaseCache):
+    """
+    Exact-match LLM response cache on top of SQLiteCache.
+    The key hashes the serialized messages together with the model and its call parameters.
+    """
+
+    def __init__(self, cache: SQLiteCache):
+        self.cache = cache
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str):
+        stored = self.cache.get(self._key(prompt, llm_string))
+        if stored is None:
+            return None
+        generations = []
+        for item in stored:
+            # Marked so telemetry counts it as a cache hit, not a billed call
+            info = {**(item.get("generation_info") or {}), CACHE_HIT_MARKER: True}
+            if "message" in item:
+                message = messages_from_dict([item["message"]])[0]
+                generations.append(ChatGeneration(message=message, generation_info=info))
+            else:
+                generations.append(Generation(text=item["text"], generation_info=info))
+        return generations
+
+    def update(self, prompt: str, llm_string: str, return_val):
+        stored = []
+        for gen in return_val:
+            item = {"generation_info": {k: v for k, v in (gen.generation_info or {}).items() if k != CACHE_HIT_MARKER} or None}
+            if isinstance(gen, ChatGeneration):
+                item["message"] = message_to_dict(gen.message)
+            else:
+                item["text"] = gen.text
+            stored.append(item)
+        self.cache.set(self._key(prompt, llm_string), stored)
+
+    def clear(self, **kwargs: Any):
+        self.cache.clear()
+
+    # The SQLite calls are short, so the async variants just run them inline
+    async def alookup(self, prompt: str, llm_string: str):
+        return self.lookup(prompt, llm_string)
+
+    async def aupdate(self, prompt: str, llm_string: str, return_val):
+        self.update(prompt, llm_string, return_val)
+
+    async def aclear(self, **kwargs: Any):
+        self.clear()
+
+def get_llm_cache() -> SQLiteLLMCache:
+    global _llm_cache
+    if _llm_cache is None:
+        _llm_cache = SQLiteLLMCache(SQLiteCache("llm_responses", ttl_seconds=LLM_CACHE_TTL_SECONDS, max_entries=LLM_CACHE_MAX_ENTRIES))
+    return _llm_cache
+
+def llm_cache_stats() -> Dict[str, Any]:
+    return get_llm_cache().cache.stats()
+
+def _get_http_client() -> httpx.Client:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.Client(timeout=LLM_TIMEOUT, limits=HTTP_LIMITS)
+    return _http_client
+
+async def _close_at_shutdown(client: httpx.AsyncClient):
+    try:
+        yield
+    finally:
+        await client.aclose()
+
+def _get_async_http_client(loop: asyncio.AbstractEventLoop) -> httpx.AsyncClient:
+    """
+    The async HTTP client for this event loop (httpx async clients can't be shared across loops).
+    It is closed when the loop shuts down: asyncio.run() and other runners close every async
+    generator started on the loop, including the one holding this client.
+    """
+    entry = _loop_http_clients.get(loop)
+    if entry is None:
+        client = httpx.AsyncClient(timeout=LLM_TIMEOUT, limits=HTTP_LIMITS)
+        closer = _close_at_shutdown(client)
+        loop.create_task(closer.__anext__())
+        # The generator is kept here: if it were garbage collected, the client would be closed early
+        entry = _loop_http_clients[loop] = (client, closer)
+    return entry[0]
+
+def get_llm(model: str = DEFAULT_MODEL, temperature: float = 0.0) -> "ChatOpenAI":
+    """
+    Shared chat model for all agents.
+    Instances are reused per (model, temperature, endpoint), so nodes share one HTTP connection pool.
+    Deterministic (temperature 0) calls go through the persistent response cache.
+    """
+    if _llm_override is not None:
+        return _llm_override
+    key = (model, temperature, os.getenv("OPENAI_API_KEY"), os.getenv("OPENAI_API_BASE") or os.getenv("OPENAI_BASE_URL"))
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+
+    with _llms_lock:
+        llms = _llms if loop is None else _loop_llms.setdefault(loop, {})
+        llm = llms.get(key)
+        if llm is None:
+            # Imported on first use: langchain_openai is one of the slowest imports at startup
+            from langchain_openai import ChatOpenAI
+            kwargs = {}
+            if loop is not None:
+                kwargs["http_async_client"] = _get_async_http_client(loop)
+            llm = ChatOpenAI(
+                temperature=temperature,
+                model=model,
+                cache=get_llm_cache() if temperature == 0 else None,
+                http_client=_get_http_client(),
+                # Token usage is reported for streamed calls too, so telemetry can count it
+                stream_usage=True,
+                callbacks=[TELEMETRY_HANDLER],
+                **kwargs,
+            )
+            llms[key] = llm
+        return llm
+
+def set_llm_override(llm):
+    """Make get_llm() return this chat model (e.g. a local stand-in for benchmarks); None restores the default."""
+    global _llm_override
+    _llm_override = llm
@@ -0,0 +1,101 @@
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional
+from langchain_core.messages import SystemMessage, HumanMessage, BaseMessage
+from app.agents.llm import get_llm
+from app.concurrency import io_slot
+from app.rag.retrieval import retrieve_context
+from app.rag.packing import pack_context
+from app.telemetry import span, record
+
+# Quick Chat answers in one retrieval and one streamed LLM call, so it gets a tighter latency
+# target (seconds, end to end) and a smaller context than the research agents
+QUICK_CHAT_LATENCY_TARGET = float(os.getenv("RESEARCH_LAB_QUICK_CHAT_TARGET", "3.0"))
+QUICK_CHAT_TOKEN_BUDGET = int(os.getenv("RESEARCH_LAB_QUICK_CHAT_TOKENS", "1500"))
+QUICK_CHAT_K = 6
+# Earlier chat turns sent along, so short follow-ups still make sense
+QUICK_CHAT_HISTORY_MESSAGES = 4
+# Longer questions are rarely simple lookups
+ROUTER_MAX_WORDS = 25
+
+QUICK_CHAT_SYSTEM_PROMPT = """You answer questions about research papers from the excerpts provided.
+Answer in a few sentences, using only the excerpts. Cite the bracketed sources you use, e.g. [2].
+If the excerpts do not contain the answer, say so."""
+
+# Questions that need planning, several agents or external tools
+_RESEARCH_PATTERN = re.compile(
+    r"\b(compare|comparison|contrast|summari[sz]e|summary|overview|review|critique|evaluate|analy[sz]e|"
+    r"diagram|flowchart|visuali[sz]e|chart|graph|knowledge graph|mermaid|"
+    r"citations?|cite[sd]?|references|related work|other papers|literature|arxiv|scholar|verify|"
+    r"step by step|in detail|explain how|walk me through|pros and cons|strengths and weaknesses)\b",
+    re.IGNORECASE,
+)
+_LOOKUP_PATTERN = re.compile(
+    r"^(what|which|who|whom|when|where|how (many|much|large|big|long|often)|is|are|was|were|does|do|did|can|has|have)\b",
+    re.IGNORECASE,
+)
+
+def route_query(query: str) -> str:
+    """
+    "quick" for lookup-style questions ("what dataset did they use?"), "research" for anything
+    that needs a plan. Pure heuristics, so routing itself costs no LLM round-trip.
+    """
+    text = query.strip()
+    if not text or _RESEARCH_PATTERN.search(text):
+        return "research"
+    if len(text.split()) > ROUTER_MAX_WORDS:
+        return "research"
+    # Several questions in one message need several steps
+    if text.count("?") > 1:
+        return "research"
+    return "quick" if _LOOKUP_PATTERN.match(text) else "research"
+
+def build_quick_messages(query: str, results: List[Dict[str, Any]], history: Optional[List[BaseMessage]] = None):
+    context, metrics = pack_context(results, budget=QUICK_CHAT_TOKEN_BUDGET)
+    prompt = f"""Excerpts:
+{context}
+
+Question: {query}"""
+    recent = list(history or [])[-QUICK_CHAT_HISTORY_MESSAGES:]
+    return [SystemMessage(content=QUICK_CHAT_SYSTEM_PROMPT), *recent, HumanMessage(content=prompt)], metrics
+
+def stream_quick_answer(query: str, collections: Optional[List[str]] = None, history: Optional[List[BaseMessage]] = None):
+    """
+    Quick Chat: one retrieval, one streamed LLM call over packed context.
+    Yields ("token", text) as the answer streams, then ("final", state) with final_answer,
+    documents, a one-span trace and latency metrics (compared against QUICK_CHAT_LATENCY_TARGET).
+    Events have the same shape as stream_research, so the UI can render either.
+    """
+    start = time.perf_counter()
+    first_token_ms = None
+    answer = ""
+    with span("Quick_Chat") as trace_span:
+        results = retrieve_context(query, k=QUICK_CHAT_K, collections=collections)
+        messages, packing = build_quick_messages(query, results, history)
+        llm = get_llm()
+        with io_slot():
+            for chunk in llm.stream(messages):
+                if not chunk.content:
+                    continue
+                if first_token_ms is None:
+                    first_token_ms = (time.perf_counter() - start) * 1000
+                    record("first_token_ms", first_token_ms)
+                answer += chunk.content
+                yield "token", chunk.content
+
+    latency = time.perf_counter() - start
+    metrics = {
+        **packing,
+        "latency_seconds": round(latency, 3),
+        "first_token_seconds": round(first_token_ms / 1000, 3) if first_token_ms is not None else None,
+        "latency_target_seconds": QUICK_CHAT_LATENCY_TARGET,
+        "within_target": latency <= QUICK_CHAT_LATENCY_TARGET,
+    }
+    yield "final", {
+        "user_query": query,
+        "final_answer": answer,
+        "documents": results,
+        "trace": [dict(trace_span)],
+        "quick_chat": metrics,
+    }
@@ -1,24 +1,228 @@
-from typing import Dict, List, Any
+import os
+import re
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Tuple
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+from app.agents.llm import get_llm
 from app.agents.state import AgentState, ResearchPlanStep
+from app.concurrency import io_slot
+from app.rag.retrieval import retrieve_context_batch, best_first
+from app.rag.chunking import count_tokens, truncate_tokens
+from app.rag.packing import source_label
 import json
 
-# Placeholder for DeepSeek/Qwen model config
-# Users should set OPENAI_API_BASE for local models or use standard OpenAI
-LLM_MODEL = "deepseek-ai/DeepSeek-R1-Distill-Qwen-7B" # Conceptual name, might need adjustment based on provider
+PLANNER_SYSTEM_PROMPT = """You are the Lead Researcher in an advanced agentic lab.
+        Your goal is to breakdown the user's research query into steps.
+        Available Agents:
+        - PDF_Analyst: For extracting information from the uploaded paper.
+        - Citation_Scout: For searching external papers and verifying citations.
+        - Visual_Specialist: For creating diagrams (Mermaid) or Knowledge Graphs. It reads the paper itself, so it needs no extra step to feed it.
+        
+        Output a JSON list of steps. Each step must have:
+        - "description": What to do.
+        - "assigned_agent": One of [PDF_Analyst, Citation_Scout, Visual_Specialist].
+        - "depends_on": List of step numbers (1-based) whose results this step needs, or [] if it is independent.
+        Independent steps run in parallel, so only add a dependency when a step really needs another's output.
+        """
+
+# Tags the synthesis LLM call so its tokens can be picked out of the graph's message stream
+SYNTHESIS_TAG = "synthesis"
+
+# Tokens of step results the synthesis prompt may carry; above this, long results are compressed first
+SYNTHESIS_TOKEN_BUDGET = int(os.getenv("RESEARCH_LAB_SYNTHESIS_TOKENS", "6000"))
+# Cap on how much of one step result a compression call reads
+COMPRESSION_INPUT_TOKENS = 8000
+# Parallel compression calls per synthesis (the global io_slot limit still applies)
+COMPRESSION_CONCURRENCY = 8
+# Best chunks of the run's document pool listed as citable sources in the synthesis prompt
+SYNTHESIS_SOURCES = 12
+
+COMPRESSION_SYSTEM_PROMPT = """You condense one step of a research plan for the final write-up.
+        Keep every claim, number, paper title, author, arXiv id and page/section reference (including [n] source markers).
+        Drop repetition, hedging and formatting. Reply with the condensed text only."""
+
+def prefetch_analyst_context(plan: List[ResearchPlanStep], collections: List[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Retrieve context for every PDF_Analyst step in one batched call,
+    so a multi-step plan costs one embedding pass and one vector search.
+    """
+    steps = [s for s in plan if s["assigned_agent"] == "PDF_Analyst"]
+    if not steps:
+        return {}
+    try:
+        batches = retrieve_context_batch([s["description"] for s in steps], collections=collections)
+    except Exception:
+        return {} # Analysts fall back to retrieving on their own
+    return {str(s["id"]): results for s, results in zip(steps, batches)}
+
+def _planning_messages(query: str):
+    prompt = f"User Query: {query}\n\nCreate a research plan."
+    return [SystemMessage(content=PLANNER_SYSTEM_PROMPT), HumanMessage(content=prompt)]
+
+def _parse_plan(response) -> List[ResearchPlanStep]:
+    # Simple JSON parsing (robustness needed in prod)
+    content = response.content.strip()
+    # Handle markdown code blocks if present
+    if "```json" in content:
+        content = content.split("```json")[1].split("```")[0]
+    elif "```" in content:
+        content = content.split("```")[1].split("```")[0]
+        
+    steps_data = json.loads(content)
+    # Add IDs
+    plan = []
+    for i, s in enumerate(steps_data):
+        plan.append({
+            "id": i+1,
+            "description": s["description"],
+            "assigned_agent": s["assigned_agent"],
+            "status": "pending",
+            "result": None,
+            # Only earlier steps can be dependencies; this also rules out cycles
+            "depends_on": [int(d) for d in s.get("depends_on") or [] if str(d).isdigit() and int(d) < i+1],
+            "metrics": {}
+        })
+    return plan
+
+def _plan_update(plan: List[ResearchPlanStep], prefetched: Dict[str, List[Dict[str, Any]]]):
+    return {
+        "research_plan": plan,
+        "current_step_index": 0,
+        "prefetched_context": prefetched,
+        # Prefetched chunks start the run's document pool, which later steps draw from
+        "documents": [r for results in prefetched.values() for r in results],
+        "messages": [AIMessage(content="I have created a research plan.")]
+    }
+
+def _strip_diagrams(text: str) -> str:
+    # The diagram is already shown to the user; the synthesis only needs to know it exists
+    return re.sub(r"```mermaid.*?```", "[Mermaid diagram shown to the user]", text, flags=re.S)
 
-def get_llm():
-    # Fallback/Config wrapper
-    return ChatOpenAI(temperature=0, model="gpt-4o-mini") # Using a reliable default for the boilerplate, user can swap.
+def _result_allowances(sizes: Dict[int, int], budget: int) -> Dict[int, int]:
+    """
+    Split the budget across steps: results smaller than an equal share keep their full size,
+    and what they leave over is shared by the larger ones.
+    """
+    allowances = {}
+    remaining = budget
+    pending = sorted(sizes, key=sizes.get)
+    while pending:
+        share = remaining // len(pending)
+        if sizes[pending[0]] > share:
+            allowances.update((step_id, share) for step_id in pending)
+            break
+        step_id = pending.pop(0)
+        allowances[step_id] = sizes[step_id]
+        remaining -= sizes[step_id]
+    return allowances
+
+def _prepare_results(plan: List[ResearchPlanStep], budget: int = SYNTHESIS_TOKEN_BUDGET) -> Tuple[Dict[int, str], List[Tuple[ResearchPlanStep, str, int]]]:
+    """
+    Step results for the synthesis prompt, plus the (step, text, target tokens) that must be compressed
+    to keep the prompt within budget. Small plans come back untouched, with nothing to compress.
+    """
+    results = {s["id"]: _strip_diagrams(s["result"] or "") for s in plan}
+    sizes = {step_id: count_tokens(text) for step_id, text in results.items()}
+    if sum(sizes.values()) <= budget:
+        return results, []
+    allowances = _result_allowances(sizes, budget)
+    oversized = [
+        (s, results[s["id"]], allowances[s["id"]])
+        for s in plan if sizes[s["id"]] > allowances[s["id"]]
+    ]
+    return results, oversized
+
+def _compression_messages(query: str, step: ResearchPlanStep, text: str, target_tokens: int):
+    prompt = f"""User Query: {query}
+    
+    Step {step['id']} ({step['assigned_agent']}): {step['description']}
+    Result:
+    {truncate_tokens(text, COMPRESSION_INPUT_TOKENS)}
+    
+    Condense this result to at most {max(target_tokens * 3 // 4, 1)} words."""
+    
+    return [SystemMessage(content=COMPRESSION_SYSTEM_PROMPT), HumanMessage(content=prompt)]
+
+def _compress_result(llm, query: str, step: ResearchPlanStep, text: str, target_tokens: int) -> str:
+    with io_slot():
+        response = llm.invoke(_compression_messages(query, step, text, target_tokens))
+    # The model may overshoot; the budget is a hard limit
+    return truncate_tokens(response.content, target_tokens)
+
+async def _acompress_result(llm, query: str, step: ResearchPlanStep, text: str, target_tokens: int) -> str:
+    async with io_slot():
+        response = await llm.ainvoke(_compression_messages(query, step, text, target_tokens))
+    return truncate_tokens(response.content, target_tokens)
+
+def _sources(documents: List[Dict[str, Any]]) -> str:
+    """Distinct source labels (paper, pages, section) of the best pooled chunks."""
+    labels = []
+    for d in best_first(documents or []):
+        label = source_label(d.get("metadata") or {})
+        if label not in labels:
+            labels.append(label)
+        if len(labels) == SYNTHESIS_SOURCES:
+            break
+    return "\n".join(f"- {label}" for label in labels)
+
+def _synthesis_messages(query: str, plan: List[ResearchPlanStep], results: Dict[int, str], documents: List[Dict[str, Any]] = None):
+    # Every result keeps its step/agent label so the answer can still be traced to its source
+    context = "\n".join([f"Step {s['id']} ({s['assigned_agent']}): {results[s['id']]}" for s in plan])
+    
+    prompt = f"""User Query: {query}
+    
+    Research Results:
+    {context}
+    
+    Sources retrieved during the research:
+    {_sources(documents) or "None"}
+    
+    Synthesize a comprehensive answer. Cite the papers and sections used."""
+    
+    return [SystemMessage(content="You are a Lead Researcher. Synthesize the findings."), HumanMessage(content=prompt)]
+
+def synthesize(query: str, plan: List[ResearchPlanStep], documents: List[Dict[str, Any]] = None) -> str:
+    """
+    Final answer for a completed plan, citing the sources in the run's document pool. If the step results exceed SYNTHESIS_TOKEN_BUDGET,
+    the oversized ones are first compressed in parallel (map), then synthesized (reduce),
+    so the synthesis prompt stays bounded however many steps the plan has.
+    """
+    llm = get_llm()
+    results, oversized = _prepare_results(plan)
+    if oversized:
+        with ThreadPoolExecutor(max_workers=min(COMPRESSION_CONCURRENCY, len(oversized))) as pool:
+            # Each task runs in a copy of this node's context (taken here, not in the worker),
+            # so its LLM usage is metered to the node
+            futures = [pool.submit(contextvars.copy_context().run, _compress_result, llm, query, *item) for item in oversized]
+            results.update((step["id"], future.result()) for (step, _, _), future in zip(oversized, futures))
+    with io_slot():
+        response = llm.invoke(_synthesis_messages(query, plan, results, documents), config={"tags": [SYNTHESIS_TAG]})
+    return response.content
+
+async def asynthesize(query: str, plan: List[ResearchPlanStep], documents: List[Dict[str, Any]] = None) -> str:
+    llm = get_llm()
+    results, oversized = _prepare_results(plan)
+    if oversized:
+        gate = asyncio.Semaphore(COMPRESSION_CONCURRENCY)
+
+        async def compress(step, text, target):
+            async with gate:
+                return await _acompress_result(llm, query, step, text, target)
+
+        compressed = await asyncio.gather(*(compress(*item) for item in oversized))
+        results.update((step["id"], text) for (step, _, _), text in zip(oversized, compressed))
+    async with io_slot():
+        response = await llm.ainvoke(_synthesis_messages(query, plan, results, documents), config={"tags": [SYNTHESIS_TAG]})
+    return response.content
 
 def researcher_node(state: AgentState):
     """
     Lead Researcher: Analyzes query and creates a plan.
     """
     query = state["user_query"]
-    messages = state["messages"]
     
     # If a plan exists, this might be a refinement or final synthesis step? 
     # For this simple Plan-Execute flow, we assume:
@@ -28,43 +232,12 @@ def researcher_node(state: AgentState):
     if not state.get("research_plan"):
         # CREATE PLAN
         llm = get_llm()
-        system_msg = """You are the Lead Researcher in an advanced agentic lab.
-        Your goal is to breakdown the user's research query into steps.
-        Available Agents:
-        - PDF_Analyst: For extracting information from the uploaded paper.
-        - Citation_Scout: For searching external papers and verifying citations.
-        - Visual_Specialist: For creating diagrams (Mermaid) or Knowledge Graphs.
+        with io_slot():
+            response = llm.invoke(_planning_messages(query))
         
-        Output a JSON list of steps. Each step must have:
-        - "description": What to do.
-        - "assigned_agent": One of [PDF_Analyst, Citation_Scout, Visual_Specialist].
-        """
-        
-        prompt = f"User Query: {query}\n\nCreate a research plan."
-        response = llm.invoke([SystemMessage(content=system_msg), HumanMessage(content=prompt)])
-        
-        # Simple JSON parsing (robustness needed in prod)
         try:
-            content = response.content.strip()
-            # Handle markdown code blocks if present
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0]
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0]
-                
-            steps_data = json.loads(content)
-            # Add IDs
-            plan = []
-            for i, s in enumerate(steps_data):
-                plan.append({
-                    "id": i+1,
-                    "description": s["description"],
-                    "assigned_agent": s["assigned_agent"],
-                    "status": "pending",
-                    "result": None
-                })
-            
-            return {"research_plan": plan, "current_step_index": 0, "messages": [AIMessage(content="I have created a research plan.")]}
+            plan = _parse_plan(response)
+            return _plan_update(plan, prefetch_analyst_context(plan, state.get("collections")))
         except Exception as e:
             return {"messages": [AIMessage(content=f"Error creating plan: {e}")]}
 
@@ -74,17 +247,30 @@ def researcher_node(state: AgentState):
         plan = state["research_plan"]
         if all(s["status"] == "completed" for s in plan):
             # Synthesize final answer
-            llm = get_llm()
-            context = "\n".join([f"Step {s['id']} ({s['assigned_agent']}): {s['result']}" for s in plan])
-            
-            prompt = f"""User Query: {query}
-            
-            Research Results:
-            {context}
-            
-            Synthesize a comprehensive answer. Cite the papers and sections used."""
-            
-            response = llm.invoke([SystemMessage(content="You are a Lead Researcher. Synthesize the findings."), HumanMessage(content=prompt)])
-            return {"final_answer": response.content}
+            return {"final_answer": synthesize(query, plan, state.get("documents"))}
         
         return {} # Continue graph execution
+
+async def aresearcher_node(state: AgentState):
+    """
+    Lead Researcher (async): same as researcher_node, without blocking the event loop.
+    """
+    query = state["user_query"]
+    
+    if not state.get("research_plan"):
+        llm = get_llm()
+        async with io_slot():
+            response = await llm.ainvoke(_planning_messages(query))
+        
+        try:
+            plan = _parse_plan(response)
+            # Batched retrieval is local CPU work, so it runs off the loop
+            return _plan_update(plan, await asyncio.to_thread(prefetch_analyst_context, plan, state.get("collections")))
+        except Exception as e:
+            return {"messages": [AIMessage(content=f"Error creating plan: {e}")]}
+
+    plan = state["research_plan"]
+    if all(s["status"] == "completed" for s in plan):
+        return {"final_answer": await asynthesize(query, plan, state.get("documents"))}
+    
+    return {}
@@ -0,0 +1,118 @@
+"""
+Reuse of completed research steps across runs.
+
+A step's result is stored under a key made of everything that determines it: the agent, the
+step description, the papers in scope (by file hash) and the results of the steps it depends on.
+When a later plan (e.g. for a follow-up question) contains a matching step, the stored result is
+used instead of running the agent again. Steps that are already completed, e.g. when a checkpointed
+run is resumed, are skipped outright.
+"""
+import json
+import hashlib
+import inspect
+import threading
+from functools import wraps
+from typing import Any, Dict, Optional, Tuple
+
+from app.agents.state import AgentState, ResearchPlanStep, get_active_step, dependency_results
+from app.cache import SQLiteCache
+from app.telemetry import record
+
+STEP_CACHE_TTL_SECONDS = 7 * 24 * 3600
+# Scope fingerprints kept in memory, keyed by manifest revision and collections
+FINGERPRINT_CACHE_SIZE = 64
+
+_cache = None
+_cache_lock = threading.Lock()
+_fingerprints: Dict[tuple, list] = {}
+_fingerprints_lock = threading.Lock()
+
+def get_step_cache() -> SQLiteCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SQLiteCache("step_results", ttl_seconds=STEP_CACHE_TTL_SECONDS)
+        return _cache
+
+def _scope_fingerprint(collections) -> list:
+    # Adding or changing a paper in scope changes what a step would find, so it is part of the key.
+    # The manifest lists every chunk id, so it is parsed once per revision, not once per step.
+    from app.rag.manifest import load_manifest, manifest_revision
+    from app.rag.retrieval import DEFAULT_COLLECTION
+
+    names = tuple(sorted(collections or [DEFAULT_COLLECTION]))
+    key = (manifest_revision(), names)
+    with _fingerprints_lock:
+        if key in _fingerprints:
+            return _fingerprints[key]
+    indexed = load_manifest()["collections"]
+    fingerprint = [
+        [name, sorted((source, entry["file_hash"]) for source, entry in indexed.get(name, {}).items())]
+        for name in names
+    ]
+    with _fingerprints_lock:
+        if len(_fingerprints) >= FINGERPRINT_CACHE_SIZE:
+            _fingerprints.clear()
+        _fingerprints[key] = fingerprint
+    return fingerprint
+
+def step_key(state: AgentState, step: ResearchPlanStep) -> str:
+    parts = [
+        step["assigned_agent"],
+        " ".join(step["description"].lower().split()),
+        _scope_fingerprint(state.get("collections")),
+        dependency_results(state, step),
+    ]
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+def _reuse(state: AgentState) -> Tuple[ResearchPlanStep, Optional[str], Optional[Dict[str, Any]]]:
+    """(step, cache key, update to return instead of running the agent, or None to run it)."""
+    step = get_active_step(state)
+    if step["status"] == "completed":
+        return step, None, {}
+    key = step_key(state, step)
+    cached = get_step_cache().get(key)
+    if cached is None:
+        return step, key, None
+    record("steps_reused")
+    done = {**step, "status": "completed", "result": cached["result"], "metrics": {**(cached.get("metrics") or {}), "reused": 1}}
+    update = {"research_plan": [done]}
+    diagrams = [d for d in cached.get("diagrams") or [] if d not in (state.get("diagrams") or [])]
+    if diagrams:
+        update["diagrams"] = diagrams
+    if cached.get("documents"):
+        update["documents"] = cached["documents"]
+    return step, key, update
+
+def _remember(step: ResearchPlanStep, key: str, update: Dict[str, Any]):
+    done = next((s for s in (update or {}).get("research_plan") or [] if s["id"] == step["id"]), None)
+    if done and done["status"] == "completed" and done["result"]:
+        get_step_cache().set(key, {
+            "result": done["result"],
+            "metrics": done.get("metrics") or {},
+            "diagrams": update.get("diagrams") or [],
+            "documents": update.get("documents") or [],
+        })
+
+def with_step_reuse(fn):
+    """Wrap an agent node so completed steps are skipped and matching earlier results are reused."""
+    if inspect.iscoroutinefunction(fn):
+        @wraps(fn)
+        async def async_wrapper(state):
+            step, key, update = _reuse(state)
+            if update is not None:
+                return update
+            update = await fn(state)
+            _remember(step, key, update)
+            return update
+        return async_wrapper
+
+    @wraps(fn)
+    def wrapper(state):
+        step, key, update = _reuse(state)
+        if update is not None:
+            return update
+        update = fn(state)
+        _remember(step, key, update)
+        return update
+    return wrapper
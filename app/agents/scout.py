@@ -1,47 +1,72 @@
-from app.agents.state import AgentState
+import asyncio
+from app.agents.state import AgentState, get_active_step, dependency_results
+from app.agents.llm import get_llm
+from app.concurrency import io_slot
 from app.tools.arxiv_tool import search_arxiv_papers
 from app.tools.search_tool import google_scholar_search
-from langchain_openai import ChatOpenAI
+from app.rag.references import lookup_citations
 from langchain_core.messages import SystemMessage, HumanMessage
 import json
 
-def get_llm():
-    return ChatOpenAI(temperature=0, model="gpt-4o-mini")
+def _build_messages(state: AgentState, step, results):
+    earlier = dependency_results(state, step)
+    prompt = f"""Task: {step["description"]}
+    
+    Results from earlier steps:
+    {earlier or "None"}
+    
+    Search Results:
+    {results}
+    
+    Summarize the findings."""
+    
+    return [SystemMessage(content="You are a Citation Scout."), HumanMessage(content=prompt)]
+
+def _complete_step(step, response, citations_from_table: int = 0):
+    step["status"] = "completed"
+    step["result"] = response.content
+    if citations_from_table:
+        step["metrics"] = {**(step.get("metrics") or {}), "citations_from_table": citations_from_table}
+    
+    return {"research_plan": [step]}
 
 def scout_node(state: AgentState):
     """
     Citation Scout: Verifies and searches for citations.
     """
-    plan = state["research_plan"]
-    current_idx = state["current_step_index"]
-    step = plan[current_idx]
+    step = get_active_step(state)
     
     if step["assigned_agent"] != "Citation_Scout":
         return {}
 
     query = step["description"]
     
-    # 1. Decide Tool
-    # Simple logic: If verification -> Arxiv, if impact -> Scholar/Serper
-    # For now, search Arxiv.
-    
-    results = search_arxiv_papers.invoke({"query": query})
+    # 1. Look the citations up in the paper's citation table (built at ingest),
+    # and only search arXiv when it has nothing for this step
+    local = lookup_citations(query, state.get("collections"))
+    results = local if local is not None else search_arxiv_papers.invoke({"query": query})
     
     # 2. Analyze
     llm = get_llm()
-    prompt = f"""Task: {query}
-    
-    Search Results:
-    {results}
-    
-    Summarize the findings."""
+    with io_slot():
+        response = llm.invoke(_build_messages(state, step, results))
     
-    response = llm.invoke([SystemMessage(content="You are a Citation Scout."), HumanMessage(content=prompt)])
+    return _complete_step(step, response, len(local or []))
+
+async def ascout_node(state: AgentState):
+    """
+    Citation Scout (async): same as scout_node, without blocking the event loop.
+    """
+    step = get_active_step(state)
     
-    step["status"] = "completed"
-    step["result"] = response.content
+    if step["assigned_agent"] != "Citation_Scout":
+        return {}
+
+    local = await asyncio.to_thread(lookup_citations, step["description"], state.get("collections"))
+    results = local if local is not None else await search_arxiv_papers.ainvoke({"query": step["description"]})
     
-    new_plan = [s for s in plan]
-    new_plan[current_idx] = step
+    llm = get_llm()
+    async with io_slot():
+        response = await llm.ainvoke(_build_messages(state, step, results))
     
-    return {"research_plan": new_plan, "current_step_index": current_idx + 1}
+    return _complete_step(step, response, len(local or []))
@@ -1,6 +1,14 @@
-from typing import TypedDict, Annotated, List, Dict, Any
+import operator
+from typing import TypedDict, Annotated, List, Dict, Any, Optional
 from langgraph.graph.message import add_messages
 from langchain_core.messages import BaseMessage
+from app.rag.lexical import tokenize
+from app.rag.retrieval import rank_key
+
+# A pooled chunk is relevant to a query if it contains this share of the query's terms
+POOL_MIN_COVERAGE = 0.5
+# Pooled chunks a step needs before it skips the vector store (fewer if it asks for fewer)
+POOL_MIN_HITS = 3
 
 class ResearchPlanStep(TypedDict):
     id: int
@@ -8,13 +16,99 @@ class ResearchPlanStep(TypedDict):
     assigned_agent: str
     status: str # "pending", "in_progress", "completed"
     result: str | None
+    depends_on: List[int] # Ids of steps whose results this step needs
+    metrics: Dict[str, Any] # Per-step measurements, e.g. prompt tokens saved by context packing
+
+def merge_plan(left: List[ResearchPlanStep], right: List[ResearchPlanStep]) -> List[ResearchPlanStep]:
+    """
+    Reducer for research_plan so steps running in parallel can each return only their own step.
+    Updates are merged by step id (new ids are appended); an empty list resets the plan.
+    """
+    if not right:
+        return []
+    merged = {s["id"]: s for s in left or []}
+    for s in right:
+        merged[s["id"]] = s
+    return list(merged.values())
+
+def merge_documents(left: List[Dict[str, Any]], right: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Reducer for documents, the run's pool of retrieved chunks.
+    Chunks are deduplicated by id, keeping the best ranked copy (see retrieval.with_ranks);
+    new ids are appended.
+    """
+    merged = {d["id"]: d for d in left or []}
+    for d in right or []:
+        known = merged.get(d["id"])
+        # Ranks are comparable across retrieval paths; raw scores (dense, RRF, section cosine) are not
+        if known is None or rank_key(d) < rank_key(known):
+            merged[d["id"]] = d
+    return list(merged.values())
 
 class AgentState(TypedDict):
     messages: Annotated[List[BaseMessage], add_messages]
     user_query: str
-    research_plan: List[ResearchPlanStep]
-    documents: List[Dict[str, Any]] # Chunk content, metadata
+    research_plan: Annotated[List[ResearchPlanStep], merge_plan]
+    documents: Annotated[List[Dict[str, Any]], merge_documents] # Every chunk retrieved during the run (id, content, metadata, score)
     verified_citations: List[Dict[str, Any]]
-    diagrams: List[str] # Mermaid code or JSON
+    diagrams: Annotated[List[str], operator.add] # Mermaid code or JSON
     current_step_index: int
     final_answer: str
+    prefetched_context: Dict[str, List[Dict[str, Any]]] # Step id -> retrieved chunks, filled when the plan is created
+    active_step_id: int # Set on the per-step state an agent receives when steps are fanned out
+    collections: List[str] # Vector store collections retrieval is scoped to (empty = default collection)
+    trace: Annotated[List[Dict[str, Any]], operator.add] # One span per node invocation (see app.telemetry)
+
+def get_active_step(state: AgentState) -> ResearchPlanStep:
+    """The step an agent invocation should work on (a copy, safe to modify)."""
+    plan = state["research_plan"]
+    step_id = state.get("active_step_id")
+    if step_id is None:
+        return dict(plan[state["current_step_index"]])
+    return dict(next(s for s in plan if s["id"] == step_id))
+
+def ready_steps(plan: List[ResearchPlanStep]) -> List[ResearchPlanStep]:
+    """Pending steps whose dependencies are all completed (unknown ids count as satisfied)."""
+    status = {s["id"]: s["status"] for s in plan}
+    pending = [s for s in plan if s["status"] == "pending"]
+    ready = [
+        s for s in pending
+        if all(status.get(dep, "completed") == "completed" for dep in s.get("depends_on") or [])
+    ]
+    # A dependency cycle would otherwise stall the plan; run the earliest step to break it
+    if pending and not ready:
+        ready = pending[:1]
+    return ready
+
+def dependency_results(state: AgentState, step: ResearchPlanStep) -> str:
+    """Results of the steps this step depends on, formatted for a prompt ("" if none)."""
+    deps = set(step.get("depends_on") or [])
+    return "\n".join(
+        f"Step {s['id']} ({s['assigned_agent']}): {s['result']}"
+        for s in state["research_plan"]
+        if s["id"] in deps and s["result"]
+    )
+
+def pooled_results(state: AgentState, query: str, k: int = 5) -> List[Dict[str, Any]]:
+    """
+    Chunks already in the run's document pool that cover at least POOL_MIN_COVERAGE of the
+    query's terms, best first (at most k). Empty if nothing retrieved so far is relevant.
+    """
+    terms = set(tokenize(query))
+    if not terms:
+        return []
+    hits = []
+    for d in state.get("documents") or []:
+        coverage = len(terms & set(tokenize(d["content"]))) / len(terms)
+        if coverage >= POOL_MIN_COVERAGE:
+            hits.append((-coverage, rank_key(d), d))
+    hits.sort(key=lambda h: (h[0], h[1]))
+    return [d for _, _, d in hits[:k]]
+
+def pooled_context(state: AgentState, query: str, k: int = 5) -> Optional[List[Dict[str, Any]]]:
+    """
+    pooled_results() if the pool has enough of them for a step to skip the vector store
+    (POOL_MIN_HITS, or k if smaller), else None.
+    """
+    pooled = pooled_results(state, query, k)
+    return pooled if pooled and len(pooled) >= min(POOL_MIN_HITS, k) else None
@@ -1,30 +1,45 @@
-from app.agents.state import AgentState
-from langchain_openai import ChatOpenAI
+import asyncio
+from app.agents.state import AgentState, get_active_step, dependency_results, pooled_context
+from app.agents.llm import get_llm
+from app.concurrency import io_slot
+from app.rag.retrieval import retrieve_context
+from app.rag.packing import pack_context
+from app.telemetry import record
 from langchain_core.messages import SystemMessage, HumanMessage
 
-def get_llm():
-    return ChatOpenAI(temperature=0, model="gpt-4o-mini")
+# Diagrams need the gist of the paper, not every detail
+VISUAL_CONTEXT_K = 4
+VISUAL_CONTEXT_TOKENS = 1200
 
-def visualizer_node(state: AgentState):
+def _paper_context(state: AgentState, query: str):
     """
-    Visual Specialist: Generates Mermaid diagrams.
+    (chunks to ground the diagram in, chunks that had to be retrieved for it).
+    Chunks already in the run's document pool are used if there are enough of them (the same
+    rule as the analyst's); otherwise the vector store is searched.
     """
-    plan = state["research_plan"]
-    current_idx = state["current_step_index"]
-    step = plan[current_idx]
-    
-    if step["assigned_agent"] != "Visual_Specialist":
-        return {}
+    pooled = pooled_context(state, query, k=VISUAL_CONTEXT_K)
+    if pooled is not None:
+        record("pool_hits")
+        return pooled, None
+    retrieved = retrieve_context(query, k=VISUAL_CONTEXT_K, collections=state.get("collections"))
+    return retrieved, retrieved
 
+def _build_messages(state: AgentState, step, results):
     query = step["description"]
     
-    # Context? Might need context from previous steps or PDF.
-    # We will look at previous steps results for context if needed, or PDF RAG.
-    # For simplicity, assume the query describes what to visualize based on general knowledge or explicit context provided in the query itself.
+    # Context comes from the steps this one depends on (e.g. an analyst step describing the architecture)
+    # and from the paper itself, so the diagram is grounded even without dependencies.
+    earlier = dependency_results(state, step)
+    context, _ = pack_context(results, budget=VISUAL_CONTEXT_TOKENS)
     
-    llm = get_llm()
     prompt = f"""Task: {query}
     
+    Results from earlier steps:
+    {earlier or "None"}
+    
+    Context from PDF:
+    {context or "None"}
+    
     Generate a Mermaid.js diagram code block.
     Format:
     ```mermaid
@@ -32,8 +47,9 @@ def visualizer_node(state: AgentState):
     ```
     Only output the code."""
     
-    response = llm.invoke([SystemMessage(content="You are a Visual Specialist. Create valid Mermaid diagrams."), HumanMessage(content=prompt)])
-    
+    return [SystemMessage(content="You are a Visual Specialist. Create valid Mermaid diagrams."), HumanMessage(content=prompt)]
+
+def _complete_step(step, response, retrieved=None):
     content = response.content
     diagram = ""
     if "```mermaid" in content:
@@ -46,11 +62,41 @@ def visualizer_node(state: AgentState):
     step["status"] = "completed"
     step["result"] = f"Generated Diagram:\n```mermaid\n{diagram}\n```"
     
-    new_plan = [s for s in plan]
-    new_plan[current_idx] = step
+    # Store diagram in state list (the diagrams reducer appends)
+    update = {"research_plan": [step], "diagrams": [diagram]}
+    if retrieved:
+        update["documents"] = retrieved
+    return update
+
+def visualizer_node(state: AgentState):
+    """
+    Visual Specialist: Generates Mermaid diagrams.
+    """
+    step = get_active_step(state)
+    
+    if step["assigned_agent"] != "Visual_Specialist":
+        return {}
+
+    results, retrieved = _paper_context(state, step["description"])
+    llm = get_llm()
+    with io_slot():
+        response = llm.invoke(_build_messages(state, step, results))
+    
+    return _complete_step(step, response, retrieved)
+
+async def avisualizer_node(state: AgentState):
+    """
+    Visual Specialist (async): same as visualizer_node, without blocking the event loop.
+    """
+    step = get_active_step(state)
     
-    # Store diagram in state list
-    current_diagrams = state.get("diagrams", []) or []
-    current_diagrams.append(diagram)
+    if step["assigned_agent"] != "Visual_Specialist":
+        return {}
+
+    # Retrieval is local CPU work, so it runs off the loop
+    results, retrieved = await asyncio.to_thread(_paper_context, state, step["description"])
+    llm = get_llm()
+    async with io_slot():
+        response = await llm.ainvoke(_build_messages(state, step, results))
     
-    return {"research_plan": new_plan, "current_step_index": current_idx + 1, "diagrams": current_diagrams}
+    return _complete_step(step, response, retrieved)
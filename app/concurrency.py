@@ -0,0 +1,149 @@
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+
+# Process-wide cap on in-flight LLM and external tool calls, shared by every research session
+MAX_CONCURRENCY = int(os.getenv("RESEARCH_LAB_MAX_CONCURRENCY", "16"))
+
+class _SyncWaiter:
+    def __init__(self):
+        self.event = threading.Event()
+
+class ConcurrencyLimiter:
+    """
+    A semaphore usable from both threads (`with`) and coroutines (`async with`), across event loops.
+    Async waiters park on a future of their own loop, so waiting holds no thread.
+    A released slot is handed directly to the oldest waiter.
+    """
+
+    def __init__(self, limit: int):
+        self._limit = limit
+        self._active = 0
+        self._lock = threading.Lock()
+        self._waiters = deque()
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    def set_limit(self, limit: int):
+        with self._lock:
+            grow = max(limit - self._limit, 0)
+            self._limit = limit
+        for _ in range(grow):
+            # Extra capacity goes to anyone already waiting
+            self._release(new_slot=True)
+
+    def _release(self, new_slot: bool = False):
+        with self._lock:
+            if new_slot:
+                self._active += 1
+            elif self._active > self._limit:
+                # The limit was lowered; retire this slot instead of handing it on
+                self._active -= 1
+                return
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if isinstance(waiter, _SyncWaiter):
+                    waiter.event.set()
+                    return
+                loop, future = waiter
+                if loop.is_closed():
+                    continue
+                loop.call_soon_threadsafe(self._wake, future)
+                return
+            self._active -= 1
+
+    def _wake(self, future: asyncio.Future):
+        if future.cancelled():
+            self._release()
+        else:
+            future.set_result(None)
+
+    def __enter__(self):
+        with self._lock:
+            if self._active < self._limit:
+                self._active += 1
+                return self
+            waiter = _SyncWaiter()
+            self._waiters.append(waiter)
+        waiter.event.wait()
+        return self
+
+    def __exit__(self, *exc):
+        self._release()
+
+    async def __aenter__(self):
+        with self._lock:
+            if self._active < self._limit:
+                self._active += 1
+                return self
+            loop = asyncio.get_running_loop()
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                try:
+                    self._waiters.remove(waiter)
+                    granted = False
+                except ValueError:
+                    granted = waiter[1].done() and not waiter[1].cancelled()
+            if granted:
+                self._release()
+            raise
+        return self
+
+    async def __aexit__(self, *exc):
+        self._release()
+
+class RateLimiter:
+    """
+    Token bucket shared by threads and coroutines: `limiter.acquire()` or `await limiter.aacquire()`.
+    Each call reserves the next free token and then sleeps until it is due, outside the lock,
+    so concurrent callers are spaced out in arrival order.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate        # tokens per second
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            # A negative balance is a debt that the caller waits off
+            return max(-self._tokens / self.rate, 0.0)
+
+    def acquire(self):
+        delay = self._reserve()
+        if delay:
+            time.sleep(delay)
+
+    async def aacquire(self):
+        delay = self._reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+_limiter = ConcurrencyLimiter(MAX_CONCURRENCY)
+
+def io_slot() -> ConcurrencyLimiter:
+    """
+    Wrap every LLM or external tool call: `with io_slot():` in sync code, `async with io_slot():` in async code.
+    """
+    return _limiter
+
+def set_max_concurrency(limit: int):
+    _limiter.set_limit(limit)
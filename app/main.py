@@ -6,24 +6,85 @@ if str(ROOT_DIR) not in sys.path:
     sys.path.insert(0, str(ROOT_DIR))
 
 
-import streamlit as st
-import os
-import sys
-import tempfile
+from app.startup import timed, mark, start_warmup
+
+with timed("import ui"):
+    import streamlit as st
+    import os
+    import sys
+    import tempfile
+    import uuid
 
-# Add project root to sys.path to allow 'from app...' imports
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+    # Add project root to sys.path to allow 'from app...' imports
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from app.ui.sidebar import render_sidebar
-from app.ui.chat import render_chat_history, render_plan_status, render_mermaid
-from app.agents.graph import build_graph
-from app.rag.ingestion import ingest_pdf
-from langchain_core.messages import HumanMessage
+    from app.ui.sidebar import render_sidebar, render_scope_selector
+    from app.ui.chat import render_chat_history, render_plan_status, render_mermaid, render_trace_summary, render_quick_chat_status
+    from langchain_core.messages import HumanMessage, AIMessage
+# langgraph, langchain_openai, chromadb and the embedding model are imported lazily:
+# the warm-up thread loads them while the first page renders.
 
 st.set_page_config(page_title="Agentic Research Lab", layout="wide")
 
+@st.cache_resource(show_spinner=False)
+def warm_up():
+    # Once per process; every session shares the loaded model and vector store
+    from app.telemetry import METRICS_PORT, start_metrics_server
+    if METRICS_PORT:
+        start_metrics_server(int(METRICS_PORT))
+    return start_warmup()
+
+@st.cache_resource(show_spinner="Loading agents...")
+def load_graph():
+    with timed("build graph"):
+        from app.agents.graph import build_graph, get_checkpointer
+        return build_graph(checkpointer=get_checkpointer())
+
+def run_research(events, monitor):
+    """Render a graph run (fresh or resumed) as it streams and return its final state."""
+    from app.agents.state import ready_steps
+
+    # Single streaming run: the plan view updates after every step and the
+    # synthesis is rendered token by token as soon as it starts.
+    final_state = None
+    answer_box = None
+    answer = ""
+    with st.spinner("Agents are working..."):
+        for kind, payload in events:
+            if kind == "state":
+                plan = payload.get("research_plan") or []
+                # Steps that are about to be fanned out are shown as running
+                running = {s["id"] for s in ready_steps(plan)} if not payload.get("final_answer") else set()
+                with monitor.container():
+                    render_plan_status([{**s, "status": "in_progress"} if s["id"] in running else s for s in plan])
+            elif kind == "token":
+                if answer_box is None:
+                    answer_box = st.chat_message("assistant").empty()
+                answer += payload
+                answer_box.markdown(answer + "▌")
+            else:
+                final_state = payload
+    return final_state
+
+def finish_run(final_state):
+    from app.agents.graph import discard_run
+
+    if final_state and final_state.get("final_answer"):
+        st.session_state.messages.append(AIMessage(content=final_state["final_answer"]))
+
+    st.session_state.plan = (final_state or {}).get("research_plan", [])
+    st.session_state.diagrams = (final_state or {}).get("diagrams", [])
+    st.session_state.trace = (final_state or {}).get("trace", [])
+    st.session_state.quick_chat = None
+
+    # The run is done, so its checkpoints are no longer needed
+    discard_run(load_graph(), st.session_state.pop("run_id"))
+    st.query_params.pop("run", None)
+    st.rerun()
+
 def main():
-    render_sidebar()
+    warm_up()
+    mode = render_sidebar()
     
     st.title("🧪 Agentic Research Lab")
     st.caption("Advanced Multi-Agent System for Research Paper Analysis")
@@ -31,107 +92,151 @@ def main():
     # Session State Init
     if "messages" not in st.session_state:
         st.session_state.messages = []
-    if "graph" not in st.session_state:
-        st.session_state.graph = build_graph()
     if "plan" not in st.session_state:
         st.session_state.plan = []
     if "diagrams" not in st.session_state:
         st.session_state.diagrams = []
+    if "trace" not in st.session_state:
+        st.session_state.trace = []
+    if "quick_chat" not in st.session_state:
+        st.session_state.quick_chat = None
+    # The id of the current research run is kept in the URL too, so a run interrupted by
+    # a crash or a reload can still be resumed from its checkpoints
+    if "run_id" not in st.session_state and st.query_params.get("run"):
+        st.session_state.run_id = st.query_params["run"]
 
     # File Upload
     uploaded_file = st.file_uploader("Upload Research Paper (PDF)", type="pdf")
     
     if uploaded_file:
         if "current_file" not in st.session_state or st.session_state.current_file != uploaded_file.name:
-            with st.spinner("Analyzing PDF structure and creating vector embeddings..."):
-                # Save to temp
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-                    tmp.write(uploaded_file.read())
-                    temp_path = tmp.name
-                
-                success, msg = ingest_pdf(temp_path)
-                if success:
-                    st.success(f"File processed: {msg}")
-                    st.session_state.current_file = uploaded_file.name
-                else:
-                    st.error(f"Error: {msg}")
+            # Save to temp
+            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
+                tmp.write(uploaded_file.read())
+                temp_path = tmp.name
+            
+            from app.rag.ingestion import ingest_pdf_stream
+            from app.rag.retrieval import paper_collection_name
+
+            # Each paper gets its own collection, so questions about it only search it
+            collection = paper_collection_name(uploaded_file.name)
+
+            # Stream ingestion so chunks are searchable (and progress visible) as pages land
+            progress_bar = st.progress(0.0, text="Analyzing PDF structure and creating vector embeddings...")
+            try:
+                for event in ingest_pdf_stream(temp_path, collection_name=collection, source_name=uploaded_file.name):
+                    if event["total_pages"]:
+                        progress_bar.progress(min(event["pages_done"] / event["total_pages"], 1.0), text=event["message"])
+            finally:
+                os.unlink(temp_path)
+            progress_bar.empty()
+            success, msg = event["success"], event["message"]
+            if success:
+                st.success(f"File processed: {msg}")
+                st.session_state.current_file = uploaded_file.name
+                st.session_state.current_collection = collection
+            else:
+                st.error(f"Error: {msg}")
+
+    scope = render_scope_selector(st.session_state.get("current_collection"))
 
     # Layout
     col1, col2 = st.columns([2, 1])
 
+    # The monitor is laid out first so it can be updated in place while agents run
+    with col2:
+        st.subheader("Live Agent Monitor")
+        monitor = st.empty()
+        with monitor.container():
+            render_plan_status(st.session_state.plan)
+        render_quick_chat_status(st.session_state.quick_chat)
+        render_trace_summary(st.session_state.trace)
+        
+        if st.session_state.diagrams:
+            st.subheader("Visualizations")
+            for diag in st.session_state.diagrams:
+                render_mermaid(diag)
+
     with col1:
         st.subheader("Chat & Research")
         render_chat_history(st.session_state.messages)
-        
+
+        run_id = st.session_state.get("run_id")
+        if run_id:
+            from app.agents.graph import has_pending_run, resume_research, discard_run, run_config
+
+            graph = load_graph()
+            if has_pending_run(graph, run_id):
+                pending = graph.get_state(run_config(run_id)).values
+                st.warning(f"The research run for \"{pending.get('user_query', '')}\" was interrupted.")
+                resume_col, discard_col = st.columns(2)
+                if resume_col.button("Resume", use_container_width=True):
+                    if not st.session_state.messages:
+                        st.session_state.messages.append(HumanMessage(content=pending.get("user_query", "")))
+                    finish_run(run_research(resume_research(graph, run_id), monitor))
+                if discard_col.button("Discard", use_container_width=True):
+                    discard_run(graph, st.session_state.pop("run_id"))
+                    st.query_params.pop("run", None)
+                    st.rerun()
+            else:
+                st.session_state.pop("run_id")
+                st.query_params.pop("run", None)
+
         user_input = st.chat_input("Ask a question about the paper...")
         
         if user_input:
             # Add user message
             st.session_state.messages.append(HumanMessage(content=user_input))
+            with st.chat_message("user"):
+                st.write(user_input)
             
-            # Prepare State
+            if mode == "Auto":
+                from app.agents.quick_chat import route_query
+                mode = "Quick Chat" if route_query(user_input) == "quick" else "Research Mode"
+
+            if mode == "Quick Chat":
+                from app.agents.quick_chat import stream_quick_answer
+
+                # One retrieval and one streamed LLM call, no planning
+                answer_box = st.chat_message("assistant").empty()
+                answer = ""
+                final_state = None
+                for kind, payload in stream_quick_answer(user_input, collections=scope, history=st.session_state.messages[:-1]):
+                    if kind == "token":
+                        answer += payload
+                        answer_box.markdown(answer + "▌")
+                    else:
+                        final_state = payload
+                st.session_state.messages.append(AIMessage(content=final_state["final_answer"]))
+                st.session_state.trace = final_state["trace"]
+                st.session_state.quick_chat = final_state["quick_chat"]
+                st.rerun()
+
+            # Prepare State. Every query gets a fresh plan; steps matching ones that already
+            # ran (same description, inputs and papers) are reused, see app.agents.reuse
             initial_state = {
                 "messages": st.session_state.messages,
                 "user_query": user_input,
-                "research_plan": st.session_state.plan,
-                "current_step_index": len([s for s in st.session_state.plan if s["status"]=="completed"]), # Resume or start
+                "research_plan": [],
+                "current_step_index": 0,
                 "documents": [],
                 "verified_citations": [],
-                "diagrams": st.session_state.diagrams
+                "diagrams": st.session_state.diagrams,
+                "prefetched_context": {},
+                "collections": scope,
+                "trace": []
             }
-            
-            # Reset plan if it's a new discrete query? 
-            # For this simple "Lead Researcher" flow, if we want a fresh plan for a fresh query, we might want to clear old plan.
-            # But maybe we want context. Let's assume new query = new plan for now to keep it clean.
-            if len(st.session_state.messages) > 2: # Heuristic: if verifying or follow up, maybe keep? 
-                # Simplification: Always refresh plan for new root query
-                initial_state["research_plan"] = []
-                initial_state["current_step_index"] = 0
-            
-            with st.spinner("Agents are working..."):
-                # Stream the graph updates
-                # We need to capture the final state
-                final_state = None
-                for event in st.session_state.graph.stream(initial_state):
-                    # We can log events or update UI incrementally here if we want detailed "Thought" process
-                    for key, value in event.items():
-                        # Update session state plan live?
-                        if "research_plan" in value:
-                            st.session_state.plan = value["research_plan"]
-                            # Force rerun to show plan update?
-                            # st.rerun() # effectively reloads, might be jittery. Better to just wait for final.
-                            pass
-                        if "diagrams" in value:
-                            st.session_state.diagrams = value["diagrams"]
-                            
-                    # Last event is usually the final state
-                    final_state = value # This might be partial, need to be careful with stream
-            
-            # After loop, final_state might be the last node output. 
-            # We want the "accumulated" state logic handling or just rely on what we stored.
-            # LangGraph stream output depends on config.
-            
-            # Let's run invoke() instead for simplicity if streaming is complex to render right now, 
-            # but stream is better for UX.
-            # For this boilerplate, let's use invoke() to ensure we get the final complete state easily.
-            final_state = st.session_state.graph.invoke(initial_state)
-            
-            if "final_answer" in final_state and final_state["final_answer"]:
-                st.session_state.messages.append(AIMessage(content=final_state["final_answer"]))
-            
-            st.session_state.plan = final_state.get("research_plan", [])
-            st.session_state.diagrams = final_state.get("diagrams", [])
-            
-            st.rerun()
 
-    with col2:
-        st.subheader("Live Agent Monitor")
-        render_plan_status(st.session_state.plan)
-        
-        if st.session_state.diagrams:
-            st.subheader("Visualizations")
-            for diag in st.session_state.diagrams:
-                render_mermaid(diag)
+            from app.agents.graph import stream_research, run_config, discard_run
+
+            # A new query replaces any interrupted run
+            if st.session_state.get("run_id"):
+                discard_run(load_graph(), st.session_state.run_id)
+            st.session_state.run_id = st.query_params["run"] = uuid.uuid4().hex
+            final_state = run_research(stream_research(load_graph(), initial_state, run_config(st.session_state.run_id)), monitor)
+            finish_run(final_state)
+
+    mark("first render (since start)")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,187 @@
+"""
+Bulk corpus ingestion.
+
+Usage:
+    python -m app.rag.bulk path/to/papers [more.pdf ...] --workers 8 --batch-size 256 [--summaries]
+"""
+import os
+import sys
+import time
+import argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Any, List, Iterable
+
+from app.rag.ingestion import parse_pdf_sections, assign_chunk_ids, find_indexed_copy, record_ingested, write_chunks, delete_chunks
+from app.rag.manifest import file_sha256, load_manifest
+from app.rag.chunking import chunker_signature, CHUNK_TOKENS, CHUNK_OVERLAP
+from app.rag.sections import get_section_index, index_paper_sections, schedule_section_summaries, wait_for_summaries
+from app.rag.extraction import WORKER_CONTEXT, extract_page_texts
+from app.rag.references import get_citation_table, parse_references, index_paper_references, schedule_reference_resolution, wait_for_citations
+
+DEFAULT_BATCH_SIZE = 256
+
+def collect_pdf_paths(inputs: Iterable[str]) -> List[str]:
+    """Expand directories (recursively) and files into a sorted, de-duplicated list of PDFs."""
+    paths = set()
+    for item in inputs:
+        p = Path(item)
+        if p.is_dir():
+            paths.update(str(f) for f in p.rglob("*") if f.suffix.lower() == ".pdf")
+        elif p.is_file():
+            paths.add(str(p))
+    return sorted(paths)
+
+def _parse_worker(file_path: str, source: str, known_hashes: frozenset, chunk_tokens: int, overlap_tokens: int):
+    """
+    Runs in a worker process: hash, skip if already indexed, otherwise parse chunks and references.
+    Returns (source, file_hash, chunks or None, references or None, error or None).
+    """
+    try:
+        file_hash = file_sha256(file_path)
+        if file_hash in known_hashes:
+            return source, file_hash, None, None, None
+        # Documents are already spread across processes, so each one is extracted in-process
+        chunks = parse_pdf_sections(file_path, source_name=source, chunk_tokens=chunk_tokens, overlap_tokens=overlap_tokens, file_hash=file_hash, workers=1)
+        references = parse_references(extract_page_texts(file_path, file_hash=file_hash, workers=1))
+        return source, file_hash, chunks, references, None
+    except Exception as e:
+        return source, None, None, None, str(e)
+
+def ingest_corpus(inputs: Iterable[str], collection_name: str = "research_papers", workers: int = None, batch_size: int = DEFAULT_BATCH_SIZE, chunk_tokens: int = CHUNK_TOKENS, overlap_tokens: int = CHUNK_OVERLAP, log=print) -> Dict[str, Any]:
+    """
+    Ingest many PDFs: parsing runs across a process pool, chunks from all documents are
+    pooled into fixed-size embedding batches and written to Chroma batch by batch.
+    A document is recorded in the manifest only after all of its chunks are written.
+    """
+    paths = collect_pdf_paths(inputs)
+    workers = workers or os.cpu_count() or 1
+    indexed = load_manifest()["collections"].get(collection_name, {})
+    chunker = chunker_signature(chunk_tokens, overlap_tokens)
+    known_hashes = frozenset(e["file_hash"] for e in indexed.values() if e.get("chunker") == chunker)
+
+    stats = {"docs": 0, "skipped": 0, "failed": 0, "chunks": 0, "deleted": 0}
+    buffer = []      # (chunk_id, chunk, source)
+    pending = {}     # source -> {"file_hash", "chunker", "chunk_ids", "remaining"}
+    seen_hashes = set()
+
+    def flush():
+        if not buffer:
+            return
+        write_chunks(collection_name, [i for i, _, _ in buffer], [c for _, c, _ in buffer])
+        stats["chunks"] += len(buffer)
+        done = {}
+        for _, _, source in buffer:
+            entry = pending[source]
+            entry["remaining"] -= 1
+            if entry["remaining"] == 0:
+                done[source] = {"file_hash": entry["file_hash"], "chunker": entry["chunker"], "chunk_ids": entry["chunk_ids"]}
+                del pending[source]
+        buffer.clear()
+        if done:
+            record_ingested(collection_name, done)
+
+    def handle(result):
+        source, file_hash, chunks, references, error = result
+        if error:
+            stats["failed"] += 1
+            log(f"[bulk] failed {source}: {error}")
+            return
+        if chunks is None or file_hash in seen_hashes or find_indexed_copy(indexed, source, file_hash, chunker):
+            stats["skipped"] += 1
+            return
+        seen_hashes.add(file_hash)
+        if not chunks:
+            stats["failed"] += 1
+            log(f"[bulk] no text extracted from {source}")
+            return
+        stats["docs"] += 1
+        by_id = assign_chunk_ids(source, chunks)
+        index_paper_sections(collection_name, source, file_hash, [(i, c["metadata"]) for i, c in by_id.items()], save=False)
+        index_paper_references(collection_name, source, file_hash, references or [], save=False)
+        previous = indexed.get(source)
+        old_ids = set(previous["chunk_ids"]) if previous else set()
+        stale_ids = [i for i in old_ids if i not in by_id]
+        if stale_ids:
+            delete_chunks(collection_name, stale_ids)
+            stats["deleted"] += len(stale_ids)
+        new_ids = [i for i in by_id if i not in old_ids]
+        entry = {"file_hash": file_hash, "chunker": chunker, "chunk_ids": list(by_id), "remaining": len(new_ids)}
+        if not new_ids:
+            record_ingested(collection_name, {source: {"file_hash": file_hash, "chunker": chunker, "chunk_ids": entry["chunk_ids"]}})
+            return
+        pending[source] = entry
+        for i in new_ids:
+            buffer.append((i, by_id[i], source))
+            if len(buffer) >= batch_size:
+                flush()
+
+    start = time.perf_counter()
+    # Sources are relative to the input so two "paper.pdf" in different folders don't collide
+    sources = {p: os.path.relpath(p) for p in paths}
+    with ProcessPoolExecutor(max_workers=workers, mp_context=WORKER_CONTEXT) as executor:
+        # Keep a bounded number of documents in flight so thousands of papers don't pile up in memory
+        todo = iter(paths)
+        in_flight = set()
+        max_in_flight = workers * 2
+        while True:
+            while len(in_flight) < max_in_flight:
+                path = next(todo, None)
+                if path is None:
+                    break
+                in_flight.add(executor.submit(_parse_worker, path, sources[path], known_hashes, chunk_tokens, overlap_tokens))
+            if not in_flight:
+                break
+            finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                handle(future.result())
+    flush()
+    get_section_index(collection_name).save()
+    get_citation_table(collection_name).save()
+
+    elapsed = time.perf_counter() - start
+    stats["seconds"] = round(elapsed, 3)
+    stats["docs_per_sec"] = round(stats["docs"] / elapsed, 3) if elapsed else 0.0
+    stats["chunks_per_sec"] = round(stats["chunks"] / elapsed, 3) if elapsed else 0.0
+    log(
+        f"[bulk] {stats['docs']} docs ingested ({stats['skipped']} unchanged, {stats['failed']} failed), "
+        f"{stats['chunks']} chunks in {stats['seconds']}s: "
+        f"{stats['docs_per_sec']} docs/sec, {stats['chunks_per_sec']} chunks/sec"
+    )
+    return stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-ingest a corpus of PDFs into the vector store.")
+    parser.add_argument("inputs", nargs="+", help="PDF files or directories (searched recursively)")
+    parser.add_argument("--collection", default="research_papers")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Chunks per embedding/write batch")
+    parser.add_argument("--chunk-tokens", type=int, default=CHUNK_TOKENS, help="Target tokens per chunk")
+    parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP, help="Tokens of overlap between chunks")
+    parser.add_argument("--summaries", action="store_true", help="Also write section summaries (one LLM call per section)")
+    args = parser.parse_args(argv)
+    ingest_corpus(
+        args.inputs,
+        collection_name=args.collection,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        chunk_tokens=args.chunk_tokens,
+        overlap_tokens=args.chunk_overlap,
+    )
+    # Summaries cost an LLM call per section (several per paper), so a corpus only gets them on request
+    if args.summaries:
+        # They are written in the background; finished below before exiting
+        queued = schedule_section_summaries(args.collection)
+        if queued:
+            print(f"[bulk] writing {queued} section summaries ({queued} LLM calls) ...")
+    else:
+        pending = len(get_section_index(args.collection).pending_summaries())
+        if pending:
+            print(f"[bulk] {pending} sections have no summary; rerun with --summaries to write them ({pending} LLM calls)")
+    if schedule_reference_resolution(args.collection):
+        print("[bulk] resolving references on arXiv ...")
+    wait_for_summaries()
+    wait_for_citations()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+from bisect import bisect_right
+from functools import lru_cache
+from typing import Dict, Any, Iterable, Iterator, List, Tuple
+
+import tiktoken
+
+# Target chunk size and overlap, in tokens
+CHUNK_TOKENS = 400
+CHUNK_OVERLAP = 60
+TOKEN_ENCODING = "cl100k_base"
+
+@lru_cache(maxsize=None)
+def get_encoding(encoding_name: str = TOKEN_ENCODING):
+    return tiktoken.get_encoding(encoding_name)
+
+def count_tokens(text: str, encoding_name: str = TOKEN_ENCODING) -> int:
+    return len(get_encoding(encoding_name).encode_ordinary(text))
+
+def truncate_tokens(text: str, max_tokens: int, encoding_name: str = TOKEN_ENCODING) -> str:
+    """First max_tokens tokens of text (with an ellipsis if anything was cut)."""
+    enc = get_encoding(encoding_name)
+    tokens = enc.encode_ordinary(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return enc.decode(tokens[:max_tokens]) + "…"
+
+def chunker_signature(chunk_tokens: int = CHUNK_TOKENS, overlap_tokens: int = CHUNK_OVERLAP, encoding_name: str = TOKEN_ENCODING) -> str:
+    """Identifies the chunking settings, so a paper indexed with other settings gets re-chunked."""
+    return f"{encoding_name}:{chunk_tokens}:{overlap_tokens}"
+
+def chunk_segments(segments: Iterable[Dict[str, Any]], chunk_tokens: int = CHUNK_TOKENS, overlap_tokens: int = CHUNK_OVERLAP, encoding_name: str = TOKEN_ENCODING) -> Iterator[Dict[str, Any]]:
+    """
+    Re-chunks section segments ({"text", "metadata": {"source", "page", "section"}}) into
+    windows of chunk_tokens with overlap_tokens of overlap.
+    Windows never cross a section boundary but do run across pages within a section;
+    metadata keeps the first page ("page"), the last page ("page_end") and the token count.
+    Each token is encoded once and sliced out once, so this is linear in the input.
+    """
+    if not 0 <= overlap_tokens < chunk_tokens:
+        raise ValueError("overlap_tokens must be >= 0 and smaller than chunk_tokens")
+    enc = get_encoding(encoding_name)
+    stride = chunk_tokens - overlap_tokens
+
+    tokens: List[int] = []
+    page_starts: List[int] = []  # token offset where each page begins, parallel to pages
+    pages: List[int] = []
+    start = 0          # start of the next window
+    emitted_to = 0     # end of the last emitted window
+    current = None     # (source, section) of the buffered tokens
+
+    def window(lo: int, hi: int) -> Dict[str, Any]:
+        source, section = current
+        return {
+            "text": enc.decode(tokens[lo:hi]).strip(),
+            "metadata": {
+                "source": source,
+                "page": pages[bisect_right(page_starts, lo) - 1],
+                "page_end": pages[bisect_right(page_starts, hi - 1) - 1],
+                "section": section,
+                "token_count": hi - lo,
+            },
+        }
+
+    def compact() -> Tuple[int, int]:
+        # Drop tokens before the next window so the buffer stays under ~2 windows
+        nonlocal tokens, page_starts, pages
+        first = bisect_right(page_starts, start) - 1
+        tokens = tokens[start:]
+        page_starts = [max(s - start, 0) for s in page_starts[first:]]
+        pages = pages[first:]
+        return 0, max(emitted_to - start, 0)
+
+    for seg in segments:
+        meta = seg["metadata"]
+        key = (meta["source"], meta["section"])
+        if key != current:
+            # Section boundary: flush whatever has not been emitted yet
+            if current is not None and emitted_to < len(tokens):
+                chunk = window(start, len(tokens))
+                if chunk["text"]:
+                    yield chunk
+            tokens, page_starts, pages = [], [], []
+            start = emitted_to = 0
+            current = key
+
+        new_tokens = enc.encode_ordinary((" " if tokens else "") + seg["text"])
+        if not new_tokens:
+            continue
+        if not pages or pages[-1] != meta["page"]:
+            page_starts.append(len(tokens))
+            pages.append(meta["page"])
+        tokens.extend(new_tokens)
+
+        while len(tokens) - start >= chunk_tokens:
+            chunk = window(start, start + chunk_tokens)
+            emitted_to = start + chunk_tokens
+            start += stride
+            if chunk["text"]:
+                yield chunk
+        if start:
+            start, emitted_to = compact()
+
+    if current is not None and emitted_to < len(tokens):
+        chunk = window(start, len(tokens))
+        if chunk["text"]:
+            yield chunk
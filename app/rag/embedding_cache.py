@@ -0,0 +1,147 @@
+import os
+import re
+import hashlib
+import sqlite3
+import threading
+from typing import List, Dict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from app.telemetry import record
+
+# Lives outside chroma_db so that rebuilding the vector store keeps the cache
+EMBEDDING_CACHE_DIRECTORY = os.path.join(os.getcwd(), ".cache", "embeddings")
+# ~2 KB per entry for a 1024-dim model stored as float16
+EMBEDDING_CACHE_MAX_ENTRIES = 200_000
+
+def normalize_text(text: str) -> str:
+    return re.sub(r'\s+', ' ', text).strip()
+
+def _as_stored(vector: List[float]) -> List[float]:
+    # Round-trip through float16 so fresh and cached vectors are identical
+    return np.asarray(vector, dtype=np.float16).astype(np.float32).tolist()
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an Embeddings model with a persistent cache keyed by (model name, normalized text hash).
+    Vectors are stored as float16 rows of a memory-mapped array with an SQLite index of
+    key -> row. When all rows are used, the least recently used row is overwritten.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, cache_dir: str = EMBEDDING_CACHE_DIRECTORY, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._vectors = None # np.memmap, opened once the dimension is known
+        self._clock = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name)
+        self._vectors_path = os.path.join(cache_dir, f"{slug}.f16")
+        self._db = sqlite3.connect(os.path.join(cache_dir, f"{slug}.sqlite"), check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS entries (key BLOB PRIMARY KEY, slot INTEGER NOT NULL, last_used INTEGER NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._db.commit()
+        meta = dict(self._db.execute("SELECT name, value FROM meta").fetchall())
+        self._clock = self._db.execute("SELECT COALESCE(MAX(last_used), 0) FROM entries").fetchone()[0]
+        if "dim" in meta:
+            if meta["capacity"] != max_entries:
+                # Capacity is baked into the file layout; start over rather than remap
+                self._reset()
+            else:
+                self._open(meta["dim"])
+
+    def _key(self, kind: str, text: str) -> bytes:
+        return hashlib.sha256(f"{self.model_name}\0{kind}\0{normalize_text(text)}".encode("utf-8")).digest()[:16]
+
+    def _reset(self):
+        self._db.execute("DELETE FROM entries")
+        self._db.execute("DELETE FROM meta")
+        self._db.commit()
+        if os.path.exists(self._vectors_path):
+            os.remove(self._vectors_path)
+        self._clock = 0
+
+    def _open(self, dim: int):
+        mode = "r+" if os.path.exists(self._vectors_path) else "w+"
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float16, mode=mode, shape=(self.max_entries, dim))
+        self._db.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('dim', ?), ('capacity', ?)", (dim, self.max_entries))
+        self._db.commit()
+
+    def _lookup(self, keys: List[bytes]) -> Dict[bytes, List[float]]:
+        if self._vectors is None or not keys:
+            return {}
+        found = {}
+        # Stay below SQLite's bound-parameter limit
+        for i in range(0, len(keys), 500):
+            part = keys[i:i + 500]
+            rows = self._db.execute(
+                f"SELECT key, slot FROM entries WHERE key IN ({','.join('?' * len(part))})", part
+            ).fetchall()
+            for key, slot in rows:
+                found[key] = slot
+        if found:
+            self._clock += 1
+            self._db.executemany("UPDATE entries SET last_used = ? WHERE key = ?", [(self._clock, k) for k in found])
+            self._db.commit()
+        return {k: self._vectors[slot].astype(np.float32).tolist() for k, slot in found.items()}
+
+    def _store(self, items: Dict[bytes, List[float]]):
+        if not items:
+            return
+        if self._vectors is None:
+            self._open(len(next(iter(items.values()))))
+        self._clock += 1
+        used = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        rows = []
+        for key, vector in items.items():
+            existing = self._db.execute("SELECT slot FROM entries WHERE key = ?", (key,)).fetchone()
+            if existing:
+                slot = existing[0]
+            elif used < self.max_entries:
+                slot = used
+                used += 1
+            else:
+                # Evict the least recently used entry and reuse its row
+                victim, slot = self._db.execute("SELECT key, slot FROM entries ORDER BY last_used LIMIT 1").fetchone()
+                self._db.execute("DELETE FROM entries WHERE key = ?", (victim,))
+            self._vectors[slot] = np.asarray(vector, dtype=np.float16)
+            rows.append((key, slot, self._clock))
+            self._db.execute("INSERT OR REPLACE INTO entries (key, slot, last_used) VALUES (?, ?, ?)", rows[-1])
+        self._vectors.flush()
+        self._db.commit()
+
+    def _embed_cached(self, kind: str, texts: List[str], embed_batch) -> List[List[float]]:
+        keys = [self._key(kind, t) for t in texts]
+        with self._lock:
+            cached = self._lookup(list(set(keys)))
+        # Embed each distinct missing text once, in a single batch
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        record("cache_hits.embeddings", len(texts) - len(missing))
+        record("cache_misses.embeddings", len(missing))
+        if missing:
+            vectors = embed_batch(list(missing.values()))
+            fresh = dict(zip(missing.keys(), map(_as_stored, vectors)))
+            with self._lock:
+                self._store(fresh)
+            cached.update(fresh)
+        return [cached[k] for k in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed_cached("doc", texts, self.embeddings.embed_documents)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_cached("query", [text], lambda t: [self.embeddings.embed_query(t[0])])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed many queries in one forward pass (bge-m3 uses no query instruction)."""
+        return self._embed_cached("query", texts, self.embeddings.embed_documents)
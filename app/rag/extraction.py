@@ -0,0 +1,103 @@
+"""
+PDF page text extraction.
+Page ranges of one document are extracted in parallel worker processes, and the text is
+cached on disk by file hash, so re-chunking a paper with new settings never re-extracts it.
+"""
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional
+
+import pypdf
+from pypdf import PdfReader
+from app.cache import SQLiteCache
+from app.rag.manifest import file_sha256
+
+EXTRACT_WORKERS = int(os.getenv("RESEARCH_LAB_PDF_WORKERS", "0")) or os.cpu_count() or 1
+# Shorter documents are extracted in-process; spawning workers (~0.5s each) would cost more than it saves
+PARALLEL_MIN_PAGES = 64
+# Also the unit of caching: each range of pages is one cache entry
+PAGES_PER_TASK = 16
+PAGE_TEXT_CACHE_MAX_ENTRIES = 50_000
+PAGE_TEXT_CACHE_MAX_BYTES = 1 << 30
+# Worker processes are spawned, not forked: the app and the bulk CLI run threads (Streamlit,
+# warmup, background pools) and a forked child can inherit a lock one of them was holding
+WORKER_CONTEXT = multiprocessing.get_context("spawn")
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_page_text_cache() -> SQLiteCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SQLiteCache("pdf_text", max_entries=PAGE_TEXT_CACHE_MAX_ENTRIES, max_bytes=PAGE_TEXT_CACHE_MAX_BYTES)
+        return _cache
+
+def _cache_key(file_hash: str) -> str:
+    # A different pypdf version may extract differently, so it gets its own entries
+    return f"{file_hash}:pypdf-{pypdf.__version__}"
+
+def _extract_range(file_path: str, start: int, end: int) -> List[str]:
+    """Runs in a worker process: text of pages [start, end)."""
+    reader = PdfReader(file_path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+def _cached_page_texts(cache: SQLiteCache, key: str, file_path: str) -> Optional[Iterator[str]]:
+    """Pages of a fully cached document, one range at a time; None if it was never completed."""
+    total = cache.get(f"{key}:pages")
+    if total is None:
+        return None
+
+    def pages():
+        for start in range(0, total, PAGES_PER_TASK):
+            page_texts = cache.get(f"{key}:{start}")
+            if page_texts is None:
+                # Evicted on its own: extract just this range again
+                page_texts = _extract_range(file_path, start, min(start + PAGES_PER_TASK, total))
+                cache.set(f"{key}:{start}", page_texts)
+            yield from page_texts
+    return pages()
+
+def iter_page_texts(file_path: str, file_hash: Optional[str] = None, reader: Optional[PdfReader] = None, workers: Optional[int] = None) -> Iterator[str]:
+    """
+    Text of every page, in page order.
+    Served from the cache if this exact file was extracted before. Otherwise page ranges are
+    extracted across `workers` processes (in-process for short documents) and yielded in order
+    as they complete. Each range is cached as it arrives, so memory stays flat for long documents;
+    the page count is written last and marks the document as complete.
+    """
+    file_hash = file_hash or file_sha256(file_path)
+    cache = get_page_text_cache()
+    key = _cache_key(file_hash)
+    cached = _cached_page_texts(cache, key, file_path)
+    if cached is not None:
+        yield from cached
+        return
+
+    reader = reader or PdfReader(file_path)
+    total = len(reader.pages)
+    workers = min(workers or EXTRACT_WORKERS, -(-total // PAGES_PER_TASK))
+    starts = list(range(0, total, PAGES_PER_TASK))
+    ends = [min(start + PAGES_PER_TASK, total) for start in starts]
+    if workers <= 1 or total < PARALLEL_MIN_PAGES:
+        for start, end in zip(starts, ends):
+            page_texts = [reader.pages[i].extract_text() or "" for i in range(start, end)]
+            cache.set(f"{key}:{start}", page_texts)
+            yield from page_texts
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=WORKER_CONTEXT)
+        try:
+            # map() hands ranges back in page order, so callers see one continuous document
+            results = pool.map(_extract_range, [file_path] * len(starts), starts, ends)
+            for start, page_texts in zip(starts, results):
+                cache.set(f"{key}:{start}", page_texts)
+                yield from page_texts
+        finally:
+            # If the caller stops early, don't wait for the remaining ranges
+            pool.shutdown(wait=False, cancel_futures=True)
+    cache.set(f"{key}:pages", total)
+
+def extract_page_texts(file_path: str, file_hash: Optional[str] = None, workers: Optional[int] = None) -> List[str]:
+    return list(iter_page_texts(file_path, file_hash=file_hash, workers=workers))
@@ -1,80 +1,250 @@
 import os
-from typing import List, Dict, Any
+import queue
+import threading
+from typing import List, Dict, Any, Iterator
 from pypdf import PdfReader
 import re
+from app.rag.manifest import file_sha256, chunk_sha256, load_manifest, save_manifest, manifest_lock
+from app.rag.lexical import get_lexical_index
+from app.rag.chunking import chunk_segments, chunker_signature, CHUNK_TOKENS, CHUNK_OVERLAP
+from app.rag.extraction import iter_page_texts, extract_page_texts
+from app.rag.sections import index_paper_sections, schedule_section_summaries
+from app.rag.references import parse_references, index_paper_references, schedule_reference_resolution
 
 def clean_text(text: str) -> str:
     """Basic text cleaning."""
     return re.sub(r'\s+', ' ', text).strip()
 
-def parse_pdf_sections(file_path: str) -> List[Dict[str, Any]]:
+def iter_pdf_segments(file_path: str, source_name: str = None, reader: PdfReader = None, file_hash: str = None, workers: int = None) -> Iterator[Dict[str, Any]]:
     """
-    Parses a PDF into section-aware chunks.
+    Parses a PDF into section-aware segments (one per section per page), yielding them page by page.
+    Page text comes from app.rag.extraction (parallel, cached by file hash); the section state
+    below runs over the pages in order, so a section carries across page boundaries.
     This is a heuristic implementation. In production, use Marker or PyMuPDF/fitz for better layout analysis.
     """
-    reader = PdfReader(file_path)
-    chunks = []
+    source = source_name or os.path.basename(file_path)
     
     current_section = "Introduction" # Default start
     
     # Simple regex for common section headers
     header_pattern = re.compile(r'^(Introduction|Abstract|Methods?|Related Work|Results?|Discussion|Conclusion|References)', re.IGNORECASE)
     
-    for page_num, page in enumerate(reader.pages):
-        text = page.extract_text()
+    for page_num, text in enumerate(iter_page_texts(file_path, file_hash=file_hash, reader=reader, workers=workers)):
         lines = text.split('\n')
         
-        page_text_acc = ""
+        # Collect lines and join once (repeated += is quadratic on long pages)
+        page_lines = []
         
         for line in lines:
             clean_line = line.strip()
             # Heuristic check for section header
             if len(clean_line) < 50 and header_pattern.match(clean_line):
-                # If we have accumulated text, save it as a chunk for the previous section
-                if page_text_acc:
-                    chunks.append({
-                        "text": clean_text(page_text_acc),
+                # If we have accumulated text, save it as a segment for the previous section
+                if page_lines:
+                    yield {
+                        "text": clean_text(" ".join(page_lines)),
                         "metadata": {
-                            "source": os.path.basename(file_path),
+                            "source": source,
                             "page": page_num + 1,
                             "section": current_section
                         }
-                    })
-                    page_text_acc = ""
+                    }
+                    page_lines = []
                 current_section = clean_line
             else:
-                page_text_acc += line + " "
+                page_lines.append(line)
 
         # Add remaining text from page
-        if page_text_acc:
-             chunks.append({
-                "text": clean_text(page_text_acc),
+        if page_lines:
+             yield {
+                "text": clean_text(" ".join(page_lines)),
                 "metadata": {
-                    "source": os.path.basename(file_path),
+                    "source": source,
                     "page": page_num + 1,
                     "section": current_section
                 }
-            })
-            
-    return chunks
+            }
 
-def ingest_pdf(file_path: str, collection_name: str = "research_papers"):
+def iter_pdf_sections(file_path: str, source_name: str = None, reader: PdfReader = None, chunk_tokens: int = CHUNK_TOKENS, overlap_tokens: int = CHUNK_OVERLAP, file_hash: str = None, workers: int = None) -> Iterator[Dict[str, Any]]:
     """
-    Ingest PDF into Vector Store (ChromaDB).
-    This function will be called by the UI or Agent.
+    Parses a PDF into token-bounded, section-aware chunks, yielding them page by page.
+    """
+    segments = iter_pdf_segments(file_path, source_name=source_name, reader=reader, file_hash=file_hash, workers=workers)
+    return chunk_segments(segments, chunk_tokens=chunk_tokens, overlap_tokens=overlap_tokens)
+
+def parse_pdf_sections(file_path: str, source_name: str = None, chunk_tokens: int = CHUNK_TOKENS, overlap_tokens: int = CHUNK_OVERLAP, file_hash: str = None, workers: int = None) -> List[Dict[str, Any]]:
+    """
+    Parses a PDF into section-aware chunks.
+    """
+    return list(iter_pdf_sections(file_path, source_name=source_name, chunk_tokens=chunk_tokens, overlap_tokens=overlap_tokens, file_hash=file_hash, workers=workers))
+
+def chunk_id_for(source: str, chunk: Dict[str, Any]) -> str:
+    """Content-addressed chunk id."""
+    return chunk_sha256(source, chunk["text"], chunk["metadata"])[:32]
+
+def assign_chunk_ids(source: str, chunks: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Content-addressed ids; duplicate chunks within a paper collapse to one."""
+    by_id = {}
+    for c in chunks:
+        by_id.setdefault(chunk_id_for(source, c), c)
+    return by_id
+
+def find_indexed_copy(indexed: Dict[str, Any], source: str, file_hash: str, chunker: str):
     """
-    # Circular import prevention
+    Returns a message if this exact file is already indexed (under any source name)
+    with the same chunking settings, else None.
+    """
+    previous = indexed.get(source)
+    if previous and previous["file_hash"] == file_hash and previous.get("chunker") == chunker:
+        return f"Already indexed ({len(previous['chunk_ids'])} chunks, unchanged)."
+    for other_source, entry in indexed.items():
+        if entry["file_hash"] == file_hash and entry.get("chunker") == chunker:
+            return f"Already indexed as '{other_source}' ({len(entry['chunk_ids'])} chunks)."
+    return None
+
+def write_chunks(collection_name: str, ids: List[str], chunks: List[Dict[str, Any]]):
+    """Write chunks to the vector store and the lexical index in one batch."""
     from app.rag.retrieval import get_vectorstore
     
-    chunks = parse_pdf_sections(file_path)
-    if not chunks:
-        return False, "No text extracted from PDF."
-        
-    vs = get_vectorstore(collection_name)
-    
     texts = [c["text"] for c in chunks]
     metadatas = [c["metadata"] for c in chunks]
-    ids = [f"{os.path.basename(file_path)}_{i}" for i in range(len(chunks))]
+    get_vectorstore(collection_name).add_texts(texts=texts, metadatas=metadatas, ids=ids)
+    get_lexical_index(collection_name).add(ids, texts, metadatas)
+
+def delete_chunks(collection_name: str, ids: List[str]):
+    from app.rag.retrieval import get_vectorstore
     
-    vs.add_texts(texts=texts, metadatas=metadatas, ids=ids)
-    return True, f"Ingested {len(chunks)} chunks."
+    get_vectorstore(collection_name).delete(ids=ids)
+    get_lexical_index(collection_name).remove(ids)
+
+def record_ingested(collection_name: str, entries: Dict[str, Dict[str, Any]]):
+    """Persist manifest entries ({source: {"file_hash", "chunker", "chunk_ids"}}) once their chunks are written."""
+    # The lexical index is saved first so the manifest never lists chunks it is missing
+    get_lexical_index(collection_name).save()
+    with manifest_lock():
+        manifest = load_manifest()
+        manifest["collections"].setdefault(collection_name, {}).update(entries)
+        save_manifest(manifest)
+
+STREAM_BATCH_SIZE = 32
+STREAM_QUEUE_BATCHES = 4
+
+_STREAM_DONE = object()
+
+def ingest_pdf_stream(file_path: str, collection_name: str = "research_papers", source_name: str = None, batch_size: int = STREAM_BATCH_SIZE, chunk_tokens: int = CHUNK_TOKENS, overlap_tokens: int = CHUNK_OVERLAP):
+    """
+    Streaming ingestion: page -> chunk -> embed batch -> Chroma write.
+    A producer thread parses pages into a bounded queue of chunk batches while the caller's
+    thread embeds and writes them, so chunks become searchable as they land and at most
+    STREAM_QUEUE_BATCHES batches are held in memory regardless of page count.
+
+    Yields progress dicts: {"done", "success", "pages_done", "total_pages", "chunks_written", "message"}.
+    The last event has done=True.
+    """
+    source = source_name or os.path.basename(file_path)
+    file_hash = file_sha256(file_path)
+    
+    chunker = chunker_signature(chunk_tokens, overlap_tokens)
+    
+    indexed = load_manifest()["collections"].get(collection_name, {})
+    already = find_indexed_copy(indexed, source, file_hash, chunker)
+    reader = None if already else PdfReader(file_path)
+    total_pages = len(reader.pages) if reader else 0
+    progress = {"done": False, "success": True, "pages_done": 0, "total_pages": total_pages, "chunks_written": 0, "message": ""}
+    if already:
+        # Retry any section summaries or reference lookups an earlier ingest could not finish
+        schedule_section_summaries(collection_name)
+        schedule_reference_resolution(collection_name)
+        yield {**progress, "done": True, "message": already}
+        return
+    
+    previous = indexed.get(source)
+    old_ids = set(previous["chunk_ids"]) if previous else set()
+    seen_ids = {} # id -> metadata, ordered; never chunk text
+    batches = queue.Queue(maxsize=STREAM_QUEUE_BATCHES)
+    stop = threading.Event()
+    
+    def put(item):
+        # Give up if the consumer went away, instead of blocking forever on a full queue
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+    
+    def produce():
+        try:
+            batch = []
+            for chunk in iter_pdf_sections(file_path, source_name=source, reader=reader, chunk_tokens=chunk_tokens, overlap_tokens=overlap_tokens, file_hash=file_hash):
+                if stop.is_set():
+                    return
+                chunk_id = chunk_id_for(source, chunk)
+                if chunk_id in seen_ids:
+                    continue
+                seen_ids[chunk_id] = chunk["metadata"]
+                if chunk_id in old_ids:
+                    continue
+                batch.append((chunk_id, chunk))
+                if len(batch) >= batch_size:
+                    put(batch)
+                    batch = []
+            if batch:
+                put(batch)
+            put(_STREAM_DONE)
+        except Exception as e:
+            put(e)
+    
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    
+    try:
+        while True:
+            item = batches.get()
+            if item is _STREAM_DONE:
+                break
+            if isinstance(item, Exception):
+                yield {**progress, "done": True, "success": False, "message": f"Failed to parse PDF: {item}"}
+                return
+            write_chunks(collection_name, [i for i, _ in item], [c for _, c in item])
+            progress["chunks_written"] += len(item)
+            progress["pages_done"] = item[-1][1]["metadata"]["page"]
+            progress["message"] = f"Indexed {progress['chunks_written']} chunks (page {progress['pages_done']}/{total_pages})"
+            yield dict(progress)
+    finally:
+        stop.set()
+    
+    if not seen_ids:
+        yield {**progress, "done": True, "success": False, "message": "No text extracted from PDF."}
+        return
+    
+    stale_ids = [i for i in old_ids if i not in seen_ids]
+    if stale_ids:
+        delete_chunks(collection_name, stale_ids)
+    
+    record_ingested(collection_name, {source: {"file_hash": file_hash, "chunker": chunker, "chunk_ids": list(seen_ids)}})
+    index_paper_sections(collection_name, source, file_hash, list(seen_ids.items()))
+    schedule_section_summaries(collection_name)
+    # Page text is cached by now, so this is only the reference parsing
+    index_paper_references(collection_name, source, file_hash, parse_references(extract_page_texts(file_path, file_hash=file_hash)))
+    schedule_reference_resolution(collection_name)
+    
+    yield {
+        **progress,
+        "done": True,
+        "pages_done": total_pages,
+        "message": f"Ingested {progress['chunks_written']} new chunks, removed {len(stale_ids)} stale ({len(seen_ids)} total).",
+    }
+
+def ingest_pdf(file_path: str, collection_name: str = "research_papers", source_name: str = None, chunk_tokens: int = CHUNK_TOKENS, overlap_tokens: int = CHUNK_OVERLAP):
+    """
+    Ingest PDF into Vector Store (ChromaDB).
+    This function will be called by the UI or Agent.
+
+    Ingestion is incremental: the manifest records the file hash and chunk ids per source,
+    so re-ingesting an unchanged paper is a no-op and a changed paper only embeds new chunks.
+    """
+    event = None
+    for event in ingest_pdf_stream(file_path, collection_name=collection_name, source_name=source_name, chunk_tokens=chunk_tokens, overlap_tokens=overlap_tokens):
+        pass
+    return event["success"], event["message"]
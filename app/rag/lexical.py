@@ -0,0 +1,274 @@
+import os
+import re
+import json
+import math
+import pickle
+import tempfile
+import threading
+from array import array
+from collections import Counter
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Rebuild postings once this fraction of documents are deleted
+COMPACT_DEAD_RATIO = 0.25
+# Score densely over all documents when the query's postings exceed 1/DENSE_SCORING_RATIO of them
+DENSE_SCORING_RATIO = 4
+# Distinct filters whose document masks are kept per index
+FILTER_MASK_CACHE_SIZE = 64
+
+LEXICAL_SUBDIRECTORY = "lexical"
+
+# Keeps numbers like "0.001", "3e-4" and names like "bert-base" or "Eq_3" as single terms
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.\-_][a-z0-9]+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were what which with".split()
+)
+
+_indexes: Dict[str, "LexicalIndex"] = {}
+_indexes_lock = threading.Lock()
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+def matches_filter(metadata: Dict[str, Any], where: Optional[dict]) -> bool:
+    """Evaluates the subset of Chroma's where syntax used by this app: equality, $eq/$ne/$in/$nin, $and/$or."""
+    if not where:
+        return True
+    for key, cond in where.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, c) for c in cond):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, c) for c in cond):
+                return False
+        elif isinstance(cond, dict):
+            value = metadata.get(key)
+            for op, operand in cond.items():
+                if op == "$eq" and value != operand:
+                    return False
+                if op == "$ne" and value == operand:
+                    return False
+                if op == "$in" and value not in operand:
+                    return False
+                if op == "$nin" and value in operand:
+                    return False
+        elif metadata.get(key) != cond:
+            return False
+    return True
+
+class LexicalIndex:
+    """
+    In-process BM25 inverted index over chunks.
+    Postings are array-backed (uint32 document numbers, uint16 term frequencies per term), so they
+    are compact on disk and can be viewed as numpy arrays without copying at query time.
+    Deleted documents are tombstoned and dropped when the postings are compacted.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self.chunk_ids: List[str] = []          # document number -> chunk id
+        self.numbers: Dict[str, int] = {}       # chunk id -> document number
+        self.metadatas: List[Dict[str, Any]] = []
+        self.lengths = array("I")
+        self.alive = bytearray()
+        self.postings: Dict[str, array] = {}    # term -> document numbers
+        self.freqs: Dict[str, array] = {}       # term -> term frequencies, parallel to postings
+        self.total_length = 0
+        self.dead = 0
+        # Changes made since the last save
+        self.dirty = False
+        # Filter (as JSON) -> matching documents; cleared whenever documents are added or removed
+        self._filter_masks: Dict[str, np.ndarray] = {}
+
+    def __len__(self):
+        return len(self.chunk_ids) - self.dead
+
+    def add(self, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]]):
+        with self._lock:
+            self.dirty = True
+            self._filter_masks.clear()
+            self.remove([i for i in ids if i in self.numbers])
+            for chunk_id, text, metadata in zip(ids, texts, metadatas):
+                terms = Counter(tokenize(text))
+                number = len(self.chunk_ids)
+                self.chunk_ids.append(chunk_id)
+                self.numbers[chunk_id] = number
+                self.metadatas.append(dict(metadata or {}))
+                length = sum(terms.values())
+                self.lengths.append(length)
+                self.alive.append(1)
+                self.total_length += length
+                for term, tf in terms.items():
+                    if term not in self.postings:
+                        self.postings[term] = array("I")
+                        self.freqs[term] = array("H")
+                    self.postings[term].append(number)
+                    self.freqs[term].append(min(tf, 0xFFFF))
+
+    def remove(self, ids: List[str]):
+        with self._lock:
+            self.dirty = self.dirty or bool(ids)
+            if ids:
+                self._filter_masks.clear()
+            for chunk_id in ids:
+                number = self.numbers.pop(chunk_id, None)
+                if number is None or not self.alive[number]:
+                    continue
+                self.alive[number] = 0
+                self.total_length -= self.lengths[number]
+                self.dead += 1
+            if self.chunk_ids and self.dead > COMPACT_DEAD_RATIO * len(self.chunk_ids):
+                self._compact()
+
+    def _compact(self):
+        keep = [n for n in range(len(self.chunk_ids)) if self.alive[n]]
+        renumber = {old: new for new, old in enumerate(keep)}
+        postings, freqs = {}, {}
+        for term, docs in self.postings.items():
+            new_docs, new_freqs = array("I"), array("H")
+            for doc, tf in zip(docs, self.freqs[term]):
+                if doc in renumber:
+                    new_docs.append(renumber[doc])
+                    new_freqs.append(tf)
+            if new_docs:
+                postings[term] = new_docs
+                freqs[term] = new_freqs
+        self.chunk_ids = [self.chunk_ids[n] for n in keep]
+        self.numbers = {chunk_id: n for n, chunk_id in enumerate(self.chunk_ids)}
+        self.metadatas = [self.metadatas[n] for n in keep]
+        self.lengths = array("I", (self.lengths[n] for n in keep))
+        self.alive = bytearray([1]) * len(keep)
+        self.postings, self.freqs = postings, freqs
+        self.dead = 0
+
+    def _filter_mask(self, filter_dict: dict) -> np.ndarray:
+        """Boolean mask of the documents matching a filter, cached until the index changes."""
+        key = json.dumps(filter_dict, sort_keys=True)
+        mask = self._filter_masks.get(key)
+        if mask is None:
+            if len(self._filter_masks) >= FILTER_MASK_CACHE_SIZE:
+                self._filter_masks.clear()
+            mask = np.fromiter((matches_filter(m, filter_dict) for m in self.metadatas), dtype=bool, count=len(self.metadatas))
+            self._filter_masks[key] = mask
+        return mask
+
+    def search(self, query: str, k: int = 5, filter_dict: Optional[dict] = None) -> List[Tuple[str, float]]:
+        """Top-k (chunk id, BM25 score) for the query, honouring the same filters as the vector search."""
+        with self._lock:
+            alive_docs = len(self)
+            if not alive_docs or k <= 0:
+                return []
+            avg_length = self.total_length / alive_docs
+            lengths = np.frombuffer(self.lengths, dtype=np.uint32)
+            # Deleted documents and ones the filter excludes are dropped before scoring
+            keep = None
+            if self.dead:
+                keep = np.frombuffer(self.alive, dtype=np.uint8).view(bool)
+            if filter_dict:
+                mask = self._filter_mask(filter_dict)
+                keep = mask if keep is None else keep & mask
+            doc_parts, weight_parts = [], []
+            for term in set(tokenize(query)):
+                docs = self.postings.get(term)
+                if not docs:
+                    continue
+                docs = np.frombuffer(docs, dtype=np.uint32)
+                tfs = np.frombuffer(self.freqs[term], dtype=np.uint16).astype(np.float32)
+                idf = math.log(1.0 + (alive_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+                if keep is not None:
+                    matched = keep[docs]
+                    docs, tfs = docs[matched], tfs[matched]
+                norm = BM25_K1 * (1.0 - BM25_B + BM25_B * lengths[docs] / avg_length)
+                doc_parts.append(docs)
+                weight_parts.append(idf * tfs * (BM25_K1 + 1.0) / (tfs + norm))
+            n_postings = sum(len(docs) for docs in doc_parts)
+            if not n_postings:
+                return []
+            docs, weights = np.concatenate(doc_parts), np.concatenate(weight_parts)
+            if n_postings * DENSE_SCORING_RATIO >= len(self.chunk_ids):
+                # Postings cover a good part of the index anyway: one dense pass is cheapest
+                scores = np.bincount(docs, weights=weights, minlength=len(self.chunk_ids))
+                candidates = np.flatnonzero(scores)
+                scores = scores[candidates]
+            else:
+                # Otherwise scores are accumulated over the union of the postings only
+                candidates, slots = np.unique(docs, return_inverse=True)
+                scores = np.bincount(slots, weights=weights, minlength=len(candidates))
+            order = np.arange(len(candidates))
+            if len(order) > k:
+                # Everything scoring at least the k-th best, so ties at the cut are broken like the rest
+                order = np.flatnonzero(scores >= np.partition(scores, len(scores) - k)[len(scores) - k])
+            # Highest score first, ties in indexing order
+            order = order[np.lexsort((candidates[order], -scores[order]))][:k]
+            return [(self.chunk_ids[n], float(score)) for n, score in zip(candidates[order], scores[order])]
+
+    def save(self):
+        with self._lock:
+            state = {key: value for key, value in self.__dict__.items() if key not in ("path", "_lock", "dirty", "_filter_masks")}
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+
+    @classmethod
+    def load(cls, path: str) -> "LexicalIndex":
+        index = cls(path)
+        with open(path, "rb") as f:
+            index.__dict__.update(pickle.load(f))
+        return index
+
+def get_lexical_index(collection_name: str = "research_papers") -> LexicalIndex:
+    """
+    Get the lexical index persisted next to the collection in chroma_db.
+    If there is none yet (e.g. a collection indexed before this existed), it is built from Chroma once.
+    """
+    from app.rag.retrieval import PERSIST_DIRECTORY, get_vectorstore
+
+    with _indexes_lock:
+        if collection_name in _indexes:
+            return _indexes[collection_name]
+    path = os.path.join(PERSIST_DIRECTORY, LEXICAL_SUBDIRECTORY, f"{collection_name}.pkl")
+    # Opened before taking _indexes_lock: opening a collection can evict others, which
+    # releases their lexical indexes under that lock
+    collection = None if os.path.exists(path) else get_vectorstore(collection_name)._collection
+    with _indexes_lock:
+        if collection_name in _indexes:
+            return _indexes[collection_name]
+        if collection is None:
+            index = LexicalIndex.load(path)
+        else:
+            index = LexicalIndex(path)
+            page_size = 1000
+            for offset in range(0, collection.count(), page_size):
+                page = collection.get(limit=page_size, offset=offset, include=["documents", "metadatas"])
+                index.add(page["ids"], page["documents"], page["metadatas"])
+            if len(index):
+                index.save()
+        _indexes[collection_name] = index
+        return index
+
+def release_lexical_indexes(keep) -> List[str]:
+    """
+    Drop cached indexes of collections not in keep from memory (they stay on disk and are
+    reloaded on next use). An index with unsaved changes, e.g. one being ingested into, is kept
+    until a later call: reloading it from disk would lose them. Returns the dropped names.
+    """
+    keep = set(keep)
+    dropped = []
+    with _indexes_lock:
+        for name, index in list(_indexes.items()):
+            if name in keep:
+                continue
+            with index._lock:
+                if not index.dirty:
+                    del _indexes[name]
+                    dropped.append(name)
+    return dropped
@@ -0,0 +1,68 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from typing import Dict, Any, Optional, Tuple
+
+MANIFEST_FILENAME = "ingest_manifest.json"
+
+_manifest_lock = threading.Lock()
+
+def file_sha256(file_path: str) -> str:
+    """Content hash of a file, read in blocks so large PDFs don't sit in memory."""
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def chunk_sha256(source: str, text: str, metadata: Dict[str, Any]) -> str:
+    """
+    Content hash of a chunk. Source, page and section are part of the key so that
+    identical text in two papers (or two pages) still gets distinct ids.
+    """
+    h = hashlib.sha256()
+    for part in (source, str(metadata.get("page")), str(metadata.get("section")), text):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+def _manifest_path() -> str:
+    from app.rag.retrieval import PERSIST_DIRECTORY
+    return os.path.join(PERSIST_DIRECTORY, MANIFEST_FILENAME)
+
+def load_manifest() -> Dict[str, Any]:
+    """
+    Load the ingest manifest.
+    Layout: {"collections": {collection: {source: {"file_hash": str, "chunk_ids": [str]}}}}
+    """
+    path = _manifest_path()
+    if not os.path.exists(path):
+        return {"collections": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def manifest_revision() -> Optional[Tuple[int, int]]:
+    """
+    Cheap change marker for the manifest: (mtime in ns, size) of the file, None if there is none yet.
+    Every save replaces the file, so it changes with each save, including saves by other processes.
+    """
+    try:
+        stat = os.stat(_manifest_path())
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+def save_manifest(manifest: Dict[str, Any]):
+    """Atomically write the manifest so a crash mid-write can't corrupt it."""
+    path = _manifest_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+def manifest_lock() -> threading.Lock:
+    """Lock guarding read-modify-write cycles on the manifest."""
+    return _manifest_lock
@@ -0,0 +1,86 @@
+import os
+import re
+import zlib
+from typing import Any, Dict, List, Tuple
+
+from app.rag.chunking import count_tokens, truncate_tokens
+from app.rag.retrieval import best_first
+
+# Prompt tokens the retrieved context may use per analyst step
+CONTEXT_TOKEN_BUDGET = int(os.getenv("RESEARCH_LAB_CONTEXT_TOKENS", "2500"))
+# Word n-grams used to spot near-duplicate chunks
+SHINGLE_SIZE = 5
+# A chunk is dropped when this fraction of its shingles already appears in a chunk that was kept
+DUPLICATE_THRESHOLD = 0.6
+# Don't bother squeezing a truncated chunk into less room than this
+MIN_PARTIAL_TOKENS = 60
+
+_WORD = re.compile(r"\w+")
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set:
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return {zlib.crc32(" ".join(words).encode("utf-8"))} if words else set()
+    return {zlib.crc32(" ".join(words[i:i + size]).encode("utf-8")) for i in range(len(words) - size + 1)}
+
+def source_label(metadata: Dict[str, Any]) -> str:
+    """Where a chunk comes from, e.g. 'attention.pdf p.3-4 §Methods'."""
+    parts = [str(metadata.get("source", "unknown"))]
+    page, page_end = metadata.get("page"), metadata.get("page_end")
+    if page is not None:
+        parts.append(f"p.{page}-{page_end}" if page_end not in (None, page) else f"p.{page}")
+    if metadata.get("section"):
+        parts.append(f"§{metadata['section']}")
+    return " ".join(parts)
+
+def citation_header(n: int, metadata: Dict[str, Any]) -> str:
+    """Compact source label, e.g. '[2] attention.pdf p.3-4 §Methods'."""
+    return f"[{n}] {source_label(metadata)}"
+
+def naive_context(results: List[Dict[str, Any]]) -> str:
+    """The unpacked layout (every chunk in full plus its raw metadata), used as the baseline for savings."""
+    return "\n".join([f"Content: {r['content']}\nMetadata: {r['metadata']}" for r in results])
+
+def pack_context(results: List[Dict[str, Any]], budget: int = CONTEXT_TOKEN_BUDGET, duplicate_threshold: float = DUPLICATE_THRESHOLD) -> Tuple[str, Dict[str, int]]:
+    """
+    Pack ranked retrieval results into at most `budget` tokens of prompt context.
+    Chunks are taken best-first; near-duplicates of an already kept chunk (shingle containment)
+    are skipped, and the last chunk that doesn't fit whole is truncated if enough room is left.
+    Returns the context and token metrics (including tokens saved versus naive_context).
+    """
+    ranked = best_first(results)
+    kept_shingles: List[set] = []
+    blocks: List[str] = []
+    used = 0
+    duplicates = over_budget = 0
+
+    for r in ranked:
+        text = r["content"].strip()
+        sh = shingles(text)
+        if sh and any(len(sh & other) >= duplicate_threshold * len(sh) for other in kept_shingles):
+            duplicates += 1
+            continue
+        header = citation_header(len(blocks) + 1, r.get("metadata") or {})
+        cost = count_tokens(f"{header}\n{text}\n\n")
+        if used + cost > budget:
+            room = budget - used - count_tokens(f"{header}\n…\n\n")
+            if room < MIN_PARTIAL_TOKENS:
+                over_budget += 1
+                continue
+            text = truncate_tokens(text, room)
+            cost = count_tokens(f"{header}\n{text}\n\n")
+        blocks.append(f"{header}\n{text}")
+        kept_shingles.append(sh)
+        used += cost
+
+    context = "\n\n".join(blocks)
+    context_tokens = count_tokens(context)
+    naive_tokens = count_tokens(naive_context(results))
+    return context, {
+        "context_tokens": context_tokens,
+        "naive_context_tokens": naive_tokens,
+        "tokens_saved": max(naive_tokens - context_tokens, 0),
+        "chunks_used": len(blocks),
+        "chunks_dropped_duplicate": duplicates,
+        "chunks_dropped_budget": over_budget,
+    }
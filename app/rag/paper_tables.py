@@ -0,0 +1,103 @@
+"""
+Shared plumbing for the per-collection paper tables kept next to the vector store
+(section index, citation table): JSON persistence, a per-collection registry and a
+background worker pool for filling them in after ingest.
+"""
+import os
+import json
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional, Type
+
+class PaperTable:
+    """
+    Per-paper data of one collection, persisted as JSON: {source: {...}}.
+    Subclasses add the accessors; self._lock guards self.papers.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self.papers: Dict[str, Dict[str, Any]] = {}
+
+    def save(self):
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.papers, f)
+            os.replace(tmp_path, self.path)
+
+    @classmethod
+    def load(cls, path: str):
+        table = cls(path)
+        with open(path, "r", encoding="utf-8") as f:
+            table.papers = json.load(f)
+        return table
+
+class PaperTables:
+    """
+    One table per collection, stored as chroma_db/<subdirectory>/<collection>.json and kept in memory once loaded.
+    backfill(table, collection_name) fills a new table for a collection that has none on disk yet.
+    """
+
+    def __init__(self, subdirectory: str, table_class: Type[PaperTable], backfill: Optional[Callable[[PaperTable, str], None]] = None):
+        self.subdirectory = subdirectory
+        self.table_class = table_class
+        self.backfill = backfill
+        self._tables: Dict[str, PaperTable] = {}
+        self._lock = threading.Lock()
+
+    def get(self, collection_name: str) -> PaperTable:
+        from app.rag.retrieval import PERSIST_DIRECTORY
+
+        with self._lock:
+            if collection_name not in self._tables:
+                path = os.path.join(PERSIST_DIRECTORY, self.subdirectory, f"{collection_name}.json")
+                if os.path.exists(path):
+                    table = self.table_class.load(path)
+                else:
+                    table = self.table_class(path)
+                    if self.backfill is not None:
+                        self.backfill(table, collection_name)
+                self._tables[collection_name] = table
+            return self._tables[collection_name]
+
+class BackgroundTasks:
+    """
+    A lazily started thread pool that runs each task key at most once at a time.
+    wait() drains it (the next submit starts a fresh pool).
+    """
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._pool = None
+        self._in_flight = set()
+        self._lock = threading.Lock()
+
+    def submit(self, key: Hashable, fn: Callable, *args) -> bool:
+        """Queue fn(*args) unless a task with this key is queued or running. Returns whether it was queued."""
+        with self._lock:
+            if key in self._in_flight:
+                return False
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+            self._in_flight.add(key)
+            self._pool.submit(self._run, key, fn, *args)
+            return True
+
+    def _run(self, key: Hashable, fn: Callable, *args):
+        try:
+            fn(*args)
+        finally:
+            with self._lock:
+                self._in_flight.discard(key)
+
+    def wait(self):
+        """Block until every queued task is done (for scripts and the bulk CLI)."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
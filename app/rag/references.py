@@ -0,0 +1,290 @@
+"""
+Reference-list extraction and per-paper citation tables.
+
+At ingest, the paper's References section is split into structured entries (title, authors,
+year, arXiv id, DOI). In the background they are resolved against arXiv in bulk (batched id
+and title lookups), and the result is stored next to the collection in chroma_db as a citation
+table. Citation_Scout steps then look citations up locally and only go to the network for misses.
+"""
+import re
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.rag.lexical import tokenize
+from app.rag.paper_tables import PaperTable, PaperTables, BackgroundTasks
+from app.telemetry import record
+
+CITATIONS_SUBDIRECTORY = "citations"
+# References returned for one Citation_Scout step
+SCOUT_MAX_REFERENCES = 15
+# Longest raw reference kept (a run-on "entry" is usually an appendix swallowed by the parser)
+MAX_REFERENCE_CHARS = 600
+
+_HEADER = re.compile(r"^(References|Bibliography)\s*$", re.IGNORECASE)
+# Sections that can follow the reference list
+_END_HEADER = re.compile(r"^(Appendix|Appendices|Supplementary)", re.IGNORECASE)
+_BRACKETED = re.compile(r"^\s*\[(\d{1,3})\]\s*")
+_NUMBERED = re.compile(r"^\s*(\d{1,3})\.\s+(?=[A-Z])")
+_ARXIV_ID = re.compile(r"(?:arxiv(?:\.org/(?:abs|pdf)/|:\s*)|\babs/)(\d{4}\.\d{4,5}(?:v\d+)?|[a-z\-]+(?:\.[A-Z]{2})?/\d{7}(?:v\d+)?)", re.IGNORECASE)
+_DOI = re.compile(r"\b(10\.\d{4,9}/[^\s\"<>]+)", re.IGNORECASE)
+_URL = re.compile(r"https?://\S+")
+_YEAR = re.compile(r"\b(19[5-9]\d|20\d{2})[a-z]?\b")
+_PAREN_YEAR = re.compile(r"\((19[5-9]\d|20\d{2})[a-z]?\)")
+_QUOTED = re.compile(r"[\"“]([^\"”]{10,300})[\"”]")
+# Sentence breaks that are not author initials ("A. Vaswani")
+_SENTENCE = re.compile(r"(?<![ .\-][A-Z])\.\s+")
+_INITIALS = re.compile(r"^([A-Z]\.\s*)+$")
+
+# Step wording that says nothing about which references are meant
+_GENERIC_TERMS = frozenset(
+    "find search look up verify check citation citations cited cite cites reference references referenced "
+    "paper papers related work works prior previous literature external other relevant list their they "
+    "about against all each any into these those them used uses using".split()
+)
+
+logger = logging.getLogger(__name__)
+
+def reference_text(page_texts: List[str]) -> str:
+    """Lines after the last References header, up to an appendix (page breaks included)."""
+    lines = [line for text in page_texts for line in text.split("\n")]
+    start = None
+    for i, line in enumerate(lines):
+        if _HEADER.match(line.strip()):
+            start = i + 1
+    if start is None:
+        return ""
+    body = []
+    for line in lines[start:]:
+        if _END_HEADER.match(line.strip()) and len(line.strip()) < 50:
+            break
+        body.append(line)
+    return "\n".join(body)
+
+def _split_entries(text: str) -> List[str]:
+    lines = [line.strip() for line in text.split("\n") if line.strip()]
+    for marker in (_BRACKETED, _NUMBERED):
+        starts = [i for i, line in enumerate(lines) if marker.match(line)]
+        if len(starts) >= 2:
+            return [" ".join(lines[a:b]) for a, b in zip(starts, starts[1:] + [len(lines)])]
+    # Author-year lists: an entry ends with a period and the next starts with a capitalized surname
+    entries, current = [], []
+    for line in lines:
+        if current and current[-1].endswith(".") and re.match(r"^[A-Z][A-Za-z'\-]+,", line):
+            entries.append(" ".join(current))
+            current = []
+        current.append(line)
+    if current:
+        entries.append(" ".join(current))
+    return entries
+
+def _split_authors(text: str) -> List[str]:
+    parts = [p.strip() for p in re.split(r",\s*and\s+|\s+and\s+|\s*&\s*|;|,", text) if p.strip()]
+    authors = []
+    for part in parts:
+        # "Vaswani, A." is split at the comma; glue the initials back onto the surname
+        if authors and _INITIALS.match(part):
+            authors[-1] = f"{authors[-1]}, {part}"
+        else:
+            authors.append(part)
+    return [a.strip(" .") for a in authors if a.strip(" .") and not re.fullmatch(r"et al\.?", a.strip())]
+
+def parse_reference(raw: str) -> Dict[str, Any]:
+    """
+    Structured fields of one reference string. Heuristic: handles the common numbered
+    ("Authors. Title. Venue, Year.") and author-year ("Authors (Year). Title. Venue.") styles.
+    """
+    raw = re.sub(r"(?<=[a-z])- (?=[a-z])", "", " ".join(raw.split())) # words hyphenated across lines
+    raw = _NUMBERED.sub("", _BRACKETED.sub("", raw), count=1)
+    arxiv = _ARXIV_ID.search(raw)
+    doi = _DOI.search(raw)
+    text = _URL.sub("", _DOI.sub("", _ARXIV_ID.sub("", raw)))
+    year = _PAREN_YEAR.search(text) or _YEAR.search(text)
+
+    title, authors = None, ""
+    quoted = _QUOTED.search(text)
+    sentences = [s.strip() for s in _SENTENCE.split(" " + text) if s.strip()]
+    if quoted:
+        title = quoted.group(1)
+        authors = text[:quoted.start()]
+    elif len(sentences) >= 2:
+        authors, title = sentences[0], sentences[1]
+    elif sentences:
+        title = sentences[0]
+    authors = _PAREN_YEAR.sub("", authors)
+    title = (title or "").strip(" ,.;:")
+    # A "title" that is just a year or venue fragment is not worth looking up
+    if len(title.split()) < 3:
+        title = None
+
+    return {
+        "raw": raw[:MAX_REFERENCE_CHARS],
+        "title": title,
+        "authors": _split_authors(authors)[:20],
+        "year": int(year.group(1)) if year else None,
+        "arxiv_id": arxiv.group(1) if arxiv else None,
+        "doi": doi.group(1).rstrip(".,;") if doi else None,
+    }
+
+def parse_references(page_texts: List[str]) -> List[Dict[str, Any]]:
+    """The paper's reference list as structured entries, numbered in order ("n": 1, 2, ...)."""
+    entries = []
+    for raw in _split_entries(reference_text(page_texts)):
+        if len(raw) > MAX_REFERENCE_CHARS * 2:
+            continue
+        entry = parse_reference(raw)
+        if entry["title"] or entry["arxiv_id"] or entry["doi"]:
+            entries.append({"n": len(entries) + 1, **entry, "status": "pending", "match": None})
+    return entries
+
+class CitationTable(PaperTable):
+    """
+    Parsed and resolved references of every paper in one collection, persisted as JSON:
+    {source: {"file_hash", "references": [{"n", "raw", "title", "authors", "year", "arxiv_id", "doi", "status", "match"}]}}
+    status is "pending" until looked up, then "resolved" (match holds the arXiv paper) or "unresolved".
+    """
+
+    def set_paper(self, source: str, file_hash: Optional[str], references: List[Dict[str, Any]]):
+        with self._lock:
+            self.papers[source] = {"file_hash": file_hash, "references": references}
+
+    def references(self, source: Optional[str] = None) -> List[Tuple[str, Dict[str, Any]]]:
+        with self._lock:
+            return [
+                (paper, dict(ref))
+                for paper, info in self.papers.items() if source is None or paper == source
+                for ref in info["references"]
+            ]
+
+    def pending(self) -> List[Tuple[str, Dict[str, Any]]]:
+        return [(source, ref) for source, ref in self.references() if ref["status"] == "pending"]
+
+    def set_resolution(self, source: str, n: int, match: Optional[Dict[str, Any]]):
+        with self._lock:
+            for ref in self.papers.get(source, {}).get("references", []):
+                if ref["n"] == n:
+                    ref["status"] = "resolved" if match else "unresolved"
+                    ref["match"] = match
+
+_tables = PaperTables(CITATIONS_SUBDIRECTORY, CitationTable)
+# One collection at a time, arXiv is rate limited
+_resolver = BackgroundTasks("citations", 1)
+
+def get_citation_table(collection_name: str) -> CitationTable:
+    """Get the citation table persisted next to the collection in chroma_db (empty if none yet)."""
+    return _tables.get(collection_name)
+
+def index_paper_references(collection_name: str, source: str, file_hash: Optional[str], references: List[Dict[str, Any]], save: bool = True):
+    """Record a freshly ingested paper's parsed references, unless this exact file's table is already there."""
+    table = get_citation_table(collection_name)
+    if table.papers.get(source, {}).get("file_hash") == file_hash and file_hash:
+        return
+    table.set_paper(source, file_hash, references)
+    if save:
+        table.save()
+
+def resolve_references(entries: List[Tuple[str, Dict[str, Any]]]) -> Dict[Tuple[str, int], Optional[Dict[str, Any]]]:
+    """
+    Look up (source, reference) pairs on arXiv in bulk: one batched id_list request per 100 ids,
+    then OR-ed title searches for the rest. Returns {(source, n): arXiv paper or None}.
+    """
+    from app.tools.arxiv_tool import get_arxiv_client, normalize_arxiv_id
+
+    client = get_arxiv_client()
+    ids = {(source, ref["n"]): normalize_arxiv_id(ref["arxiv_id"]) for source, ref in entries if ref.get("arxiv_id")}
+    by_id = client.get_papers(list(ids.values())) if ids else {}
+    matches = {key: by_id.get(paper_id) for key, paper_id in ids.items()}
+
+    titles = {(source, ref["n"]): ref["title"] for source, ref in entries if ref.get("title") and not matches.get((source, ref["n"]))}
+    by_title = client.find_titles(list(titles.values())) if titles else {}
+    for key, title in titles.items():
+        matches[key] = by_title.get(title)
+    for source, ref in entries:
+        matches.setdefault((source, ref["n"]), None)
+    return matches
+
+def _resolve_task(collection_name: str):
+    try:
+        table = get_citation_table(collection_name)
+        pending = table.pending()
+        if pending:
+            for (source, n), match in resolve_references(pending).items():
+                table.set_resolution(source, n, match)
+            table.save()
+    except Exception as e:
+        # Left pending; the next ingest of this collection (or a scout lookup) tries again
+        logger.warning("Reference resolution failed for %s: %s", collection_name, e)
+
+def schedule_reference_resolution(collection_name: str) -> bool:
+    """Resolve the collection's pending references in the background (one collection at a time, arXiv is rate limited)."""
+    if not get_citation_table(collection_name).pending():
+        return False
+    return _resolver.submit(collection_name, _resolve_task, collection_name)
+
+def wait_for_citations():
+    """Block until queued reference resolution is done (for scripts and the bulk CLI)."""
+    _resolver.wait()
+
+def _terms(text: str) -> set:
+    # Crude plural folding so "transformers" finds "Transformer"
+    return {t[:-1] if len(t) > 3 and t.endswith("s") else t for t in tokenize(text)}
+
+def _citation_view(source: str, ref: Dict[str, Any]) -> Dict[str, Any]:
+    view = {
+        "paper": source,
+        "ref": ref["n"],
+        "title": ref["title"],
+        "authors": ref["authors"][:3] + (["et al."] if len(ref["authors"]) > 3 else []),
+        "year": ref["year"],
+        "doi": ref["doi"],
+        "verified_on_arxiv": ref["status"] == "resolved",
+    }
+    if ref.get("match"):
+        match = ref["match"]
+        view.update({"arxiv_id": match.get("arxiv_id"), "arxiv_title": match.get("title"), "published": match.get("published"), "pdf_url": match.get("pdf_url")})
+    elif ref.get("arxiv_id"):
+        view["arxiv_id"] = ref["arxiv_id"]
+    return view
+
+def lookup_citations(query: str, collections: Optional[List[str]] = None, limit: int = SCOUT_MAX_REFERENCES) -> Optional[List[Dict[str, Any]]]:
+    """
+    Citations of the scoped papers relevant to a Citation_Scout step, from the local tables.
+    A step naming no specific topic ("Verify the citations") gets the whole reference list.
+    Pending references among the hits are resolved on the spot (batched). Returns None when
+    the tables have nothing for the step, so the caller can search the network instead.
+    """
+    from app.rag.retrieval import DEFAULT_COLLECTION
+
+    refs = [(name, source, ref) for name in collections or [DEFAULT_COLLECTION] for source, ref in get_citation_table(name).references()]
+    if not refs:
+        return None
+    terms = _terms(query) - _GENERIC_TERMS
+    if terms:
+        scored = []
+        for item in refs:
+            ref = item[2]
+            overlap = len(terms & _terms(" ".join([ref["title"] or "", " ".join(ref["authors"]), str(ref["year"] or "")])))
+            if overlap:
+                scored.append((overlap, item))
+        if not scored:
+            return None
+        scored.sort(key=lambda pair: pair[0], reverse=True)
+        hits = [item for _, item in scored[:limit]]
+    else:
+        hits = refs[:limit]
+
+    pending = [(name, source, ref) for name, source, ref in hits if ref["status"] == "pending"]
+    if pending:
+        try:
+            matches = resolve_references([(source, ref) for _, source, ref in pending])
+        except Exception as e:
+            # Still answer from the table; these stay pending for the background resolver
+            logger.warning("Reference lookup failed: %s", e)
+            pending, matches = [], {}
+        for name, source, ref in pending:
+            match = matches.get((source, ref["n"]))
+            ref["status"], ref["match"] = ("resolved" if match else "unresolved"), match
+            get_citation_table(name).set_resolution(source, ref["n"], match)
+        for name in {name for name, _, _ in pending}:
+            get_citation_table(name).save()
+    record("citation_table_hits", len(hits))
+    return [_citation_view(source, ref) for _, source, ref in hits]
@@ -1,49 +1,241 @@
 import os
-import chromadb
-from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
+import json
+import math
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Union, Tuple
+from app.rag.embedding_cache import CachedEmbeddings
+from app.rag.lexical import get_lexical_index, release_lexical_indexes
+from app.rag.manifest import load_manifest
+from app.telemetry import record, timer
 
 # Using BAAI/bge-m3 as requested
 EMBEDDING_MODEL_NAME = "BAAI/bge-m3"
 
-_vectorstore_instance = None
+# Persistent storage in ./chroma_db
+PERSIST_DIRECTORY = os.path.join(os.getcwd(), "chroma_db")
+
+# Reciprocal rank fusion constant and how many candidates each ranker contributes per result
+RRF_K = 60
+HYBRID_CANDIDATE_FACTOR = 4
+
+# Collection used when nothing narrower is selected (bulk ingestion and legacy uploads live here)
+DEFAULT_COLLECTION = "research_papers"
+# Open collection handles kept around; least recently used ones are released first
+MAX_OPEN_COLLECTIONS = 16
+
+_chroma_client = None
+_embeddings_instance = None
+_vectorstores: "OrderedDict[str, Any]" = OrderedDict() # collection name -> Chroma, in LRU order
+# The embedding model may be warmed up from a background thread while a request also needs it
+_resource_lock = threading.RLock()
 
 def get_embeddings():
     # Helper to get embedding model. Using CPU for safety/compatibility.
     # Users can configure device if needed.
-    return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+    # Wrapped in a persistent cache so text embedded before (in any collection or run) costs I/O, not inference.
+    # sentence-transformers/torch are imported here rather than at module load to keep startup fast.
+    global _embeddings_instance
+    with _resource_lock:
+        if _embeddings_instance is None:
+            from langchain_huggingface import HuggingFaceEmbeddings
+            _embeddings_instance = CachedEmbeddings(
+                HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME),
+                model_name=EMBEDDING_MODEL_NAME,
+            )
+        return _embeddings_instance
+
+def paper_collection_name(source: str) -> str:
+    """Collection holding a single paper, e.g. 'paper_3f2a...' for 'attention.pdf'."""
+    return "paper_" + hashlib.sha1(source.encode("utf-8")).hexdigest()[:16]
 
-def get_vectorstore(collection_name: str = "research_papers"):
+def get_vectorstore(collection_name: str = DEFAULT_COLLECTION):
     """
-    Get or create ChromaDB vector store.
+    Get or create a ChromaDB collection.
+    Open collections are kept in a small LRU registry that shares one Chroma client.
     """
-    global _vectorstore_instance
-    if _vectorstore_instance:
-        return _vectorstore_instance # Verify collection name matches if we cache? For now simplified.
-        
-    embeddings = get_embeddings()
-    # Persistent storage in ./chroma_db
-    persist_directory = os.path.join(os.getcwd(), "chroma_db")
-    
-    vectorstore = Chroma(
-        collection_name=collection_name,
-        embedding_function=embeddings,
-        persist_directory=persist_directory
-    )
-    _vectorstore_instance = vectorstore
+    global _chroma_client
+    still_open = None
+    with _resource_lock:
+        if collection_name in _vectorstores:
+            _vectorstores.move_to_end(collection_name)
+            return _vectorstores[collection_name]
+
+        import chromadb
+        from langchain_chroma import Chroma
+        if _chroma_client is None:
+            _chroma_client = chromadb.PersistentClient(path=PERSIST_DIRECTORY)
+
+        vectorstore = Chroma(
+            collection_name=collection_name,
+            embedding_function=get_embeddings(),
+            client=_chroma_client,
+        )
+        _vectorstores[collection_name] = vectorstore
+        if len(_vectorstores) > MAX_OPEN_COLLECTIONS:
+            while len(_vectorstores) > MAX_OPEN_COLLECTIONS:
+                _vectorstores.popitem(last=False)
+            still_open = list(_vectorstores)
+    # Lexical indexes of closed collections go too, except ones with unsaved chunks (mid-ingest);
+    # those are released by a later eviction once they are saved. This happens outside
+    # _resource_lock: get_lexical_index takes the two locks the other way round.
+    if still_open is not None:
+        release_lexical_indexes(still_open)
     return vectorstore
 
-def retrieve_context(query: str, k: int = 5, filter_dict: dict = None):
+def list_collections() -> Dict[str, List[str]]:
+    """Indexed collections and the papers (sources) in each, from the ingest manifest."""
+    return {name: sorted(sources) for name, sources in load_manifest()["collections"].items() if sources}
+
+def to_where(filter_dict: Optional[dict]) -> Optional[dict]:
+    """Chroma needs an explicit $and when a filter has more than one field."""
+    if not filter_dict:
+        return None
+    if len(filter_dict) > 1 and not any(key.startswith("$") for key in filter_dict):
+        return {"$and": [{key: value} for key, value in filter_dict.items()]}
+    return filter_dict
+
+def _query_vectorstore(vs, query_embeddings: List[List[float]], k: int, where: Optional[dict]) -> List[List[Dict[str, Any]]]:
+    """One vectorized Chroma query for many embeddings."""
+    res = vs._collection.query(
+        query_embeddings=query_embeddings,
+        n_results=k,
+        where=to_where(where),
+        include=["documents", "metadatas", "distances"],
+    )
+    batches = []
+    for ids, docs, metas, dists in zip(res["ids"], res["documents"], res["metadatas"], res["distances"]):
+        batches.append([
+            {"id": i, "content": d, "metadata": m or {}, "score": 1.0 / (1.0 + dist)}
+            for i, d, m, dist in zip(ids, docs, metas, dists)
+        ])
+    return batches
+
+def with_ranks(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
-    Retrieve context from vector store.
+    Stamp each result of one ranked list with its 1-based rank. Scores of different retrieval paths
+    (dense similarity, RRF, section cosine) are on different scales; ranks can be compared.
+    """
+    return [{**r, "rank": rank} for rank, r in enumerate(results, start=1)]
+
+def rank_key(result: Dict[str, Any]) -> tuple:
+    """Sort key, lower is better: rank in the result's own list (unranked last), then score."""
+    return result.get("rank", math.inf), -result.get("score", 0.0)
+
+def best_first(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Results from any mix of retrievals, best first."""
+    return sorted(results, key=rank_key)
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = RRF_K) -> Dict[str, float]:
+    """Fuse ranked id lists: score(id) = sum over rankings of 1 / (k + rank)."""
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return fused
+
+def _best_unique(items: list, key, score, n: int) -> list:
+    # A paper indexed in two collections has the same chunk ids in both; keep its best copy
+    best, seen = [], set()
+    for item in sorted(items, key=score, reverse=True):
+        if key(item) not in seen:
+            seen.add(key(item))
+            best.append(item)
+    return best[:n]
+
+def retrieve_context_batch(queries: List[str], k: int = 5, filters: Union[dict, List[Optional[dict]], None] = None, hybrid: bool = True, collections: Optional[List[str]] = None) -> List[List[Dict[str, Any]]]:
     """
-    vs = get_vectorstore()
+    Retrieve context for many queries at once: all queries are embedded in one batch and
+    queries sharing a filter are answered by a single vectorized similarity search.
+    With hybrid=True the dense ranking is fused with a BM25 ranking from the lexical index
+    (reciprocal rank fusion), so exact terms like table names or hyperparameters are not missed.
+    filters is either one filter for all queries or a list with one (or None) per query.
+    collections scopes the search (default: DEFAULT_COLLECTION); only those collections are touched,
+    so cost follows the active working set rather than everything ever ingested.
+    Returns one result list per query, in order.
+    """
+    if not queries:
+        return []
+    record("retrieval_calls")
+    with timer("retrieval_ms"):
+        return _retrieve_context_batch(queries, k, filters, hybrid, collections)
+
+def _retrieve_context_batch(queries: List[str], k: int, filters, hybrid: bool, collections: Optional[List[str]]) -> List[List[Dict[str, Any]]]:
+    if filters is None or isinstance(filters, dict):
+        filters = [filters] * len(queries)
+    collections = list(dict.fromkeys(collections or [DEFAULT_COLLECTION]))
+    
+    vectors = get_embeddings().embed_queries(list(queries))
+    n_candidates = k * HYBRID_CANDIDATE_FACTOR if hybrid else k
+    
+    # Group queries by filter so each distinct filter costs one Chroma call per collection
+    groups: Dict[str, List[int]] = {}
+    for i, f in enumerate(filters):
+        groups.setdefault(json.dumps(f or {}, sort_keys=True), []).append(i)
     
-    # Basic similarity search
-    # If filter_dict is provided (e.g. {"section": "Results"}), pass to search
-    if filter_dict:
-        docs = vs.similarity_search(query, k=k, filter=filter_dict)
-    else:
-        docs = vs.similarity_search(query, k=k)
-        
-    return [{"content": d.page_content, "metadata": d.metadata} for d in docs]
+    dense: List[List[Dict[str, Any]]] = [[] for _ in queries]
+    lexical_hits: List[List[Tuple[str, float]]] = [[] for _ in queries]
+    owner: Dict[str, str] = {} # chunk id -> collection it came from
+    for name in collections:
+        vs = get_vectorstore(name)
+        if not vs._collection.count():
+            continue
+        for key, idxs in groups.items():
+            where = json.loads(key)
+            batches = _query_vectorstore(vs, [vectors[i] for i in idxs], n_candidates, where)
+            for i, batch in zip(idxs, batches):
+                dense[i].extend(batch)
+                owner.update((r["id"], name) for r in batch)
+        if hybrid:
+            lexical = get_lexical_index(name)
+            for i, (query, f) in enumerate(zip(queries, filters)):
+                hits = lexical.search(query, n_candidates, to_where(f))
+                lexical_hits[i].extend(hits)
+                owner.update((chunk_id, name) for chunk_id, _ in hits)
+    if len(collections) > 1:
+        # Same embedding model everywhere, so dense scores are comparable across collections
+        dense = [_best_unique(d, lambda r: r["id"], lambda r: r["score"], n_candidates) for d in dense]
+        lexical_hits = [_best_unique(h, lambda x: x[0], lambda x: x[1], n_candidates) for h in lexical_hits]
+    if not hybrid:
+        return [with_ranks(d[:k]) for d in dense]
+    
+    docs: Dict[str, Dict[str, Any]] = {}
+    rankings: List[List[Tuple[str, float]]] = []
+    for dense_results, hits in zip(dense, lexical_hits):
+        for r in dense_results:
+            docs[r["id"]] = r
+        fused = reciprocal_rank_fusion([[r["id"] for r in dense_results], [chunk_id for chunk_id, _ in hits]])
+        top = sorted(fused, key=fused.get, reverse=True)[:k]
+        for chunk_id in top:
+            docs.setdefault(chunk_id, None)
+        rankings.append([(chunk_id, fused[chunk_id]) for chunk_id in top])
+    
+    # Chunks found only lexically are fetched from Chroma, one call per collection
+    missing: Dict[str, List[str]] = {}
+    for chunk_id, doc in docs.items():
+        if doc is None:
+            missing.setdefault(owner[chunk_id], []).append(chunk_id)
+    for name, ids in missing.items():
+        got = get_vectorstore(name)._collection.get(ids=ids, include=["documents", "metadatas"])
+        for chunk_id, content, metadata in zip(got["ids"], got["documents"], got["metadatas"]):
+            docs[chunk_id] = {"id": chunk_id, "content": content, "metadata": metadata or {}}
+    
+    return [
+        with_ranks([{**docs[chunk_id], "score": score} for chunk_id, score in ranking if docs.get(chunk_id)])
+        for ranking in rankings
+    ]
+
+def retrieve_context(query: str, k: int = 5, filter_dict: dict = None, collections: Optional[List[str]] = None):
+    """
+    Retrieve context from vector store.
+    If filter_dict is provided (e.g. {"section": "Results"}), it is applied to the search.
+    A filter on section (and optionally source) alone is served from the section index instead.
+    collections limits the search to those collections (e.g. the uploaded paper's).
+    """
+    if filter_dict and filter_dict.get("section") and set(filter_dict) <= {"section", "source"}:
+        from app.rag.sections import section_context
+        results = section_context(query, k, filter_dict["section"], filter_dict.get("source"), collections)
+        if results is not None:
+            return results
+    return retrieve_context_batch([query], k=k, filters=filter_dict, collections=collections)[0]
@@ -0,0 +1,241 @@
+"""
+Per-paper section index and precomputed section summaries.
+
+Ingestion records which chunks and pages make up each section of every paper. A compact
+summary of each section is then written in the background and stored next to the collection
+in chroma_db. Section-filtered retrieval is answered from the index without a vector search,
+and summary-style steps are answered from the stored summaries instead of re-reading the text.
+"""
+import os
+import re
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.rag.paper_tables import PaperTable, PaperTables, BackgroundTasks
+from app.telemetry import record
+
+SECTIONS_SUBDIRECTORY = "sections"
+# Set to 0 to skip the background summaries (e.g. for very large bulk ingests)
+SUMMARIES_ENABLED = os.getenv("RESEARCH_LAB_SECTION_SUMMARIES", "1") != "0"
+SUMMARY_CONCURRENCY = 4
+# Cap on how much of one section a summary call reads
+SUMMARY_INPUT_TOKENS = 6000
+SUMMARY_WORDS = 150
+
+# Section names as ingestion labels them, reduced to one key per kind ("Methods", "Methodology" -> "method")
+CANONICAL_SECTIONS = ["abstract", "introduction", "related work", "method", "result", "discussion", "conclusion", "references"]
+UNSUMMARIZED_SECTIONS = {"references"}
+
+SECTION_SUMMARY_SYSTEM_PROMPT = """You summarize one section of a research paper for later questions about it.
+Keep the key claims, methods, datasets, numbers and named entities. Reply with the summary only."""
+
+# Step wording that asks for a summary, and the sections a request refers to
+_SUMMARY_PATTERN = re.compile(r"\b(summar\w*|overview|outline|gist|tl;?dr|main (points|ideas|contributions)|key (points|ideas|findings|contributions))\b", re.IGNORECASE)
+_SECTION_PATTERNS = {
+    "abstract": r"abstract",
+    "introduction": r"introduction|motivation|background",
+    "related work": r"related work|prior work|previous work",
+    "method": r"method\w*|approach|procedure|architecture",
+    "result": r"results?|findings|experiments?|evaluation",
+    "discussion": r"discussion|limitations",
+    "conclusion": r"conclusions?|future work",
+}
+
+logger = logging.getLogger(__name__)
+
+def section_key(name: str) -> str:
+    lowered = " ".join(re.findall(r"[a-z]+", (name or "").lower()))
+    for canonical in CANONICAL_SECTIONS:
+        if lowered.startswith(canonical):
+            return canonical
+    return lowered
+
+class SectionIndex(PaperTable):
+    """
+    Sections of every paper in one collection, persisted as JSON:
+    {source: {"file_hash", "sections": [{"key", "name", "pages": [first, last], "chunk_ids", "summary"}]}}
+    Sections are in document order; chunk ids within a section are in document order too.
+    """
+
+    def set_paper(self, source: str, file_hash: Optional[str], chunks: List[Tuple[str, Dict[str, Any]]]):
+        """Index a paper from its (chunk id, metadata) pairs. Summaries of sections whose chunks are unchanged are kept."""
+        sections: Dict[str, Dict[str, Any]] = {}
+        for chunk_id, metadata in chunks:
+            name = metadata.get("section") or "Unknown"
+            key = section_key(name)
+            page = metadata.get("page")
+            entry = sections.setdefault(key, {"key": key, "name": name, "pages": [page, page], "chunk_ids": [], "summary": None})
+            entry["chunk_ids"].append(chunk_id)
+            if page is not None:
+                first, last = entry["pages"]
+                entry["pages"] = [page if first is None else min(first, page), page if last is None else max(last, page)]
+        with self._lock:
+            previous = {s["key"]: s for s in self.papers.get(source, {}).get("sections", [])}
+            for key, entry in sections.items():
+                old = previous.get(key)
+                if old and old["chunk_ids"] == entry["chunk_ids"]:
+                    entry["summary"] = old.get("summary")
+            self.papers[source] = {"file_hash": file_hash, "sections": list(sections.values())}
+
+    def find(self, key: Optional[str] = None, source: Optional[str] = None) -> List[Tuple[str, Dict[str, Any]]]:
+        """(source, section) pairs, optionally only one section kind and/or one paper."""
+        with self._lock:
+            return [
+                (paper, dict(entry))
+                for paper, info in self.papers.items() if source is None or paper == source
+                for entry in info["sections"] if key is None or entry["key"] == key
+            ]
+
+    def set_summary(self, source: str, key: str, chunk_ids: List[str], summary: str) -> bool:
+        """Store a summary, unless the section changed (re-ingested) while it was being written."""
+        with self._lock:
+            for entry in self.papers.get(source, {}).get("sections", []):
+                if entry["key"] == key and entry["chunk_ids"] == chunk_ids:
+                    entry["summary"] = summary
+                    return True
+            return False
+
+    def pending_summaries(self) -> List[Tuple[str, Dict[str, Any]]]:
+        return [(source, entry) for source, entry in self.find() if entry["summary"] is None and entry["key"] not in UNSUMMARIZED_SECTIONS]
+
+def _backfill_sections(index: SectionIndex, collection_name: str):
+    # Collections indexed before the section index existed: rebuild it from the lexical index once
+    from app.rag.lexical import get_lexical_index
+    from app.rag.manifest import load_manifest
+
+    entries = load_manifest()["collections"].get(collection_name, {})
+    if not entries:
+        return
+    lexical = get_lexical_index(collection_name)
+    by_source: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+    for number, chunk_id in enumerate(lexical.chunk_ids):
+        if lexical.alive[number]:
+            metadata = lexical.metadatas[number]
+            by_source.setdefault(metadata.get("source"), []).append((chunk_id, metadata))
+    for source, entry in entries.items():
+        if by_source.get(source):
+            index.set_paper(source, entry["file_hash"], by_source[source])
+    index.save()
+
+_indexes = PaperTables(SECTIONS_SUBDIRECTORY, SectionIndex, backfill=_backfill_sections)
+_summaries = BackgroundTasks("section-summary", SUMMARY_CONCURRENCY)
+
+def get_section_index(collection_name: str) -> SectionIndex:
+    """
+    Get the section index persisted next to the collection in chroma_db.
+    Collections indexed before this existed get one built from their lexical index once.
+    """
+    return _indexes.get(collection_name)
+
+def index_paper_sections(collection_name: str, source: str, file_hash: Optional[str], chunks: List[Tuple[str, Dict[str, Any]]], save: bool = True):
+    """Record a freshly ingested paper's sections (chunks as (id, metadata) in document order)."""
+    index = get_section_index(collection_name)
+    index.set_paper(source, file_hash, chunks)
+    if save:
+        index.save()
+
+def _section_text(collection_name: str, entry: Dict[str, Any]) -> str:
+    from app.rag.retrieval import get_vectorstore
+
+    got = get_vectorstore(collection_name)._collection.get(ids=entry["chunk_ids"], include=["documents"])
+    by_id = dict(zip(got["ids"], got["documents"]))
+    return "\n".join(by_id[i] for i in entry["chunk_ids"] if by_id.get(i))
+
+def summarize_section(collection_name: str, source: str, entry: Dict[str, Any]) -> str:
+    from langchain_core.messages import SystemMessage, HumanMessage
+    from app.agents.llm import get_llm
+    from app.concurrency import io_slot
+    from app.rag.chunking import truncate_tokens
+
+    text = truncate_tokens(_section_text(collection_name, entry), SUMMARY_INPUT_TOKENS)
+    prompt = f"""Paper: {source}
+Section: {entry['name']} (pages {entry['pages'][0]}-{entry['pages'][1]})
+
+{text}
+
+Summarize this section in at most {SUMMARY_WORDS} words."""
+    with io_slot():
+        response = get_llm().invoke([SystemMessage(content=SECTION_SUMMARY_SYSTEM_PROMPT), HumanMessage(content=prompt)])
+    return response.content.strip()
+
+def _summarize_task(collection_name: str, source: str, entry: Dict[str, Any]):
+    try:
+        summary = summarize_section(collection_name, source, entry)
+        index = get_section_index(collection_name)
+        if index.set_summary(source, entry["key"], entry["chunk_ids"], summary):
+            index.save()
+    except Exception as e:
+        # Left pending; the next ingest of this collection tries again
+        logger.warning("Section summary failed for %s / %s: %s", source, entry["name"], e)
+
+def schedule_section_summaries(collection_name: str) -> int:
+    """Queue background summaries for every section of the collection that has none yet. Returns how many were queued."""
+    if not SUMMARIES_ENABLED:
+        return 0
+    return sum(
+        _summaries.submit((collection_name, source, entry["key"]), _summarize_task, collection_name, source, entry)
+        for source, entry in get_section_index(collection_name).pending_summaries()
+    )
+
+def wait_for_summaries():
+    """Block until every queued summary is written (for scripts and the bulk CLI)."""
+    _summaries.wait()
+
+def section_context(query: str, k: int, section: str, source: Optional[str] = None, collections: Optional[List[str]] = None) -> Optional[List[Dict[str, Any]]]:
+    """
+    Chunks of one section, ranked by exact similarity to the query, read straight from the
+    section index (no vector search). None if no scoped paper has that section indexed.
+    """
+    import numpy as np
+    from app.rag.retrieval import DEFAULT_COLLECTION, get_embeddings, get_vectorstore, with_ranks
+
+    key = section_key(section)
+    candidates = []
+    for name in collections or [DEFAULT_COLLECTION]:
+        ids = [i for _, entry in get_section_index(name).find(key, source) for i in entry["chunk_ids"]]
+        if ids:
+            candidates.append((name, ids))
+    if not candidates:
+        return None
+
+    record("section_index_hits")
+    query_vector = np.asarray(get_embeddings().embed_query(query), dtype=np.float32)
+    results, seen = [], set()
+    for name, ids in candidates:
+        got = get_vectorstore(name)._collection.get(ids=ids, include=["documents", "metadatas", "embeddings"])
+        if not len(got["ids"]):
+            continue
+        vectors = np.asarray(got["embeddings"], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1) * (np.linalg.norm(query_vector) or 1.0)
+        scores = vectors @ query_vector / np.where(norms == 0, 1.0, norms)
+        for chunk_id, content, metadata, score in zip(got["ids"], got["documents"], got["metadatas"], scores):
+            if chunk_id not in seen:
+                seen.add(chunk_id)
+                results.append({"id": chunk_id, "content": content, "metadata": metadata or {}, "score": float(score)})
+    return with_ranks(sorted(results, key=lambda r: r["score"], reverse=True)[:k])
+
+def summary_request(text: str) -> Optional[List[str]]:
+    """
+    Section keys a summary-style request refers to ("Summarize the methodology" -> ["method"]);
+    [] for a summary of the whole paper; None if the request is not asking for a summary.
+    """
+    if not _SUMMARY_PATTERN.search(text):
+        return None
+    return [key for key, pattern in _SECTION_PATTERNS.items() if re.search(rf"\b({pattern})\b", text, re.IGNORECASE)]
+
+def precomputed_summaries(keys: List[str], collections: Optional[List[str]] = None) -> Optional[List[Tuple[str, Dict[str, Any]]]]:
+    """
+    (source, section) pairs whose stored summaries cover the requested sections (all sections for []).
+    None unless every matching section already has its summary, so callers can fall back to retrieval.
+    """
+    from app.rag.retrieval import DEFAULT_COLLECTION
+
+    sections = []
+    for name in collections or [DEFAULT_COLLECTION]:
+        for source, entry in get_section_index(name).find():
+            if entry["key"] in UNSUMMARIZED_SECTIONS or (keys and entry["key"] not in keys):
+                continue
+            sections.append((source, entry))
+    if not sections or any(entry["summary"] is None for _, entry in sections):
+        return None
+    return sections
@@ -0,0 +1,95 @@
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+# Heavy modules, roughly in the order the app first needs them
+HEAVY_MODULES = [
+    "langchain_openai",
+    "langgraph.graph",
+    "app.agents.graph",
+    "chromadb",
+    "langchain_chroma",
+    "langchain_huggingface",
+    "pypdf",
+]
+
+# Close enough to process start: this module is imported first thing by app/main.py
+PROCESS_START = time.perf_counter()
+
+_timings: Dict[str, float] = {}
+_timings_lock = threading.Lock()
+_warmup_thread = None
+_warmup_lock = threading.Lock()
+
+@contextmanager
+def timed(label: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(label, time.perf_counter() - start)
+
+def record(label: str, seconds: float):
+    with _timings_lock:
+        _timings.setdefault(label, seconds)
+
+def mark(label: str):
+    """Record the time since process start, e.g. when the first page finished rendering."""
+    record(label, time.perf_counter() - PROCESS_START)
+
+def startup_report() -> Dict[str, float]:
+    with _timings_lock:
+        return {label: round(seconds, 3) for label, seconds in _timings.items()}
+
+def _warm_up():
+    with timed("warmup: import agents"):
+        import app.agents.graph  # noqa: F401
+    with timed("warmup: load embedding model"):
+        from app.rag.retrieval import get_embeddings, get_vectorstore
+        # One real forward pass so weights are paged in before the first upload or question
+        get_embeddings().embeddings.embed_query("warm up")
+    with timed("warmup: open vector store"):
+        get_vectorstore()
+    mark("warmup: done (since start)")
+
+def _run_warm_up():
+    try:
+        _warm_up()
+    except Exception as e:
+        # A failed warm-up only means the first request pays the cost instead
+        record(f"warmup: failed ({type(e).__name__}: {e})", 0.0)
+
+def start_warmup() -> threading.Thread:
+    """Load the agents, embedding model and vector store in a background thread, once per process."""
+    global _warmup_thread
+    with _warmup_lock:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(target=_run_warm_up, name="warmup", daemon=True)
+            _warmup_thread.start()
+        return _warmup_thread
+
+def measure_imports(modules: List[str] = HEAVY_MODULES) -> List[Tuple[str, float]]:
+    """Cumulative import time of each module, skipping whatever earlier ones already pulled in."""
+    timings = []
+    for name in modules:
+        start = time.perf_counter()
+        try:
+            __import__(name)
+        except ImportError:
+            timings.append((name, float("nan")))
+            continue
+        timings.append((name, time.perf_counter() - start))
+    return timings
+
+if __name__ == "__main__":
+    # python -m app.startup   (for a per-module breakdown: python -X importtime -m app.startup)
+    total = 0.0
+    for name, seconds in measure_imports():
+        note = " (missing)" if seconds != seconds else ""
+        total += 0.0 if note else seconds
+        print(f"{name:<24} {seconds:7.3f}s{note}")
+    print(f"{'total':<24} {total:7.3f}s")
+    start = time.perf_counter()
+    _warm_up()
+    print(f"{'embedding warm-up':<24} {time.perf_counter() - start:7.3f}s")
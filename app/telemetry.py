@@ -0,0 +1,262 @@
+import os
+import re
+import json
+import time
+import inspect
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# USD per 1M tokens (input, output); models not listed are reported without a cost
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+}
+# Spans kept in memory for the /traces endpoint
+RECENT_SPANS = 1000
+METRICS_PORT = os.getenv("RESEARCH_LAB_METRICS_PORT")
+# generation_info key set on responses served from the LLM response cache (see app.agents.llm)
+CACHE_HIT_MARKER = "research_lab_cache_hit"
+
+_current: ContextVar[Optional["Metrics"]] = ContextVar("research_lab_metrics", default=None)
+
+_totals: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float)) # node -> metric -> total
+_recent: deque = deque(maxlen=RECENT_SPANS)
+_registry_lock = threading.Lock()
+_server = None
+
+class Metrics:
+    """Counters for one node invocation. Shared by every thread or task the node fans out to."""
+
+    def __init__(self):
+        self.values: Dict[str, float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def add(self, key: str, amount: float = 1.0):
+        with self._lock:
+            self.values[key] += amount
+
+    def as_dict(self) -> Dict[str, float]:
+        with self._lock:
+            return {k: round(v, 6) if isinstance(v, float) and not v.is_integer() else int(v) for k, v in self.values.items()}
+
+def record(key: str, amount: float = 1.0):
+    """Add to a counter of the node currently running (no-op outside an instrumented node)."""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.add(key, amount)
+
+@contextmanager
+def timer(key: str):
+    """Adds the elapsed milliseconds to `key`, e.g. `with timer("retrieval_ms"):`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(key, (time.perf_counter() - start) * 1000)
+
+def _cost(model: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    for name in sorted(MODEL_PRICES, key=len, reverse=True):
+        if model and model.startswith(name):
+            price_in, price_out = MODEL_PRICES[name]
+            return (prompt_tokens * price_in + completion_tokens * price_out) / 1e6
+    return None
+
+class TelemetryCallbackHandler(BaseCallbackHandler):
+    """
+    Counts LLM calls, time, prompt/completion tokens and estimated cost into the current node's metrics.
+    Responses served from the response cache only count as llm_cache_hits.
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        self._runs: Dict[Any, tuple] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        params = kwargs.get("invocation_params") or {}
+        self._runs[run_id] = (time.perf_counter(), params.get("model_name") or params.get("model") or "")
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        params = kwargs.get("invocation_params") or {}
+        self._runs[run_id] = (time.perf_counter(), params.get("model_name") or params.get("model") or "")
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        start, model = self._runs.pop(run_id, (None, ""))
+        # Served from the response cache: no request was made, so no tokens or cost
+        if any((gen.generation_info or {}).get(CACHE_HIT_MARKER) for generations in response.generations for gen in generations):
+            record("llm_cache_hits")
+            return
+        record("llm_calls")
+        if start is not None:
+            record("llm_ms", (time.perf_counter() - start) * 1000)
+        prompt_tokens = completion_tokens = 0
+        for generations in response.generations:
+            for gen in generations:
+                message = getattr(gen, "message", None)
+                usage = getattr(message, "usage_metadata", None) or {}
+                model = model or (getattr(message, "response_metadata", None) or {}).get("model_name", "")
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+        if not prompt_tokens and not completion_tokens:
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            prompt_tokens = usage.get("prompt_tokens", 0)
+            completion_tokens = usage.get("completion_tokens", 0)
+        record("prompt_tokens", prompt_tokens)
+        record("completion_tokens", completion_tokens)
+        cost = _cost(model, prompt_tokens, completion_tokens)
+        if cost:
+            record("cost_usd", cost)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._runs.pop(run_id, None)
+        record("llm_errors")
+
+TELEMETRY_HANDLER = TelemetryCallbackHandler()
+
+def _record_span(node: str, step_id, started: float, wall_ms: float, metrics: Metrics) -> Dict[str, Any]:
+    span = {
+        "node": node,
+        "step_id": step_id,
+        "started": round(started, 3),
+        "wall_ms": round(wall_ms, 3),
+        **metrics.as_dict(),
+    }
+    with _registry_lock:
+        totals = _totals[node]
+        totals["calls"] += 1
+        for key, value in span.items():
+            if key not in ("node", "step_id", "started"):
+                totals[key] += value
+        _recent.append(span)
+    return span
+
+def _finish_span(node: str, state: Dict[str, Any], started: float, wall_ms: float, metrics: Metrics, result):
+    span = _record_span(node, state.get("active_step_id"), started, wall_ms, metrics)
+    update = dict(result or {})
+    step_id = state.get("active_step_id")
+    if step_id is not None and update.get("research_plan"):
+        step_metrics = {k: v for k, v in span.items() if k not in ("node", "step_id", "started")}
+        update["research_plan"] = [
+            {**s, "metrics": {**(s.get("metrics") or {}), **step_metrics}} if s["id"] == step_id else s
+            for s in update["research_plan"]
+        ]
+    update["trace"] = [span]
+    return update
+
+def instrument_node(node: str, fn):
+    """
+    Wrap a graph node so each invocation records a span (wall time plus everything recorded inside it)
+    into the state's trace, into the metrics of the step it worked on, and into the process-wide totals.
+    """
+    if inspect.iscoroutinefunction(fn):
+        @wraps(fn)
+        async def async_wrapper(state):
+            metrics = Metrics()
+            token = _current.set(metrics)
+            started, start = time.time(), time.perf_counter()
+            try:
+                result = await fn(state)
+            finally:
+                _current.reset(token)
+            return _finish_span(node, state, started, (time.perf_counter() - start) * 1000, metrics, result)
+        return async_wrapper
+
+    @wraps(fn)
+    def wrapper(state):
+        metrics = Metrics()
+        token = _current.set(metrics)
+        started, start = time.time(), time.perf_counter()
+        try:
+            result = fn(state)
+        finally:
+            _current.reset(token)
+        return _finish_span(node, state, started, (time.perf_counter() - start) * 1000, metrics, result)
+    return wrapper
+
+@contextmanager
+def span(node: str):
+    """
+    Meter a block that runs outside the graph (e.g. the Quick Chat path) like a node.
+    Yields a dict that holds the finished span once the block exits.
+    """
+    metrics = Metrics()
+    token = _current.set(metrics)
+    started, start = time.time(), time.perf_counter()
+    finished: Dict[str, Any] = {}
+    try:
+        yield finished
+    finally:
+        _current.reset(token)
+        finished.update(_record_span(node, None, started, (time.perf_counter() - start) * 1000, metrics))
+
+def summarize_trace(trace: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Per-node totals for one run's trace."""
+    summary: Dict[str, Dict[str, float]] = {}
+    for span in trace or []:
+        node = summary.setdefault(span["node"], {"calls": 0})
+        node["calls"] += 1
+        for key, value in span.items():
+            if key not in ("node", "step_id", "started") and isinstance(value, (int, float)):
+                node[key] = round(node.get(key, 0) + value, 6)
+    return summary
+
+def export_trace(trace: List[Dict[str, Any]], **extra: Any) -> str:
+    return json.dumps({**extra, "spans": trace or [], "summary": summarize_trace(trace)}, indent=2)
+
+def recent_spans() -> List[Dict[str, Any]]:
+    with _registry_lock:
+        return list(_recent)
+
+def prometheus_text() -> str:
+    """Process-wide per-node totals in the Prometheus text exposition format."""
+    with _registry_lock:
+        snapshot = {node: dict(values) for node, values in _totals.items()}
+    series: Dict[str, List[str]] = defaultdict(list)
+    for node, values in sorted(snapshot.items()):
+        for key, value in sorted(values.items()):
+            name = re.sub(r"[^a-zA-Z0-9_]", "_", key)
+            if name.endswith("_ms"):
+                name, value = name[:-3] + "_seconds", value / 1000
+            series[f"research_lab_node_{name}_total"].append(f'{{node="{node}"}} {value:g}')
+    lines = []
+    for metric, samples in series.items():
+        lines.append(f"# TYPE {metric} counter")
+        lines.extend(f"{metric}{sample}" for sample in samples)
+    return "\n".join(lines) + "\n"
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.startswith("/metrics"):
+            body, content_type = prometheus_text().encode("utf-8"), "text/plain; version=0.0.4"
+        elif self.path.startswith("/traces"):
+            body, content_type = json.dumps(recent_spans()).encode("utf-8"), "application/json"
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve /metrics (Prometheus text) and /traces (recent spans as JSON), once per process."""
+    global _server
+    with _registry_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+        return _server
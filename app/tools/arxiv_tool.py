@@ -1,47 +1,274 @@
-import arxiv
-from langchain_core.tools import tool
+import os
+import re
+import threading
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional
 
-@tool
-def search_arxiv_papers(query: str, max_results: int = 5):
-    """
-    Search for papers on Arxiv.
-    Returns a list of papers with title, summary, authors, and pdf_url.
-    """
-    client = arxiv.Client()
-    search = arxiv.Search(
-        query=query,
-        max_results=max_results,
-        sort_by=arxiv.SortCriterion.Relevance
-    )
-    
+import httpx
+from langchain_core.tools import StructuredTool
+from app.cache import SQLiteCache
+from app.concurrency import io_slot, RateLimiter
+from app.telemetry import record, timer
+
+# Override to point the tools at a mirror or a local stand-in server
+ARXIV_API_URL = os.getenv("ARXIV_API_URL", "https://export.arxiv.org/api/query")
+ARXIV_TIMEOUT = 30.0
+# arXiv asks API clients for no more than one request every three seconds
+ARXIV_REQUESTS_PER_SECOND = float(os.getenv("ARXIV_REQUESTS_PER_SECOND", "0.34"))
+# Ids resolved per id_list request
+ARXIV_ID_BATCH_SIZE = 100
+# Titles OR-ed into one search request
+ARXIV_TITLE_BATCH_SIZE = 8
+# Word overlap (Jaccard) a search hit needs to count as the same paper as a title
+ARXIV_TITLE_MATCH = 0.8
+ARXIV_QUERY_TTL_SECONDS = 24 * 3600
+ARXIV_PAPER_TTL_SECONDS = 30 * 24 * 3600
+
+_ATOM = "{http://www.w3.org/2005/Atom}"
+_VERSION_SUFFIX = re.compile(r"v\d+$")
+
+_client = None
+_client_lock = threading.Lock()
+
+def normalize_arxiv_id(paper_id: str) -> str:
+    """'arXiv:2101.00001', 'https://arxiv.org/abs/2101.00001' and '2101.00001.pdf' all become '2101.00001'."""
+    paper_id = paper_id.strip()
+    paper_id = re.sub(r"^arxiv:", "", paper_id, flags=re.IGNORECASE)
+    for marker in ("/abs/", "/pdf/"):
+        if marker in paper_id:
+            paper_id = paper_id.split(marker, 1)[1]
+    if paper_id.endswith(".pdf"):
+        paper_id = paper_id[:-4]
+    return paper_id
+
+def _title_words(title: str) -> set:
+    return set(re.findall(r"[a-z0-9]+", title.lower()))
+
+def title_similarity(a: str, b: str) -> float:
+    words_a, words_b = _title_words(a), _title_words(b)
+    if not words_a or not words_b:
+        return 0.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+def _parse_feed(xml_text: str) -> list:
+    """Parse an arXiv Atom feed into paper dicts."""
     results = []
-    for result in client.results(search):
+    for entry in ET.fromstring(xml_text).iter(f"{_ATOM}entry"):
+        entry_id = entry.findtext(f"{_ATOM}id", "")
+        if "/api/errors" in entry_id:
+            continue
+        pdf_url = None
+        for link in entry.iter(f"{_ATOM}link"):
+            if link.get("title") == "pdf":
+                pdf_url = link.get("href")
         results.append({
-            "title": result.title,
-            "summary": result.summary,
-            "authors": [a.name for a in result.authors],
-            "pdf_url": result.pdf_url,
-            "published": str(result.published)
+            "arxiv_id": normalize_arxiv_id(entry_id),
+            "title": " ".join(entry.findtext(f"{_ATOM}title", "").split()),
+            "summary": entry.findtext(f"{_ATOM}summary", "").strip(),
+            "authors": [a.findtext(f"{_ATOM}name", "") for a in entry.iter(f"{_ATOM}author")],
+            "pdf_url": pdf_url,
+            "published": entry.findtext(f"{_ATOM}published", "")
         })
     return results
 
-@tool
-def get_arxiv_paper_details(paper_id: str):
+class ArxivClient:
+    """
+    Shared access to the arXiv API.
+    Searches and paper lookups are cached on disk, lookups for many ids go out as batched
+    id_list requests, and every request waits on one process-wide token bucket.
+    `transport` / `async_transport` are httpx transports, so tests can swap in a local server or a mock.
+    """
+
+    def __init__(self, base_url: str = ARXIV_API_URL, transport: Optional[httpx.BaseTransport] = None, async_transport: Optional[httpx.AsyncBaseTransport] = None, cache: Optional[SQLiteCache] = None, rate_limiter: Optional[RateLimiter] = None):
+        self.base_url = base_url
+        self.async_transport = async_transport
+        self.cache = cache if cache is not None else SQLiteCache("arxiv", ttl_seconds=ARXIV_PAPER_TTL_SECONDS)
+        self.rate_limiter = rate_limiter or RateLimiter(ARXIV_REQUESTS_PER_SECOND)
+        self.requests = 0
+        self._http = httpx.Client(transport=transport, timeout=ARXIV_TIMEOUT, follow_redirects=True)
+
+    @staticmethod
+    def _query_key(query: str, max_results: int) -> str:
+        return f"query:{max_results}:{' '.join(query.lower().split())}"
+
+    def _remember(self, papers: List[dict]):
+        for paper in papers:
+            # Reachable both by the exact version and by the bare id (latest version)
+            self.cache.set(f"id:{paper['arxiv_id']}", paper)
+            self.cache.set(f"id:{_VERSION_SUFFIX.sub('', paper['arxiv_id'])}", paper)
+
+    @staticmethod
+    def _match(ids: List[str], papers: List[dict]) -> Dict[str, dict]:
+        by_id = {}
+        for paper in papers:
+            by_id[paper["arxiv_id"]] = paper
+            by_id.setdefault(_VERSION_SUFFIX.sub("", paper["arxiv_id"]), paper)
+        return {i: by_id[i] for i in ids if i in by_id}
+
+    def _cached_papers(self, paper_ids: List[str]):
+        ids = list(dict.fromkeys(normalize_arxiv_id(i) for i in paper_ids))
+        found = {}
+        for paper_id in ids:
+            paper = self.cache.get(f"id:{paper_id}")
+            if paper is not None:
+                found[paper_id] = paper
+        missing = [i for i in ids if i not in found]
+        batches = [missing[i:i + ARXIV_ID_BATCH_SIZE] for i in range(0, len(missing), ARXIV_ID_BATCH_SIZE)]
+        return found, batches
+
+    @staticmethod
+    def _id_params(batch: List[str]) -> dict:
+        return {"id_list": ",".join(batch), "max_results": len(batch)}
+
+    @staticmethod
+    def _search_params(query: str, max_results: int) -> dict:
+        return {"search_query": query, "max_results": max_results, "sortBy": "relevance"}
+
+    def _fetch(self, params: dict) -> List[dict]:
+        self.rate_limiter.acquire()
+        with io_slot(), timer("external_ms"):
+            response = self._http.get(self.base_url, params=params)
+        self.requests += 1
+        record("external_calls.arxiv")
+        response.raise_for_status()
+        return _parse_feed(response.text)
+
+    async def _afetch(self, params: dict) -> List[dict]:
+        await self.rate_limiter.aacquire()
+        async with io_slot():
+            # httpx async clients are tied to an event loop, so each request gets its own
+            with timer("external_ms"):
+                async with httpx.AsyncClient(transport=self.async_transport, timeout=ARXIV_TIMEOUT, follow_redirects=True) as client:
+                    response = await client.get(self.base_url, params=params)
+        self.requests += 1
+        record("external_calls.arxiv")
+        response.raise_for_status()
+        return _parse_feed(response.text)
+
+    def search(self, query: str, max_results: int = 5) -> List[dict]:
+        key = self._query_key(query, max_results)
+        results = self.cache.get(key)
+        if results is None:
+            results = self._fetch(self._search_params(query, max_results))
+            self.cache.set(key, results, ttl_seconds=ARXIV_QUERY_TTL_SECONDS)
+            self._remember(results)
+        return results
+
+    async def asearch(self, query: str, max_results: int = 5) -> List[dict]:
+        key = self._query_key(query, max_results)
+        results = self.cache.get(key)
+        if results is None:
+            results = await self._afetch(self._search_params(query, max_results))
+            self.cache.set(key, results, ttl_seconds=ARXIV_QUERY_TTL_SECONDS)
+            self._remember(results)
+        return results
+
+    def find_titles(self, titles: List[str]) -> Dict[str, Optional[dict]]:
+        """
+        Best arXiv match per title (None if arXiv has no paper with that title).
+        Titles are OR-ed together, ARXIV_TITLE_BATCH_SIZE per search request, and hits are matched
+        back by word overlap. Matches and misses are both cached.
+        """
+        found, missing = {}, []
+        for title in dict.fromkeys(titles):
+            cached = self.cache.get(f"title:{' '.join(sorted(_title_words(title)))}")
+            if cached is None:
+                missing.append(title)
+            else:
+                found[title] = cached or None # {} marks a known miss
+        for i in range(0, len(missing), ARXIV_TITLE_BATCH_SIZE):
+            batch = missing[i:i + ARXIV_TITLE_BATCH_SIZE]
+            query = " OR ".join(f'ti:"{" ".join(re.findall(r"[A-Za-z0-9]+", title))}"' for title in batch)
+            papers = self._fetch(self._search_params(query, 3 * len(batch)))
+            self._remember(papers)
+            for title in batch:
+                scored = [(title_similarity(title, p["title"]), p) for p in papers]
+                score, best = max(scored, key=lambda item: item[0], default=(0.0, None))
+                match = best if score >= ARXIV_TITLE_MATCH else None
+                # Misses expire like searches, since the paper may appear on arXiv later
+                self.cache.set(f"title:{' '.join(sorted(_title_words(title)))}", match or {}, ttl_seconds=None if match else ARXIV_QUERY_TTL_SECONDS)
+                found[title] = match
+        return found
+
+    def get_papers(self, paper_ids: List[str]) -> Dict[str, dict]:
+        """Metadata for many papers, keyed by normalized id; ids arXiv does not know are left out."""
+        found, batches = self._cached_papers(paper_ids)
+        for batch in batches:
+            papers = self._fetch(self._id_params(batch))
+            self._remember(papers)
+            found.update(self._match(batch, papers))
+        return found
+
+    async def aget_papers(self, paper_ids: List[str]) -> Dict[str, dict]:
+        found, batches = self._cached_papers(paper_ids)
+        for batch in batches:
+            papers = await self._afetch(self._id_params(batch))
+            self._remember(papers)
+            found.update(self._match(batch, papers))
+        return found
+
+def get_arxiv_client() -> ArxivClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ArxivClient()
+        return _client
+
+def set_arxiv_client(client: ArxivClient):
+    """Swap the shared client, e.g. for one pointed at a local test server."""
+    global _client
+    with _client_lock:
+        _client = client
+
+def _search_arxiv_papers(query: str, max_results: int = 5):
+    """
+    Search for papers on Arxiv.
+    Returns a list of papers with title, summary, authors, and pdf_url.
+    """
+    return get_arxiv_client().search(query, max_results)
+
+async def _asearch_arxiv_papers(query: str, max_results: int = 5):
+    return await get_arxiv_client().asearch(query, max_results)
+
+def _get_arxiv_paper_details(paper_id: str):
     """
     Get details for a specific Arxiv paper by ID.
     """
-    client = arxiv.Client()
-    search = arxiv.Search(id_list=[paper_id])
-    results = list(client.results(search))
-    
-    if not results:
+    papers = get_arxiv_client().get_papers([paper_id])
+    if not papers:
+        return {"error": "Paper not found"}
+    return next(iter(papers.values()))
+
+async def _aget_arxiv_paper_details(paper_id: str):
+    papers = await get_arxiv_client().aget_papers([paper_id])
+    if not papers:
         return {"error": "Paper not found"}
-        
-    result = results[0]
-    return {
-        "title": result.title,
-        "summary": result.summary,
-        "authors": [a.name for a in result.authors],
-        "pdf_url": result.pdf_url,
-        "published": str(result.published)
-    }
+    return next(iter(papers.values()))
+
+def _get_arxiv_papers(paper_ids: List[str]):
+    """
+    Get details for many Arxiv papers at once, keyed by ID. Unknown IDs are omitted.
+    """
+    return get_arxiv_client().get_papers(paper_ids)
+
+async def _aget_arxiv_papers(paper_ids: List[str]):
+    return await get_arxiv_client().aget_papers(paper_ids)
+
+# Each tool has a sync and an async implementation, so it works under invoke() and ainvoke()
+search_arxiv_papers = StructuredTool.from_function(
+    func=_search_arxiv_papers,
+    coroutine=_asearch_arxiv_papers,
+    name="search_arxiv_papers",
+)
+
+get_arxiv_paper_details = StructuredTool.from_function(
+    func=_get_arxiv_paper_details,
+    coroutine=_aget_arxiv_paper_details,
+    name="get_arxiv_paper_details",
+)
+
+get_arxiv_papers = StructuredTool.from_function(
+    func=_get_arxiv_papers,
+    coroutine=_aget_arxiv_papers,
+    name="get_arxiv_papers",
+)
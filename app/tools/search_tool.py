@@ -1,32 +1,210 @@
 import os
-import requests
-from langchain_core.tools import tool
+import time
+import random
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
 
-@tool
-def google_scholar_search(query: str):
+import httpx
+from langchain_core.tools import StructuredTool
+from app.cache import SQLiteCache
+from app.concurrency import io_slot
+from app.telemetry import record, timer
+
+# Override to point the tool at a local mock server
+SERPER_SCHOLAR_URL = os.getenv("SERPER_API_URL", "https://google.serper.dev/scholar")
+# Bounded so a stalled Serper response cannot hang the graph
+SERPER_TIMEOUT = httpx.Timeout(15.0, connect=5.0)
+SERPER_MAX_RETRIES = 3
+SERPER_BACKOFF_SECONDS = 0.5
+# Longest Retry-After we wait out; if Serper asks for more, the search fails instead of stalling the graph
+SERPER_MAX_RETRY_AFTER_SECONDS = 10.0
+SERPER_CACHE_TTL_SECONDS = 3 * 24 * 3600
+# Concurrent requests per batch (the global io_slot limit still applies)
+SERPER_BATCH_CONCURRENCY = 8
+
+_RETRY_STATUS = {429, 500, 502, 503, 504}
+
+_client = None
+_client_lock = threading.Lock()
+
+class SerperClient:
+    """
+    Google Scholar search through Serper with a pooled HTTP client.
+    Timeouts, 429/5xx responses and connection errors are retried with jittered exponential backoff,
+    and successful responses are cached on disk.
+    `transport` / `async_transport` are httpx transports, so tests can swap in a local mock.
+    """
+
+    def __init__(self, base_url: str = SERPER_SCHOLAR_URL, transport: Optional[httpx.BaseTransport] = None, async_transport: Optional[httpx.AsyncBaseTransport] = None, cache: Optional[SQLiteCache] = None, max_retries: int = SERPER_MAX_RETRIES, backoff_seconds: float = SERPER_BACKOFF_SECONDS):
+        self.base_url = base_url
+        self.async_transport = async_transport
+        self.cache = cache if cache is not None else SQLiteCache("serper", ttl_seconds=SERPER_CACHE_TTL_SECONDS)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.requests = 0
+        self._http = httpx.Client(transport=transport, timeout=SERPER_TIMEOUT)
+
+    @staticmethod
+    def _cache_key(query: str, num: int) -> str:
+        return f"scholar:{num}:{' '.join(query.lower().split())}"
+
+    @staticmethod
+    def _headers():
+        api_key = os.getenv("SERPER_API_KEY")
+        if not api_key:
+            return None
+        return {'X-API-KEY': api_key, 'Content-Type': 'application/json'}
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response]) -> Optional[float]:
+        """Seconds to wait before the next attempt, or None to give up (Retry-After above the cap)."""
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return float(retry_after) if float(retry_after) <= SERPER_MAX_RETRY_AFTER_SECONDS else None
+        return self.backoff_seconds * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+    def search(self, query: str, num: int = 5) -> dict:
+        key = self._cache_key(query, num)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        headers = self._headers()
+        if headers is None:
+            return {"error": "SERPER_API_KEY not set"}
+
+        error = None
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                record("external_calls.serper")
+                with io_slot(), timer("external_ms"):
+                    response = self._http.post(self.base_url, headers=headers, json={"q": query, "num": num})
+                self.requests += 1
+                if response.status_code not in _RETRY_STATUS:
+                    response.raise_for_status()
+                    result = response.json()
+                    self.cache.set(key, result)
+                    return result
+                error = f"HTTP {response.status_code}"
+            except httpx.TransportError as e:
+                error = str(e) or type(e).__name__
+            except Exception as e:
+                return {"error": str(e)}
+            if attempt < self.max_retries:
+                delay = self._backoff(attempt, response)
+                if delay is None:
+                    return {"error": f"{error}, retry after {response.headers['Retry-After']}s"}
+                time.sleep(delay)
+        return {"error": error}
+
+    async def _asearch(self, client: httpx.AsyncClient, query: str, num: int) -> dict:
+        key = self._cache_key(query, num)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        headers = self._headers()
+        if headers is None:
+            return {"error": "SERPER_API_KEY not set"}
+
+        error = None
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                record("external_calls.serper")
+                async with io_slot():
+                    with timer("external_ms"):
+                        response = await client.post(self.base_url, headers=headers, json={"q": query, "num": num})
+                self.requests += 1
+                if response.status_code not in _RETRY_STATUS:
+                    response.raise_for_status()
+                    result = response.json()
+                    self.cache.set(key, result)
+                    return result
+                error = f"HTTP {response.status_code}"
+            except httpx.TransportError as e:
+                error = str(e) or type(e).__name__
+            except Exception as e:
+                return {"error": str(e)}
+            if attempt < self.max_retries:
+                delay = self._backoff(attempt, response)
+                if delay is None:
+                    return {"error": f"{error}, retry after {response.headers['Retry-After']}s"}
+                await asyncio.sleep(delay)
+        return {"error": error}
+
+    def _async_client(self) -> httpx.AsyncClient:
+        # httpx async clients are tied to an event loop, so each call (or batch) opens its own
+        return httpx.AsyncClient(transport=self.async_transport, timeout=SERPER_TIMEOUT)
+
+    async def asearch(self, query: str, num: int = 5) -> dict:
+        async with self._async_client() as client:
+            return await self._asearch(client, query, num)
+
+    def search_many(self, queries: List[str], num: int = 5) -> List[dict]:
+        """Run many queries concurrently over the pooled client; results come back in query order."""
+        unique = list(dict.fromkeys(queries))
+        with ThreadPoolExecutor(max_workers=max(1, min(SERPER_BATCH_CONCURRENCY, len(unique)))) as pool:
+            # Each task runs in a copy of the caller's context (taken here, not in the worker),
+            # so its telemetry lands in the calling node
+            futures = [pool.submit(contextvars.copy_context().run, self.search, q, num) for q in unique]
+            results = {q: future.result() for q, future in zip(unique, futures)}
+        return [results[q] for q in queries]
+
+    async def asearch_many(self, queries: List[str], num: int = 5) -> List[dict]:
+        unique = list(dict.fromkeys(queries))
+        gate = asyncio.Semaphore(SERPER_BATCH_CONCURRENCY)
+
+        async def one(client, query):
+            async with gate:
+                return await self._asearch(client, query, num)
+
+        async with self._async_client() as client:
+            results = dict(zip(unique, await asyncio.gather(*(one(client, q) for q in unique))))
+        return [results[q] for q in queries]
+
+def get_serper_client() -> SerperClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = SerperClient()
+        return _client
+
+def set_serper_client(client: SerperClient):
+    """Swap the shared client, e.g. for one pointed at a local mock server."""
+    global _client
+    with _client_lock:
+        _client = client
+
+def _google_scholar_search(query: str):
     """
     Search Google Scholar via Serper API to find paper citations and impact.
     Requires SERPER_API_KEY environment variable.
     """
-    api_key = os.getenv("SERPER_API_KEY")
-    if not api_key:
-        return {"error": "SERPER_API_KEY not set"}
-
-    url = "https://google.serper.dev/scholar"
-    payload = json.dumps({
-        "q": query,
-        "num": 5
-    })
-    headers = {
-        'X-API-KEY': api_key,
-        'Content-Type': 'application/json'
-    }
-
-    try:
-        response = requests.post(url, headers=headers, data=payload)
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        return {"error": str(e)}
-
-import json
+    return get_serper_client().search(query)
+
+async def _agoogle_scholar_search(query: str):
+    return await get_serper_client().asearch(query)
+
+def _verify_citations(queries: List[str]):
+    """
+    Look up many citations on Google Scholar at once, e.g. one query per referenced title.
+    Returns one Serper result (or error) per query, in order.
+    """
+    return get_serper_client().search_many(queries)
+
+async def _averify_citations(queries: List[str]):
+    return await get_serper_client().asearch_many(queries)
+
+google_scholar_search = StructuredTool.from_function(
+    func=_google_scholar_search,
+    coroutine=_agoogle_scholar_search,
+    name="google_scholar_search",
+)
+
+verify_citations = StructuredTool.from_function(
+    func=_verify_citations,
+    coroutine=_averify_citations,
+    name="verify_citations",
+)
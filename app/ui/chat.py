@@ -29,6 +29,60 @@ def render_plan_status(plan):
             st.write(f"**Task:** {step['description']}")
             if step["result"]:
                 st.info(f"**Result:** {step['result']}")
+            metrics = step.get("metrics") or {}
+            if "tokens_saved" in metrics:
+                st.caption(f"Context: {metrics['context_tokens']} tokens from {metrics['chunks_used']} chunks, {metrics['tokens_saved']} saved")
+            if metrics.get("citations_from_table"):
+                st.caption(f"{metrics['citations_from_table']} citations from the paper's reference table")
+            if metrics.get("pool_hits"):
+                st.caption("Context from chunks already retrieved in this run")
+            if metrics.get("reused"):
+                st.caption("♻️ Reused from an earlier run with the same inputs")
+            if metrics.get("section_summaries_used"):
+                st.caption(f"Answered from {metrics['section_summaries_used']} precomputed section summaries")
+            if "wall_ms" in metrics:
+                st.caption(_format_metrics(metrics))
+
+def _format_metrics(metrics) -> str:
+    parts = [f"{metrics['wall_ms'] / 1000:.2f}s"]
+    if metrics.get("llm_calls"):
+        parts.append(f"{metrics['llm_calls']} LLM calls, {metrics.get('prompt_tokens', 0)} + {metrics.get('completion_tokens', 0)} tokens")
+    if metrics.get("llm_cache_hits"):
+        parts.append(f"{metrics['llm_cache_hits']} cached LLM responses")
+    if metrics.get("cost_usd"):
+        parts.append(f"${metrics['cost_usd']:.4f}")
+    if metrics.get("retrieval_ms"):
+        parts.append(f"retrieval {metrics['retrieval_ms']:.0f}ms")
+    external = sum(v for k, v in metrics.items() if k.startswith("external_calls."))
+    if external:
+        parts.append(f"{external} API calls ({metrics.get('external_ms', 0):.0f}ms)")
+    hits = sum(v for k, v in metrics.items() if k.startswith("cache_hits."))
+    misses = sum(v for k, v in metrics.items() if k.startswith("cache_misses."))
+    if hits or misses:
+        parts.append(f"cache {hits}/{hits + misses} hits")
+    return " · ".join(parts)
+
+def render_quick_chat_status(metrics):
+    """Latency of the last Quick Chat answer against its target."""
+    if not metrics:
+        return
+    icon = "⚡" if metrics["within_target"] else "🐢"
+    first = f", first token {metrics['first_token_seconds']:.2f}s" if metrics.get("first_token_seconds") is not None else ""
+    st.caption(
+        f"{icon} Quick Chat: {metrics['latency_seconds']:.2f}s (target {metrics['latency_target_seconds']:.1f}s){first}, "
+        f"{metrics['context_tokens']} context tokens from {metrics['chunks_used']} chunks"
+    )
+
+def render_trace_summary(trace):
+    """Per-agent totals for the last run, plus the full trace as a JSON download."""
+    if not trace:
+        return
+    from app.telemetry import summarize_trace, export_trace
+
+    with st.expander("⏱️ Run telemetry"):
+        for node, totals in summarize_trace(trace).items():
+            st.caption(f"**{node}** ×{totals['calls']}: {_format_metrics(totals)}")
+        st.download_button("Download trace (JSON)", export_trace(trace), file_name="research_trace.json", mime="application/json")
 
 def render_mermaid(code: str):
     """
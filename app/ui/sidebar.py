@@ -1,7 +1,10 @@
 import streamlit as st
 import os
+from app.agents.llm import llm_cache_stats
+from app.startup import startup_report
 
-def render_sidebar():
+def render_sidebar() -> str:
+    """Returns the selected mode: "Research Mode", "Quick Chat" or "Auto"."""
     with st.sidebar:
         st.title("🤖 Agentic Research Lab")
         st.markdown("---")
@@ -17,8 +20,42 @@ def render_sidebar():
             os.environ["SERPER_API_KEY"] = serper_key
 
         st.markdown("### Settings")
-        mode = st.radio("Mode", ["Research Mode", "Quick Chat"])
+        mode = st.radio(
+            "Mode",
+            ["Research Mode", "Quick Chat", "Auto"],
+            help="Quick Chat answers from the paper in a single LLM call. Auto sends lookup-style questions to Quick Chat and everything else to the research agents.",
+        )
         st.caption("Plan-and-Execute Agent System")
+
+        stats = llm_cache_stats()
+        st.caption(f"LLM cache: {stats['hits']} hits / {stats['misses']} misses ({stats['entries']} stored)")
+
+        with st.expander("Startup timings"):
+            st.json(startup_report())
         
         st.markdown("---")
         st.info("Upload a PDF to begin.")
+    return mode
+
+def render_scope_selector(current_collection: str = None):
+    """Sidebar picker for the collections retrieval is scoped to; defaults to the uploaded paper."""
+    from app.rag.retrieval import list_collections, DEFAULT_COLLECTION
+
+    collections = list_collections()
+    if current_collection and current_collection not in collections:
+        collections[current_collection] = []
+
+    def label(name):
+        sources = collections.get(name) or []
+        if name.startswith("paper_") and len(sources) == 1:
+            return f"📄 {sources[0]}"
+        return f"📚 {name} ({len(sources)} papers)"
+
+    with st.sidebar:
+        return st.multiselect(
+            "Search scope",
+            options=list(collections),
+            default=[current_collection] if current_collection else [],
+            format_func=label,
+            help=f"Papers the agents search. Leave empty to search the shared '{DEFAULT_COLLECTION}' collection.",
+        )
@@ -0,0 +1,92 @@
+"""
+Synthetic research-paper PDFs for benchmarks.
+Pages are plain Helvetica text written with a minimal PDF writer (no extra dependencies),
+laid out with the section headers the ingestion heuristics look for.
+"""
+import os
+import random
+from typing import List
+
+SECTIONS = ["Abstract", "Introduction", "Related Work", "Methods", "Results", "Discussion", "Conclusion", "References"]
+LINES_PER_PAGE = 55
+WORDS_PER_LINE = 14
+
+# Small technical vocabulary so BM25 and the hash embeddings see realistic term overlap
+VOCABULARY = (
+    "model transformer attention layer encoder decoder token embedding gradient loss optimizer "
+    "learning rate batch size dataset benchmark accuracy baseline ablation training inference "
+    "parameter convolution graph node retrieval query document corpus latency throughput memory "
+    "distribution sampling diffusion reinforcement policy reward agent planning reasoning "
+    "evaluation metric precision recall score table figure experiment result method approach"
+).split()
+
+def _escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def write_pdf(path: str, pages: List[List[str]]):
+    """Write pages (lists of text lines) as a minimal valid PDF."""
+    objects: List[bytes] = []
+    font_id = 1
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_id = 2 + 2 * len(pages)
+    page_ids = []
+    for lines in pages:
+        body = "BT /F1 9 Tf 40 800 Td 13 TL\n" + "".join(f"({_escape(line)}) Tj T*\n" for line in lines) + "ET"
+        stream = body.encode("latin-1", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 842] /Contents %d 0 R /Resources << /Font << /F1 %d 0 R >> >> >>"
+            % (pages_id, content_id, font_id)
+        )
+        page_ids.append(len(objects))
+    objects.append(b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % i for i in page_ids) + b"] /Count %d >>" % len(page_ids))
+    objects.append(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+    catalog_id = len(objects)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog_id, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+def synthetic_pages(n_pages: int, seed: int = 0) -> List[List[str]]:
+    """Deterministic page text; sections are spread evenly and each starts with its header line."""
+    rng = random.Random(seed)
+    # Per-paper topic words make papers distinguishable from each other
+    topic = [f"topic{seed}x{i}" for i in range(5)]
+    section_starts = {int(i * n_pages / len(SECTIONS)): name for i, name in enumerate(SECTIONS)}
+    pages = []
+    for page in range(n_pages):
+        lines = []
+        if page in section_starts:
+            lines.append(section_starts[page])
+        while len(lines) < LINES_PER_PAGE:
+            words = rng.choices(VOCABULARY + topic, k=WORDS_PER_LINE)
+            if rng.random() < 0.1:
+                words.append(f"{rng.choice(['lr', 'batch', 'dropout', 'steps'])}={rng.choice(['3e-4', '256', '0.1', '100k'])}")
+            lines.append(" ".join(words))
+        pages.append(lines)
+    return pages
+
+def generate_pdf(path: str, n_pages: int, seed: int = 0) -> str:
+    write_pdf(path, synthetic_pages(n_pages, seed))
+    return path
+
+def generate_corpus(directory: str, page_counts: List[int], seed: int = 0) -> List[str]:
+    """One PDF per entry in page_counts (e.g. [5, 50, 500]); existing files are reused."""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i, n_pages in enumerate(page_counts):
+        path = os.path.join(directory, f"synthetic_{seed + i}_{n_pages}p.pdf")
+        if not os.path.exists(path):
+            generate_pdf(path, n_pages, seed=seed + i)
+        paths.append(path)
+    return paths
@@ -0,0 +1,72 @@
+"""
+Local stand-in for the arXiv API and Serper's Google Scholar endpoint.
+Responses are generated deterministically from the request, after a configurable delay.
+"""
+import json
+import time
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+def _fake_id(seed: str) -> str:
+    digest = int(hashlib.sha1(seed.encode("utf-8")).hexdigest(), 16)
+    return f"{2000 + digest % 500:04d}.{digest % 100000:05d}"
+
+def _atom_entry(paper_id: str, title: str) -> str:
+    return (
+        f"<entry><id>http://arxiv.org/abs/{paper_id}v1</id>"
+        f"<title>{escape(title)}</title>"
+        f"<summary>Synthetic abstract for {escape(title)}.</summary>"
+        f"<author><name>A. Author</name></author><author><name>B. Author</name></author>"
+        f'<link title="pdf" href="http://arxiv.org/pdf/{paper_id}v1"/>'
+        f"<published>2023-01-01T00:00:00Z</published></entry>"
+    )
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body: bytes, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        # arXiv: /api/query?search_query=...&max_results=N or ?id_list=a,b,c
+        time.sleep(self.server.latency)
+        self.server.requests += 1
+        params = parse_qs(urlparse(self.path).query)
+        if params.get("id_list"):
+            ids = params["id_list"][0].split(",")
+            entries = [_atom_entry(i, f"Paper {i}") for i in ids]
+        else:
+            query = params.get("search_query", [""])[0]
+            n = int(params.get("max_results", ["5"])[0])
+            entries = [_atom_entry(_fake_id(f"{query}:{i}"), f"{query} study {i}") for i in range(n)]
+        feed = '<feed xmlns="http://www.w3.org/2005/Atom">' + "".join(entries) + "</feed>"
+        self._send(feed.encode("utf-8"), "application/atom+xml")
+
+    def do_POST(self):
+        # Serper: POST /scholar {"q": ..., "num": N}
+        time.sleep(self.server.latency)
+        self.server.requests += 1
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        query = payload.get("q", "")
+        organic = [
+            {"title": f"{query} ({i})", "link": f"https://example.org/{_fake_id(query + str(i))}", "citedBy": 10 * (i + 1), "year": 2020 + i}
+            for i in range(int(payload.get("num", 5)))
+        ]
+        self._send(json.dumps({"organic": organic}).encode("utf-8"), "application/json")
+
+def start_fake_server(latency: float = 0.0) -> Tuple[ThreadingHTTPServer, str]:
+    """Serve on a free localhost port in a daemon thread. Returns (server, base URL); call server.shutdown() when done."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.latency = latency
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, name="fake-api", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
@@ -0,0 +1,130 @@
+"""
+Deterministic local stand-ins for the tokenizer, the embedding model and the chat model,
+with simulated latency.
+"""
+import re
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from typing import Any, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+_WORD = re.compile(r"\w+")
+
+# Roughly how cl100k_base splits text: words with their leading space, punctuation runs, whitespace
+_PIECE = re.compile(r"""'(?:s|t|re|ve|m|ll|d)| ?[^\W\d_]+| ?\d{1,3}| ?[^\s\w]+|\s+(?!\S)|\s+|_+""")
+
+class WordPieceEncoding:
+    """
+    Offline stand-in for a tiktoken encoding, used when the real BPE file isn't cached.
+    Every piece gets an id on first sight, so decode(encode_ordinary(text)) == text and token
+    counts land close to cl100k_base's for English prose.
+    """
+
+    def __init__(self, name: str = "benchmark-wordpiece"):
+        self.name = name
+        self._ids = {}
+        self._pieces = []
+        # Agents chunk and count tokens from several threads at once
+        self._lock = threading.Lock()
+
+    def _id(self, piece: str) -> int:
+        token = self._ids.get(piece)
+        if token is None:
+            with self._lock:
+                token = self._ids.get(piece)
+                if token is None:
+                    token = self._ids[piece] = len(self._pieces)
+                    self._pieces.append(piece)
+        return token
+
+    def encode_ordinary(self, text: str) -> List[int]:
+        return [self._id(piece) for piece in _PIECE.findall(text)]
+
+    def decode(self, tokens: List[int]) -> str:
+        return "".join(self._pieces[t] for t in tokens)
+
+class HashEmbeddings(Embeddings):
+    """
+    Feature-hashed bag of words, L2-normalized: texts sharing words get similar vectors, so
+    retrieval behaves sensibly. Latency is per_call + per_text seconds, like a batched forward pass.
+    """
+
+    def __init__(self, dim: int = 1024, per_call_latency: float = 0.0, per_text_latency: float = 0.0):
+        self.dim = dim
+        self.per_call_latency = per_call_latency
+        self.per_text_latency = per_text_latency
+
+    def _vector(self, text: str) -> List[float]:
+        v = np.zeros(self.dim, dtype=np.float32)
+        for word in _WORD.findall(text.lower()):
+            h = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+            v[h % self.dim] += 1.0 if (h >> 63) else -1.0
+        norm = np.linalg.norm(v)
+        return (v / norm if norm else v).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.per_call_latency + self.per_text_latency * len(texts))
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+# A plan that exercises every agent, with one dependency
+FAKE_PLAN = [
+    {"description": "Summarize the methodology", "assigned_agent": "PDF_Analyst", "depends_on": []},
+    {"description": "Extract the reported results", "assigned_agent": "PDF_Analyst", "depends_on": []},
+    {"description": "Find related work on attention models", "assigned_agent": "Citation_Scout", "depends_on": []},
+    {"description": "Diagram the proposed architecture", "assigned_agent": "Visual_Specialist", "depends_on": [1]},
+]
+
+class FakeChatModel(BaseChatModel):
+    """
+    Replies by role (planner, visualizer, synthesis, anything else) after a fixed latency.
+    Supports invoke, ainvoke and streaming, so every graph code path runs unchanged.
+    """
+
+    latency: float = 0.05
+    plan: List[dict] = FAKE_PLAN
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "benchmark-fake"
+
+    def _reply(self, messages) -> str:
+        system = messages[0].content
+        if "breakdown" in system:
+            return "```json\n" + json.dumps(self.plan) + "\n```"
+        if "Visual Specialist" in system:
+            return "```mermaid\ngraph TD; Input-->Encoder; Encoder-->Decoder; Decoder-->Output\n```"
+        if "Synthesize" in system:
+            return "The paper proposes an encoder-decoder model [1] and reports improved accuracy [2]."
+        words = _WORD.findall(messages[-1].content)[:40]
+        return "Finding: " + " ".join(words)
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        self.calls += 1
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._reply(messages)))])
+
+    async def _agenerate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        self.calls += 1
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._reply(messages)))])
+
+    def _stream(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any):
+        time.sleep(self.latency)
+        self.calls += 1
+        for word in self._reply(messages).split(" "):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
@@ -0,0 +1,329 @@
+"""
+Offline benchmark suite: PDF parsing, ingestion, retrieval latency versus corpus size and
+end-to-end graph runs, all against local stand-ins (no network, no GPU).
+
+    python -m benchmarks.run --quick
+    python -m benchmarks.run --out results.json --compare benchmarks/results/previous.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import platform
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIRECTORY = os.path.join(ROOT_DIR, "benchmarks", "results")
+
+PRESETS = {
+    "quick": {"page_counts": [5, 50], "corpus_sizes": [1_000, 5_000], "queries": 50, "graph_runs": 3},
+    "full": {"page_counts": [5, 50, 500], "corpus_sizes": [1_000, 10_000, 50_000], "queries": 200, "graph_runs": 10},
+}
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return float("nan")
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def latency_summary(seconds: List[float]) -> Dict[str, float]:
+    ms = [s * 1000 for s in seconds]
+    return {
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+        "mean_ms": round(sum(ms) / len(ms), 3),
+    }
+
+def install_fakes(args, server_url: str):
+    """
+    Point the app at the local stand-ins. Must run after chdir into the work directory.
+    Returns the fake LLM and the name of the tokenizer in use.
+    """
+    from app.rag import retrieval
+    from app.rag.embedding_cache import CachedEmbeddings
+    from app.agents.llm import set_llm_override
+    from app.concurrency import RateLimiter
+    from app.tools.arxiv_tool import ArxivClient, set_arxiv_client
+    from app.tools.search_tool import SerperClient, set_serper_client
+    from app.telemetry import TELEMETRY_HANDLER
+    from app.rag import chunking
+    from benchmarks.fakes import HashEmbeddings, FakeChatModel, WordPieceEncoding
+
+    # tiktoken downloads cl100k_base on first use; offline, count with a stand-in instead
+    try:
+        tokenizer = chunking.get_encoding().name
+    except Exception:
+        encoding = WordPieceEncoding()
+        chunking.get_encoding = lambda encoding_name=chunking.TOKEN_ENCODING: encoding
+        tokenizer = encoding.name
+    embeddings = HashEmbeddings(dim=args.embedding_dim, per_call_latency=args.embed_call_latency, per_text_latency=args.embed_text_latency)
+    retrieval._embeddings_instance = CachedEmbeddings(embeddings, model_name="benchmark-hash")
+    llm = FakeChatModel(latency=args.llm_latency, callbacks=[TELEMETRY_HANDLER])
+    set_llm_override(llm)
+    set_arxiv_client(ArxivClient(base_url=f"{server_url}/api/query", rate_limiter=RateLimiter(1000, burst=1000)))
+    set_serper_client(SerperClient(base_url=f"{server_url}/scholar"))
+    os.environ.setdefault("SERPER_API_KEY", "benchmark")
+    return llm, tokenizer
+
+def bench_parse(paths: List[str]) -> List[Dict[str, Any]]:
+    from pypdf import PdfReader
+    from app.rag.ingestion import parse_pdf_sections
+    from app.rag.extraction import get_page_text_cache
+
+    # Cold parses must extract, not read text cached by an earlier run in the same workdir
+    get_page_text_cache().clear()
+    results = []
+    for path in paths:
+        pages = len(PdfReader(path).pages)
+        start = time.perf_counter()
+        chunks = parse_pdf_sections(path)
+        seconds = time.perf_counter() - start
+        # Second parse reads the page text cache, i.e. the cost of re-chunking
+        start = time.perf_counter()
+        parse_pdf_sections(path)
+        cached_seconds = time.perf_counter() - start
+        results.append({
+            "pages": pages,
+            "chunks": len(chunks),
+            "seconds": round(seconds, 4),
+            "pages_per_sec": round(pages / seconds, 2),
+            "cached_seconds": round(cached_seconds, 4),
+        })
+    return results
+
+def bench_ingest(paths: List[str]) -> List[Dict[str, Any]]:
+    from app.rag.ingestion import ingest_pdf
+    from app.rag.manifest import load_manifest
+    from app.rag.sections import wait_for_summaries
+    from app.rag.references import wait_for_citations
+
+    results = []
+    for i, path in enumerate(paths):
+        collection = f"bench_ingest_{i}"
+        start = time.perf_counter()
+        success, message = ingest_pdf(path, collection_name=collection)
+        seconds = time.perf_counter() - start
+        chunks = sum(len(e["chunk_ids"]) for e in load_manifest()["collections"].get(collection, {}).values())
+        results.append({
+            "collection": collection,
+            "success": success,
+            "chunks": chunks,
+            "seconds": round(seconds, 4),
+            "chunks_per_sec": round(chunks / seconds, 2),
+        })
+    # Section summaries and reference lookups run in the background after ingest; don't let them overlap later benchmarks
+    wait_for_summaries()
+    wait_for_citations()
+    return results
+
+def _synthetic_chunks(n: int, seed: int = 0):
+    from benchmarks.corpus import VOCABULARY, SECTIONS
+
+    rng = random.Random(seed)
+    for i in range(n):
+        paper = i // 50
+        words = rng.choices(VOCABULARY, k=250) + [f"topic{paper}x{j}" for j in range(3)]
+        yield f"chunk{seed}_{i}", {
+            "text": " ".join(words),
+            "metadata": {"source": f"paper_{paper}.pdf", "page": 1 + (i % 50) // 4, "section": SECTIONS[i % len(SECTIONS)]},
+        }
+
+def bench_retrieval(corpus_sizes: List[int], n_queries: int, k: int = 5) -> List[Dict[str, Any]]:
+    from app.rag.ingestion import write_chunks
+    from app.rag.lexical import get_lexical_index
+    from app.rag.retrieval import retrieve_context, retrieve_context_batch
+    from benchmarks.corpus import VOCABULARY
+
+    rng = random.Random(1)
+    queries = [" ".join(rng.choices(VOCABULARY, k=6)) for _ in range(n_queries)]
+    results = []
+    for size in corpus_sizes:
+        collection = f"bench_retrieval_{size}"
+        start = time.perf_counter()
+        batch = []
+        for chunk_id, chunk in _synthetic_chunks(size):
+            batch.append((chunk_id, chunk))
+            if len(batch) == 512:
+                write_chunks(collection, [i for i, _ in batch], [c for _, c in batch])
+                batch = []
+        if batch:
+            write_chunks(collection, [i for i, _ in batch], [c for _, c in batch])
+        get_lexical_index(collection).save()
+        build_seconds = time.perf_counter() - start
+
+        # One warm-up query so collection loading isn't counted as query latency
+        retrieve_context(queries[0], k=k, collections=[collection])
+        row = {"chunks": size, "index_seconds": round(build_seconds, 3)}
+        for hybrid in (False, True):
+            timings = []
+            for query in queries:
+                start = time.perf_counter()
+                if hybrid:
+                    retrieve_context(query, k=k, collections=[collection])
+                else:
+                    retrieve_context_batch([query], k=k, hybrid=False, collections=[collection])
+                timings.append(time.perf_counter() - start)
+            row["hybrid" if hybrid else "dense"] = latency_summary(timings)
+        results.append(row)
+    return results
+
+def _initial_state(query: str, collections: List[str]) -> Dict[str, Any]:
+    return {
+        "messages": [],
+        "user_query": query,
+        "research_plan": [],
+        "current_step_index": 0,
+        "documents": [],
+        "verified_citations": [],
+        "diagrams": [],
+        "prefetched_context": {},
+        "collections": collections,
+        "trace": [],
+    }
+
+def bench_graph(runs: int, collections: List[str], llm) -> Dict[str, Any]:
+    from app.agents.graph import build_graph
+    from app.telemetry import summarize_trace
+
+    # Disk cache would turn every run after the first into a cache hit
+    llm.cache = False
+    results = {}
+    for mode in ("sync", "async"):
+        graph = build_graph(use_async=(mode == "async"), reuse_steps=False)
+        timings = []
+        trace = []
+        calls_before = llm.calls
+        for i in range(runs):
+            state = _initial_state(f"Summarize the methodology and results (run {i})", collections)
+            start = time.perf_counter()
+            if mode == "async":
+                final = asyncio.run(graph.ainvoke(state))
+            else:
+                final = graph.invoke(state)
+            timings.append(time.perf_counter() - start)
+            if not final.get("final_answer"):
+                raise RuntimeError(f"{mode} graph run produced no final answer")
+            trace.extend(final.get("trace") or [])
+        results[mode] = {
+            "runs": runs,
+            **latency_summary(timings),
+            "llm_calls_per_run": (llm.calls - calls_before) / runs,
+            # Per-node wall time per run, to see which agent dominates
+            "node_wall_ms": {node: round(totals["wall_ms"] / runs, 3) for node, totals in summarize_trace(trace).items()},
+        }
+    return results
+
+def _flatten(value, prefix: str = "") -> Dict[str, float]:
+    if isinstance(value, dict):
+        out = {}
+        for key, item in value.items():
+            out.update(_flatten(item, f"{prefix}.{key}" if prefix else str(key)))
+        return out
+    if isinstance(value, list):
+        out = {}
+        for i, item in enumerate(value):
+            out.update(_flatten(item, f"{prefix}[{i}]"))
+        return out
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: float(value)}
+    return {}
+
+def compare(previous: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    """One line per numeric metric present in both runs: old -> new (relative change)."""
+    old, new = _flatten(previous["results"]), _flatten(current["results"])
+    lines = []
+    for key in sorted(old.keys() & new.keys()):
+        if old[key]:
+            change = (new[key] - old[key]) / old[key] * 100
+            lines.append(f"{key:<48} {old[key]:>12.3f} -> {new[key]:>12.3f}  ({change:+.1f}%)")
+    return lines
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Offline performance benchmarks.")
+    parser.add_argument("--quick", action="store_true", help="Smaller corpus and fewer runs.")
+    parser.add_argument("--only", nargs="+", choices=["parse", "ingest", "retrieval", "graph"], help="Run a subset of the benchmarks.")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Simulated seconds per LLM call.")
+    parser.add_argument("--embed-call-latency", type=float, default=0.0, help="Simulated seconds per embedding batch.")
+    parser.add_argument("--embed-text-latency", type=float, default=0.0, help="Simulated seconds per embedded text.")
+    parser.add_argument("--embedding-dim", type=int, default=1024)
+    parser.add_argument("--api-latency", type=float, default=0.02, help="Simulated arXiv/Serper response time.")
+    parser.add_argument("--workdir", help="Where the corpus, vector store and caches go (default: a fresh temp dir).")
+    parser.add_argument("--out", help="Results JSON path (default: benchmarks/results/<timestamp>.json).")
+    parser.add_argument("--compare", help="Earlier results JSON to diff against.")
+    args = parser.parse_args(argv)
+
+    preset = PRESETS["quick" if args.quick else "full"]
+    selected = set(args.only or ["parse", "ingest", "retrieval", "graph"])
+    started = datetime.now(timezone.utc)
+    out_path = os.path.abspath(args.out or os.path.join(RESULTS_DIRECTORY, started.strftime("%Y%m%dT%H%M%SZ") + ".json"))
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+
+    # The app derives chroma_db/ and .cache/ from the working directory at import time
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="research-lab-bench-"))
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    sys.path.insert(0, ROOT_DIR)
+
+    from benchmarks.corpus import generate_corpus
+    from benchmarks.fake_server import start_fake_server
+
+    server, server_url = start_fake_server(latency=args.api_latency)
+    llm, tokenizer = install_fakes(args, server_url)
+    paths = generate_corpus(os.path.join(workdir, "corpus"), preset["page_counts"])
+
+    results: Dict[str, Any] = {}
+    if "parse" in selected:
+        print("parse ...", flush=True)
+        results["parse"] = bench_parse(paths)
+    if "ingest" in selected or "graph" in selected:
+        print("ingest ...", flush=True)
+        results["ingest"] = bench_ingest(paths)
+    if "retrieval" in selected:
+        print("retrieval ...", flush=True)
+        results["retrieval"] = bench_retrieval(preset["corpus_sizes"], preset["queries"])
+    if "graph" in selected:
+        print("graph ...", flush=True)
+        results["graph"] = bench_graph(preset["graph_runs"], [results["ingest"][0]["collection"]], llm)
+    server.shutdown()
+
+    report = {
+        "meta": {
+            "started": started.isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            # Token counts (and so chunk counts) depend on it
+            "tokenizer": tokenizer,
+            "preset": "quick" if args.quick else "full",
+            "config": {key: value for key, value in vars(args).items() if key not in ("out", "compare")},
+            "workdir": workdir,
+        },
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    with open(out_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f"Results written to {out_path}")
+
+    if compare_path:
+        with open(compare_path) as f:
+            previous = json.load(f)
+        print("\n".join(compare(previous, report)))
+
+if __name__ == "__main__":
+    main()
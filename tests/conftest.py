@@ -0,0 +1,25 @@
+"""
+Tests run against the offline stand-ins from benchmarks.fakes: hashed embeddings instead of
+the embedding model, and a local tokenizer when tiktoken's BPE file isn't cached.
+"""
+import os
+import sys
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+# The app derives chroma_db/ and .cache/ from the working directory at import time
+os.chdir(tempfile.mkdtemp(prefix="research-lab-tests-"))
+
+from app.rag import chunking, retrieval
+from app.rag.embedding_cache import CachedEmbeddings
+from benchmarks.fakes import HashEmbeddings, WordPieceEncoding
+
+retrieval._embeddings_instance = CachedEmbeddings(HashEmbeddings(dim=64), model_name="test-hash")
+try:
+    chunking.get_encoding()
+except Exception:
+    _encoding = WordPieceEncoding()
+    chunking.get_encoding = lambda encoding_name=chunking.TOKEN_ENCODING: _encoding
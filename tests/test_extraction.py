@@ -0,0 +1,26 @@
+from app.rag import extraction
+from app.rag.manifest import file_sha256
+from benchmarks.corpus import generate_pdf
+
+def test_parallel_extraction_caches_each_range(tmp_path):
+    path = generate_pdf(str(tmp_path / "long.pdf"), 70)
+    expected = extraction.extract_page_texts(path, file_hash="in-process", workers=1)
+    # Spawned workers (not forked ones) extract the ranges; each range is cached on arrival
+    assert extraction.extract_page_texts(path, workers=2) == expected
+    cache = extraction.get_page_text_cache()
+    key = extraction._cache_key(file_sha256(path))
+    assert cache.get(f"{key}:pages") == 70
+    assert cache.get(f"{key}:16") == expected[16:32]
+    # A range evicted on its own is extracted again, not the whole document
+    cache.delete(f"{key}:16")
+    assert extraction.extract_page_texts(path, workers=2) == expected
+    assert cache.get(f"{key}:16") == expected[16:32]
+
+def test_unfinished_extraction_is_not_served_from_cache(tmp_path):
+    path = generate_pdf(str(tmp_path / "partial.pdf"), 70, seed=1)
+    pages = extraction.iter_page_texts(path, workers=1)
+    first = next(pages)
+    pages.close()
+    key = extraction._cache_key(file_sha256(path))
+    assert extraction.get_page_text_cache().get(f"{key}:pages") is None
+    assert extraction.extract_page_texts(path, workers=1)[0] == first
@@ -0,0 +1,69 @@
+import os
+import time
+import threading
+
+from app.rag import lexical, retrieval
+from app.rag.ingestion import write_chunks
+
+def _chunk(i):
+    return {"text": f"alpha beta chunk {i}", "metadata": {"source": "a.pdf", "page": i}}
+
+def test_eviction_and_lexical_backfill_do_not_deadlock():
+    # One thread keeps opening collections (each open evicts one and releases lexical indexes),
+    # the other keeps building lexical indexes from Chroma (no .pkl), which opens collections
+    names = [f"backfill{i:02d}" for i in range(retrieval.MAX_OPEN_COLLECTIONS + 4)]
+    for name in names:
+        write_chunks(name, [f"{name}-1"], [_chunk(1)])
+    stop = time.monotonic() + 2.0
+
+    def open_collections():
+        i = 0
+        while time.monotonic() < stop:
+            retrieval.get_vectorstore(f"opened{i % 40:02d}")
+            i += 1
+
+    def build_indexes():
+        while time.monotonic() < stop:
+            for name in names:
+                with lexical._indexes_lock:
+                    lexical._indexes.pop(name, None)
+                path = os.path.join(retrieval.PERSIST_DIRECTORY, lexical.LEXICAL_SUBDIRECTORY, f"{name}.pkl")
+                if os.path.exists(path):
+                    os.remove(path)
+                lexical.get_lexical_index(name)
+
+    threads = [threading.Thread(target=open_collections, daemon=True), threading.Thread(target=build_indexes, daemon=True)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=30)
+    assert not any(t.is_alive() for t in threads), "deadlock between get_vectorstore and get_lexical_index"
+
+def test_eviction_keeps_unsaved_lexical_index():
+    write_chunks("evicted", ["e1"], [_chunk(1)])
+    for i in range(retrieval.MAX_OPEN_COLLECTIONS + 2):
+        retrieval.get_vectorstore(f"other{i:02d}")
+    assert "evicted" not in retrieval._vectorstores
+    assert "evicted" in lexical._indexes
+    write_chunks("evicted", ["e2"], [_chunk(2)])
+    assert {chunk_id for chunk_id, _ in lexical.get_lexical_index("evicted").search("alpha")} == {"e1", "e2"}
+
+def test_filtered_search_matches_filtering_the_full_ranking(tmp_path):
+    index = lexical.LexicalIndex(str(tmp_path / "bm25.pkl"))
+    ids = [f"c{i}" for i in range(200)]
+    texts = [f"alpha {'beta ' * (i % 5)}gamma{i % 7} filler{i}" for i in range(200)]
+    metadatas = [{"source": f"p{i % 4}.pdf", "section": ["Intro", "Results"][i % 2]} for i in range(200)]
+    index.add(ids, texts, metadatas)
+    index.remove(ids[::9])
+    where = {"$and": [{"source": {"$in": ["p1.pdf", "p2.pdf"]}}, {"section": "Results"}]}
+
+    def expected():
+        full = index.search("alpha beta gamma3", k=len(ids))
+        by_id = dict(zip(index.chunk_ids, index.metadatas))
+        return [hit for hit in full if lexical.matches_filter(by_id[hit[0]], where)][:5]
+
+    assert index.search("alpha beta gamma3", k=5, filter_dict=where) == expected()
+    # The cached filter mask must follow later additions
+    index.add(["new"], ["beta beta beta beta gamma3"], [{"source": "p2.pdf", "section": "Results"}])
+    hits = index.search("alpha beta gamma3", k=5, filter_dict=where)
+    assert hits == expected() and "new" in [chunk_id for chunk_id, _ in hits]
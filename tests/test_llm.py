@@ -0,0 +1,18 @@
+import asyncio
+
+from app.agents import llm as llm_module
+
+def test_async_http_client_is_shared_per_loop_and_closed_with_it(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+
+    async def models():
+        first, second = llm_module.get_llm(), llm_module.get_llm(temperature=0.7)
+        await asyncio.sleep(0)
+        return first.http_async_client, second.http_async_client
+
+    first, second = asyncio.run(models())
+    assert first is second
+    assert first.is_closed
+    # A new loop gets a client of its own
+    third, _ = asyncio.run(models())
+    assert third is not first and third.is_closed
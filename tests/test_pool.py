@@ -0,0 +1,22 @@
+from app.agents import researcher
+from app.agents.state import merge_documents, pooled_context
+from app.rag.retrieval import with_ranks
+
+def _doc(i, score, source):
+    return {"id": f"c{i}", "content": "encoder decoder attention layers", "metadata": {"source": source}, "score": score}
+
+def test_pool_orders_by_rank_not_raw_score():
+    # Dense similarities (~0.5) next to RRF scores (~0.03): the RRF top hit must not sort last
+    dense = with_ranks([_doc(1, 0.52, "dense.pdf"), _doc(2, 0.50, "dense2.pdf")])
+    fused = with_ranks([_doc(3, 0.033, "fused.pdf"), _doc(1, 0.031, "dense.pdf")])
+    pool = merge_documents(dense, fused)
+    assert [d["rank"] for d in pool] == [1, 2, 1]
+    assert researcher._sources(pool).splitlines() == ["- dense.pdf", "- fused.pdf", "- dense2.pdf"]
+
+def test_analyst_and_visualizer_share_the_pool_threshold():
+    state = {"documents": with_ranks([_doc(i, 0.5, "a.pdf") for i in range(2)])}
+    # Two relevant chunks are too few for either agent
+    assert pooled_context(state, "encoder decoder", k=5) is None
+    assert pooled_context(state, "encoder decoder", k=4) is None
+    state["documents"] += with_ranks([_doc(9, 0.5, "a.pdf")])
+    assert len(pooled_context(state, "encoder decoder", k=4)) == 3
@@ -0,0 +1,15 @@
+from app.agents import reuse
+from app.rag import manifest
+from app.rag.ingestion import record_ingested
+
+def test_scope_fingerprint_parses_the_manifest_once_per_revision(monkeypatch):
+    record_ingested("scope", {"a.pdf": {"file_hash": "1", "chunker": "c", "chunk_ids": []}})
+    loads = []
+    real_load = manifest.load_manifest
+    monkeypatch.setattr(manifest, "load_manifest", lambda: loads.append(1) or real_load())
+    first = reuse._scope_fingerprint(["scope"])
+    assert reuse._scope_fingerprint(["scope"]) == first
+    assert len(loads) == 1
+    # A changed paper in scope is a new revision, so the fingerprint follows it
+    record_ingested("scope", {"a.pdf": {"file_hash": "2", "chunker": "c", "chunk_ids": ["x"]}})
+    assert reuse._scope_fingerprint(["scope"]) == [["scope", [("a.pdf", "2")]]]
@@ -0,0 +1,61 @@
+import httpx
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from app.agents import researcher
+from app.agents.llm import SQLiteLLMCache, set_llm_override
+from app.cache import SQLiteCache
+from app.telemetry import TELEMETRY_HANDLER, span
+from app.tools.search_tool import SerperClient
+from benchmarks.fakes import FakeChatModel
+
+def _plan(n_steps, words):
+    return [
+        {"id": i, "description": f"step {i}", "assigned_agent": "PDF_Analyst", "status": "completed",
+         "result": " ".join(f"finding{i}x{w}" for w in range(words)), "depends_on": [], "metrics": {}}
+        for i in range(1, n_steps + 1)
+    ]
+
+def test_sync_synthesis_meters_compression_calls():
+    llm = FakeChatModel(latency=0.0, callbacks=[TELEMETRY_HANDLER])
+    set_llm_override(llm)
+    try:
+        # Three results, each well over a third of the budget, so all three are compressed first
+        plan = _plan(3, researcher.SYNTHESIS_TOKEN_BUDGET)
+        with span("Lead_Researcher") as finished:
+            researcher.synthesize("q", plan)
+    finally:
+        set_llm_override(None)
+    assert llm.calls == 4
+    assert finished["llm_calls"] == 4
+
+def test_search_many_meters_every_request(monkeypatch):
+    monkeypatch.setenv("SERPER_API_KEY", "test")
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, json={"organic": []}))
+    client = SerperClient(base_url="http://serper.test/scholar", transport=transport)
+    with span("Citation_Scout") as finished:
+        client.search_many(["telemetry a", "telemetry b", "telemetry c"])
+    assert finished["external_calls.serper"] == 3
+
+class _BilledChatModel(FakeChatModel):
+    """Reports token usage the way ChatOpenAI does."""
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        message = AIMessage(
+            content="Finding: cached",
+            usage_metadata={"input_tokens": 1000, "output_tokens": 100, "total_tokens": 1100},
+            response_metadata={"model_name": "gpt-4o-mini"},
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+def test_llm_cache_hits_are_not_billed():
+    llm = _BilledChatModel(latency=0.0, callbacks=[TELEMETRY_HANDLER], cache=SQLiteLLMCache(SQLiteCache("llm_test")))
+    with span("PDF_Analyst") as first:
+        llm.invoke("same prompt")
+    with span("PDF_Analyst") as second:
+        llm.invoke("same prompt")
+    assert llm.calls == 1
+    assert first["llm_calls"] == 1 and first["cost_usd"] > 0
+    assert second["llm_cache_hits"] == 1
+    assert "llm_calls" not in second and "prompt_tokens" not in second and "cost_usd" not in second